@@ -1,5 +1,9 @@
 from django.contrib import admin
 from .models import Admin,Classroom,ClassStudent,StudentAssessment, Teacher, Student, Course, Payment, Subject, Qualification, Assessment, Progress, Enrollment, Message, DiscussionForumPost, Reply, Notification, Assignment, TeacherBoard, CodeEditor, CameraInteraction
+from .models import (
+    Broadcast, ForumThreadSummary, InboxCounter, ModuleCompletion, NotificationArchive, PaymentNotification, PayrollRun,
+    Payslip, TeacherDashboardRollup,
+)
 
 admin.site.register(Admin)
 admin.site.register(Teacher)
@@ -22,6 +26,15 @@ admin.site.register(CameraInteraction)
 admin.site.register(Classroom)
 admin.site.register(ClassStudent)
 admin.site.register(StudentAssessment)
+admin.site.register(PaymentNotification)
+admin.site.register(PayrollRun)
+admin.site.register(Payslip)
+admin.site.register(InboxCounter)
+admin.site.register(Broadcast)
+admin.site.register(NotificationArchive)
+admin.site.register(ForumThreadSummary)
+admin.site.register(ModuleCompletion)
+admin.site.register(TeacherDashboardRollup)
 # admin.site.register()
 # admin.site.register()
 # admin.site.register()
@@ -6,4 +6,16 @@ class CoreConfig(AppConfig):
 
     def ready(self):
         from .models import create_admin_group
+        from . import catalog  # noqa: F401 (facet cache invalidation receivers)
+        from . import catalog_index  # noqa: F401 (in-memory catalog index receivers)
+        from . import fees  # noqa: F401 (cache invalidation receivers)
+        from . import forum  # noqa: F401 (thread summary receivers)
+        from . import gradebook  # noqa: F401 (gradebook cache receivers)
+        from . import inbox  # noqa: F401 (unread counter receivers)
+        from . import progress  # noqa: F401 (progress overview receivers)
+        from . import realtime  # noqa: F401 (WebSocket push receivers)
+        from . import sandbox  # noqa: F401 (submission queueing receiver)
+        from . import search  # noqa: F401 (search index receivers)
+        from . import student_dashboard  # noqa: F401 (dashboard snapshot invalidation receivers)
+        from . import teacher_dashboard  # noqa: F401 (dashboard rollup receivers)
         create_admin_group()
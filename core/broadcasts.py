@@ -0,0 +1,123 @@
+from datetime import timedelta
+
+from django.db import transaction
+from django.db.models import F, Q
+from django.utils import timezone
+
+from .models import Broadcast, BroadcastBatch, ClassStudent, Enrollment, Notification
+from .realtime import push_to_users
+from .student_dashboard import invalidate_student_dashboards
+
+BROADCAST_BATCH_SIZE = 1000
+# Seconds a broadcast may go without progress before it is considered stalled and resumed.
+STALL_TIMEOUT = 10 * 60
+
+
+def broadcast_recipients(course):
+    """
+    User ids of everyone in ``course``: enrolled students, their assigned
+    teachers, and the students and teachers of its classrooms.
+
+    Runs as a single UNION query, which also removes duplicates.
+    """
+    enrollments = Enrollment.objects.filter(course=course)
+    class_students = ClassStudent.objects.filter(class_obj__course=course)
+    return (
+        enrollments.values_list('student__user_id', flat=True)
+        .union(
+            enrollments.filter(teacher__isnull=False).values_list('teacher__user_id', flat=True),
+            class_students.values_list('student__user_id', flat=True),
+            class_students.values_list('teacher__user_id', flat=True),
+        )
+    )
+
+
+def broadcast_payload(broadcast):
+    return {
+        'broadcast': broadcast.pk,
+        'course': broadcast.course_id,
+        'content': broadcast.content,
+        'link': broadcast.link,
+        'timestamp': broadcast.created_at.isoformat(),
+    }
+
+
+def create_notifications(broadcast, batch_size=BROADCAST_BATCH_SIZE):
+    """
+    Write one Notification per recipient with chunked bulk_create.
+
+    Each chunk commits on its own together with a BroadcastBatch listing its
+    recipients, and the batch is yielded so its delivery can be queued as
+    soon as it is written. A run that was interrupted resumes without
+    notifying anyone twice; chunks it wrote but never got to queue are found
+    by undelivered_batches().
+    """
+    already_notified = set(broadcast.notifications.values_list('recipient_id', flat=True))
+    recipients = sorted(
+        user_id for user_id in broadcast_recipients(broadcast.course_id)
+        if user_id != broadcast.sender_id and user_id not in already_notified
+    )
+    now = timezone.now()
+    Broadcast.objects.filter(pk=broadcast.pk).update(
+        status='creating',
+        started_at=broadcast.started_at or now,
+        last_progress_at=now,
+        recipient_count=len(already_notified) + len(recipients),
+    )
+
+    for start in range(0, len(recipients), batch_size):
+        chunk = recipients[start:start + batch_size]
+        with transaction.atomic():
+            Notification.objects.bulk_create([
+                Notification(recipient_id=user_id, content=broadcast.content, link=broadcast.link, broadcast=broadcast)
+                for user_id in chunk
+            ])
+            batch = BroadcastBatch.objects.create(broadcast=broadcast, recipients=chunk)
+            Broadcast.objects.filter(pk=broadcast.pk).update(
+                created_count=F('created_count') + len(chunk), last_progress_at=timezone.now(),
+            )
+            invalidate_student_dashboards(user_ids=chunk)
+        yield batch
+
+    Broadcast.objects.filter(pk=broadcast.pk).update(status='delivering')
+    finish_if_delivered(broadcast.pk)
+
+
+def undelivered_batches(broadcast_id):
+    return BroadcastBatch.objects.filter(broadcast_id=broadcast_id, delivered_at__isnull=True).order_by('pk')
+
+
+def deliver_batch(batch_id):
+    """
+    Push the broadcast to one batch of recipients and record the progress.
+
+    The batch is marked delivered with a conditional UPDATE after the push,
+    so a batch queued twice (by a resumed broadcast) is counted once; its
+    recipients may at worst see the realtime event twice.
+    """
+    batch = BroadcastBatch.objects.select_related('broadcast').get(pk=batch_id)
+    if batch.delivered_at is not None:
+        return
+    push_to_users(batch.recipients, 'notification', broadcast_payload(batch.broadcast))
+    now = timezone.now()
+    with transaction.atomic():
+        if not BroadcastBatch.objects.filter(pk=batch_id, delivered_at__isnull=True).update(delivered_at=now):
+            return
+        Broadcast.objects.filter(pk=batch.broadcast_id).update(
+            delivered_count=F('delivered_count') + len(batch.recipients), last_progress_at=now,
+        )
+    finish_if_delivered(batch.broadcast_id)
+
+
+def finish_if_delivered(broadcast_id):
+    Broadcast.objects.filter(
+        pk=broadcast_id, status='delivering', delivered_count__gte=F('recipient_count'),
+    ).update(status='done', finished_at=timezone.now())
+
+
+def stalled_broadcasts(now):
+    """Unfinished broadcasts that have made no progress for STALL_TIMEOUT seconds."""
+    cutoff = now - timedelta(seconds=STALL_TIMEOUT)
+    return Broadcast.objects.exclude(status='done').filter(
+        Q(last_progress_at__lt=cutoff) | Q(last_progress_at__isnull=True, created_at__lt=cutoff),
+    )
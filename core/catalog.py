@@ -0,0 +1,154 @@
+from collections import Counter
+
+from django.core.cache import cache
+from django.db import transaction
+from django.db.models import Count
+from django.db.models.signals import m2m_changed, post_delete, post_save
+from django.dispatch import receiver
+
+from .catalog_index import INDEXED_FIELDS, get_catalog_index
+from .models import Course, Subject
+
+FACET_FIELDS = (
+    'level', 'syllabus_structure', 'syllabus_content', 'syllabus_format',
+    'syllabus_availability', 'syllabus_status', 'syllabus_level',
+)
+CATEGORY_FACET = 'subject_category'
+
+CATALOG_CACHE_KEY = 'catalog:facet_counts'
+CATALOG_CACHE_TIMEOUT = 60 * 60
+
+
+def facet_choices():
+    choices = {field: Course._meta.get_field(field).choices for field in FACET_FIELDS}
+    choices[CATEGORY_FACET] = list(Subject.CATEGORY_CHOICES)
+    return choices
+
+
+def combination_counts():
+    """
+    Course counts per combination of facet values, cached until a course changes.
+
+    ``courses`` holds ``(*FACET_FIELDS, count)`` rows and ``categories``
+    ``(*FACET_FIELDS, subject category, distinct course count)`` rows. The
+    choice fields are low-cardinality, so both stay small however many
+    courses there are, and every facet count for any filter can be derived
+    from them without going back to the database.
+    """
+    counts = cache.get(CATALOG_CACHE_KEY)
+    if counts is None:
+        courses = Course.objects.order_by()
+        counts = {
+            'courses': [tuple(row) for row in courses.values_list(*FACET_FIELDS).annotate(n=Count('pk'))],
+            'categories': [
+                tuple(row) for row in courses.values_list(*FACET_FIELDS, 'subjects__category')
+                .annotate(n=Count('pk', distinct=True))
+            ],
+        }
+        cache.set(CATALOG_CACHE_KEY, counts, CATALOG_CACHE_TIMEOUT)
+    return counts
+
+
+def parse_filters(params):
+    """
+    Facet filters from query parameters: repeated values within a facet are
+    OR'ed, different facets are AND'ed. Unknown values are ignored; only one
+    subject category can be selected.
+    """
+    filters = {}
+    for field, choices in facet_choices().items():
+        valid = {value for value, _ in choices}
+        values = [value for value in params.getlist(field) if value in valid]
+        if field == CATEGORY_FACET:
+            values = values[:1]
+        if values:
+            filters[field] = set(values)
+    return filters
+
+
+def filter_courses(queryset, filters):
+    """
+    ``queryset`` narrowed to the courses matching ``filters``.
+
+    With CATALOG_INDEX_ENABLED the facets the in-memory index covers (and the
+    subject category) are resolved there, and the query only gets a primary
+    key list instead of the subject join and its DISTINCT. Other facets are
+    filtered in SQL either way.
+    """
+    index = get_catalog_index()
+    if index is not None:
+        indexed = {field: values for field, values in filters.items() if field in INDEXED_FIELDS}
+        subjects = None
+        if CATEGORY_FACET in filters:
+            subjects = Subject.objects.filter(category__in=filters[CATEGORY_FACET]).values_list('pk', flat=True)
+        if indexed or subjects is not None:
+            queryset = queryset.filter(pk__in=index.course_ids(subjects, **indexed))
+        filters = {field: values for field, values in filters.items() if field not in indexed and field != CATEGORY_FACET}
+    for field, values in filters.items():
+        if field == CATEGORY_FACET:
+            queryset = queryset.filter(subjects__category__in=values).distinct()
+        else:
+            queryset = queryset.filter(**{f'{field}__in': values})
+    return queryset
+
+
+def _matches(row, filters, skip=None):
+    return all(
+        row[index] in filters[field]
+        for index, field in enumerate(FACET_FIELDS)
+        if field != skip and field in filters
+    )
+
+
+def facet_counts(filters):
+    """
+    The number of matching courses and, for every facet, the count per value.
+
+    Counts for a facet apply every filter except the facet's own, so each
+    option shows how many courses selecting it would give.
+    """
+    counts = combination_counts()
+    category = filters.get(CATEGORY_FACET)
+    if category:
+        rows = [row[:-2] + row[-1:] for row in counts['categories'] if row[-2] in category]
+    else:
+        rows = counts['courses']
+
+    tallies = {field: Counter() for field in FACET_FIELDS}
+    total = 0
+    for row in rows:
+        for index, field in enumerate(FACET_FIELDS):
+            if _matches(row, filters, skip=field):
+                tallies[field][row[index]] += row[-1]
+        if _matches(row, filters):
+            total += row[-1]
+
+    tallies[CATEGORY_FACET] = Counter()
+    for row in counts['categories']:
+        if row[-2] is not None and _matches(row, filters):
+            tallies[CATEGORY_FACET][row[-2]] += row[-1]
+
+    facets = {
+        field: [
+            {'value': value, 'label': label, 'count': tallies[field][value], 'selected': value in filters.get(field, ())}
+            for value, label in choices
+        ]
+        for field, choices in facet_choices().items()
+    }
+    return total, facets
+
+
+def invalidate_catalog():
+    transaction.on_commit(lambda: cache.delete(CATALOG_CACHE_KEY))
+
+
+@receiver([post_save, post_delete], sender=Course)
+@receiver([post_save, post_delete], sender=Subject)
+def invalidate_on_course_change(sender, **kwargs):
+    invalidate_catalog()
+
+
+@receiver(m2m_changed, sender=Course.subjects.through)
+def invalidate_on_subjects_change(sender, action, **kwargs):
+    if action in ('post_add', 'post_remove', 'post_clear'):
+        invalidate_catalog()
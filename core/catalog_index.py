@@ -0,0 +1,247 @@
+import sys
+import threading
+import time
+from array import array
+from collections import defaultdict
+
+from django.conf import settings
+from django.core.cache import cache
+from django.db import transaction
+from django.db.models.signals import m2m_changed, post_delete, post_save
+from django.dispatch import receiver
+
+from .models import Course
+
+INDEXED_FIELDS = ('level', 'syllabus_status', 'syllabus_availability')
+VERSION_CACHE_KEY = 'catalog_index:version'
+# How often, in seconds, lookups check the shared version for other processes' changes.
+VERSION_CHECK_INTERVAL = 1.0
+
+
+class CatalogIndex:
+    """
+    Integer-coded columns of every course, held in memory for fast filtering.
+
+    Each course gets a dense slot number. Every choice value and every
+    subject has a bitset (a Python int) with one bit per slot, so a filter is
+    a handful of OR/AND operations on ints rather than a query. Per-slot
+    codes are kept in ``array`` columns so a course can be updated in place
+    when it changes.
+
+    Changes made in this process are applied incrementally from signals when
+    the index is loaded. Every change, loaded or not, also bumps a version
+    number in the shared cache; an index
+    that sees a version it did not produce reloads itself, so other
+    processes' writes show up within VERSION_CHECK_INTERVAL seconds.
+    """
+
+    def __init__(self):
+        self._lock = threading.RLock()
+        self._loaded = False
+        self._checked_at = 0.0
+        self.version = None
+
+    def _reset(self):
+        self.pks = []
+        self.slots = {}
+        self.free = []
+        self.alive = 0
+        self.codes = {field: array('B') for field in INDEXED_FIELDS}
+        self.values = {field: [value for value, _ in Course._meta.get_field(field).choices] for field in INDEXED_FIELDS}
+        self.value_codes = {field: {value: code for code, value in enumerate(values)} for field, values in self.values.items()}
+        self.bitsets = {field: [0] * len(values) for field, values in self.values.items()}
+        self.subjects = defaultdict(int)
+        self.course_subjects = []
+
+    def load(self):
+        """Rebuild the whole index with two queries."""
+        with self._lock:
+            self._reset()
+            self.version = cache.get_or_set(VERSION_CACHE_KEY, 0, timeout=None)
+            self._checked_at = time.monotonic()
+            for pk, *values in Course.objects.values_list('pk', *INDEXED_FIELDS).iterator():
+                self._store(pk, dict(zip(INDEXED_FIELDS, values)))
+            subjects = defaultdict(list)
+            for course_id, subject_id in Course.subjects.through.objects.values_list('course_id', 'subject_id').iterator():
+                subjects[course_id].append(subject_id)
+            for course_id, subject_ids in subjects.items():
+                self._set_subjects(self.slots[course_id], subject_ids)
+            self._loaded = True
+
+    def _slot(self, pk):
+        slot = self.slots.get(pk)
+        if slot is None:
+            if self.free:
+                slot = self.free.pop()
+                self.pks[slot] = pk
+            else:
+                slot = len(self.pks)
+                self.pks.append(pk)
+                self.course_subjects.append(())
+                for column in self.codes.values():
+                    column.append(0)
+            self.slots[pk] = slot
+        return slot
+
+    def _store(self, pk, values):
+        slot = self._slot(pk)
+        bit = 1 << slot
+        for field, column in self.codes.items():
+            self.bitsets[field][column[slot]] &= ~bit
+            code = self.value_codes[field].get(values[field])
+            if code is None:
+                # A value outside the field's choices; index it on the fly.
+                code = len(self.values[field])
+                self.values[field].append(values[field])
+                self.value_codes[field][values[field]] = code
+                self.bitsets[field].append(0)
+            column[slot] = code
+            self.bitsets[field][code] |= bit
+        self.alive |= bit
+        return slot
+
+    def _set_subjects(self, slot, subject_ids):
+        bit = 1 << slot
+        for subject_id in self.course_subjects[slot]:
+            self.subjects[subject_id] &= ~bit
+        for subject_id in subject_ids:
+            self.subjects[subject_id] |= bit
+        self.course_subjects[slot] = tuple(subject_ids)
+
+    def _ensure_current(self):
+        if not self._loaded:
+            self.load()
+        elif time.monotonic() - self._checked_at >= VERSION_CHECK_INTERVAL:
+            self._checked_at = time.monotonic()
+            if cache.get(VERSION_CACHE_KEY, 0) != self.version:
+                self.load()
+
+    def _bump_version(self):
+        try:
+            version = cache.incr(VERSION_CACHE_KEY)
+        except ValueError:
+            version = 1
+            cache.set(VERSION_CACHE_KEY, version, timeout=None)
+        # Only our own change since the last look: stay current without reloading.
+        if self.version is not None and version == self.version + 1:
+            self.version = version
+
+    def update_course(self, course):
+        with self._lock:
+            if self._loaded:
+                self._store(course.pk, {field: getattr(course, field) for field in INDEXED_FIELDS})
+            # Bumped even when this process never loaded the index (admin,
+            # workers, commands), so the processes that did reload.
+            self._bump_version()
+
+    def update_subjects(self, course_ids):
+        with self._lock:
+            if self._loaded:
+                subjects = defaultdict(list)
+                rows = Course.subjects.through.objects.filter(course_id__in=course_ids).values_list('course_id', 'subject_id')
+                for course_id, subject_id in rows:
+                    subjects[course_id].append(subject_id)
+                for course_id in course_ids:
+                    if course_id in self.slots:
+                        self._set_subjects(self.slots[course_id], subjects[course_id])
+            self._bump_version()
+
+    def invalidate(self):
+        """Reload here and make every other process reload too."""
+        with self._lock:
+            self._bump_version()
+            self.load()
+
+    def remove_course(self, pk):
+        with self._lock:
+            if self._loaded:
+                slot = self.slots.pop(pk, None)
+                if slot is not None:
+                    bit = 1 << slot
+                    for field, column in self.codes.items():
+                        self.bitsets[field][column[slot]] &= ~bit
+                    self._set_subjects(slot, ())
+                    self.alive &= ~bit
+                    self.free.append(slot)
+            self._bump_version()
+
+    def matching_bits(self, subjects=None, **filters):
+        """
+        The bitset of courses matching ``filters`` (field -> iterable of values,
+        OR'ed) and, if given, having any of the ``subjects`` (ids).
+        """
+        with self._lock:
+            self._ensure_current()
+            bits = self.alive
+            for field, values in filters.items():
+                value_codes = self.value_codes[field]
+                selected = 0
+                for value in values:
+                    code = value_codes.get(value)
+                    if code is not None:
+                        selected |= self.bitsets[field][code]
+                bits &= selected
+            if subjects is not None:
+                selected = 0
+                for subject_id in subjects:
+                    selected |= self.subjects.get(subject_id, 0)
+                bits &= selected
+            return bits
+
+    def course_ids(self, subjects=None, **filters):
+        """Primary keys of the matching courses."""
+        bits = bin(self.matching_bits(subjects, **filters))[:1:-1]
+        pks = self.pks
+        return [pks[slot] for slot, bit in enumerate(bits) if bit == '1']
+
+    def count(self, subjects=None, **filters):
+        return bin(self.matching_bits(subjects, **filters)).count('1')
+
+    def memory_report(self):
+        """Approximate bytes held by each structure of the index."""
+        with self._lock:
+            self._ensure_current()
+            return {
+                'courses': len(self.slots),
+                'slots': len(self.pks),
+                'slot_map': sys.getsizeof(self.pks) + sys.getsizeof(self.slots) + sum(sys.getsizeof(pk) for pk in self.pks),
+                'code_columns': sum(sys.getsizeof(column) for column in self.codes.values()),
+                'value_bitsets': sum(sys.getsizeof(bits) for bitsets in self.bitsets.values() for bits in bitsets),
+                'subject_bitsets': sys.getsizeof(self.subjects) + sum(sys.getsizeof(bits) for bits in self.subjects.values()),
+                'course_subjects': sys.getsizeof(self.course_subjects) + sum(sys.getsizeof(ids) for ids in self.course_subjects),
+            }
+
+
+catalog_index = CatalogIndex()
+
+
+def get_catalog_index():
+    """The process-wide index, or None when CATALOG_INDEX_ENABLED is off."""
+    return catalog_index if getattr(settings, 'CATALOG_INDEX_ENABLED', False) else None
+
+
+@receiver(post_save, sender=Course)
+def index_saved_course(sender, instance, raw=False, **kwargs):
+    if not raw and get_catalog_index():
+        transaction.on_commit(lambda: catalog_index.update_course(instance))
+
+
+@receiver(post_delete, sender=Course)
+def index_deleted_course(sender, instance, **kwargs):
+    if get_catalog_index():
+        pk = instance.pk
+        transaction.on_commit(lambda: catalog_index.remove_course(pk))
+
+
+@receiver(m2m_changed, sender=Course.subjects.through)
+def index_course_subjects(sender, instance, action, reverse, pk_set, **kwargs):
+    if action not in ('post_add', 'post_remove', 'post_clear') or not get_catalog_index():
+        return
+    if not reverse:
+        transaction.on_commit(lambda: catalog_index.update_subjects([instance.pk]))
+    elif pk_set is not None:
+        course_ids = list(pk_set)
+        transaction.on_commit(lambda: catalog_index.update_subjects(course_ids))
+    else:
+        # subject.courses.clear() does not say which courses lost the subject.
+        transaction.on_commit(catalog_index.invalidate)
@@ -0,0 +1,58 @@
+import asyncio
+
+from channels.generic.websocket import AsyncJsonWebsocketConsumer
+
+from .realtime import user_group
+
+OUTBOX_SIZE = 100
+
+
+class InboxConsumer(AsyncJsonWebsocketConsumer):
+    """
+    Pushes new messages and notifications to a signed-in user.
+
+    Events from the channel layer are queued and written to the socket by a
+    separate task, so a slow client never holds up the consumer's receive
+    loop. The queue is bounded: when it fills up the oldest event is dropped
+    and the client gets a ``resync`` event telling it to reload from the API.
+    """
+
+    async def connect(self):
+        user = self.scope.get('user')
+        if user is None or not user.is_authenticated:
+            await self.close()
+            return
+
+        self.groups = [user_group(user.pk)]
+        for group in self.groups:
+            await self.channel_layer.group_add(group, self.channel_name)
+
+        self.outbox = asyncio.Queue(maxsize=OUTBOX_SIZE)
+        self.dropped = 0
+        self.writer = asyncio.ensure_future(self.write_outbox())
+        await self.accept()
+
+    async def disconnect(self, code):
+        writer = getattr(self, 'writer', None)
+        if writer is not None:
+            writer.cancel()
+        for group in getattr(self, 'groups', []):
+            await self.channel_layer.group_discard(group, self.channel_name)
+
+    async def receive_json(self, content, **kwargs):
+        if content.get('type') == 'ping':
+            await self.send_json({'type': 'pong'})
+
+    async def deliver(self, event):
+        if self.outbox.full():
+            self.outbox.get_nowait()
+            self.dropped += 1
+        self.outbox.put_nowait({'type': event['kind'], 'data': event['payload']})
+
+    async def write_outbox(self):
+        while True:
+            item = await self.outbox.get()
+            if self.dropped:
+                self.dropped = 0
+                await self.send_json({'type': 'resync'})
+            await self.send_json(item)
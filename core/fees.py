@@ -0,0 +1,132 @@
+import uuid
+from decimal import ROUND_HALF_UP, Decimal
+
+from django.core.cache import cache
+from django.db import transaction
+from django.db.models import Case, Count, DecimalField, ExpressionWrapper, F, OuterRef, Subquery, Value, When
+from django.db.models.functions import Coalesce
+from django.db.models.signals import post_delete, post_save
+from django.dispatch import receiver
+
+from .models import Enrollment, Payment, Student
+
+FEE_SCHEDULE_TIMEOUT = 60 * 60
+
+CENT = Decimal('0.01')
+
+_money_field = DecimalField(max_digits=12, decimal_places=4)
+
+
+def annotate_fee_schedule(queryset):
+    """
+    Annotate students with their course count, discounted fee and installments.
+
+    Everything is computed by the database in the same query as the students
+    themselves, so no per-student COUNT is needed.
+    """
+    course_count = (
+        Enrollment.objects.filter(student=OuterRef('pk'))
+        .order_by()
+        .values('student')
+        .annotate(n=Count('course', distinct=True))
+        .values('n')
+    )
+    return queryset.annotate(
+        enrolled_course_count=Coalesce(Subquery(course_count), Value(0)),
+        discounted_fee=Case(
+            When(enrolled_course_count__gt=1, then=F('total_fees') * Student.MULTI_COURSE_DISCOUNT_RATE),
+            default=F('total_fees'),
+            output_field=_money_field,
+        ),
+        initial_installment=ExpressionWrapper(
+            F('discounted_fee') * Student.INITIAL_PAYMENT_SHARE, output_field=_money_field
+        ),
+        final_installment=ExpressionWrapper(
+            F('discounted_fee') * Student.FINAL_PAYMENT_SHARE, output_field=_money_field
+        ),
+    )
+
+
+def _money(value):
+    return Decimal(value).quantize(CENT, rounding=ROUND_HALF_UP)
+
+
+def build_fee_schedule(student):
+    return {
+        'student': student.pk,
+        'enrolled_courses': student.enrolled_course_count,
+        'total_fees': _money(student.total_fees),
+        'discounted_fee': _money(student.discounted_fee),
+        'initial_payment': _money(student.initial_installment),
+        'final_payment': _money(student.final_installment),
+        'fees_paid': _money(student.fees_paid),
+        'remaining_fee': _money(student.remaining_fee),
+    }
+
+
+def _generation():
+    return cache.get_or_set('fee_schedule:generation', lambda: uuid.uuid4().hex, timeout=None)
+
+
+def _cache_key(student_id, generation):
+    return f'fee_schedule:{generation}:{student_id}'
+
+
+def get_fee_schedule(student):
+    """The cached fee schedule of one student (a Student or its id)."""
+    student_id = getattr(student, 'pk', student)
+    key = _cache_key(student_id, _generation())
+    schedule = cache.get(key)
+    if schedule is None:
+        schedule = build_fee_schedule(annotate_fee_schedule(Student.objects.all()).get(pk=student_id))
+        cache.set(key, schedule, FEE_SCHEDULE_TIMEOUT)
+    return schedule
+
+
+def get_fee_schedules(queryset):
+    """Fee schedules for every student in ``queryset`` from one annotated query; refreshes the cache."""
+    generation = _generation()
+    schedules = [build_fee_schedule(student) for student in annotate_fee_schedule(queryset)]
+    cache.set_many(
+        {_cache_key(schedule['student'], generation): schedule for schedule in schedules},
+        FEE_SCHEDULE_TIMEOUT,
+    )
+    return schedules
+
+
+def enrolled_course_count(student):
+    """The student's course count, from a fee schedule annotation or the cache."""
+    count = getattr(student, 'enrolled_course_count', None)
+    if count is None:
+        count = get_fee_schedule(student)['enrolled_courses']
+    return count
+
+
+def invalidate_fee_schedules(student_ids=None):
+    """
+    Drop cached fee schedules once the current transaction commits.
+
+    Passing no ids invalidates every student at once by moving to a new
+    cache generation, e.g. after a bulk reconciliation.
+    """
+    if student_ids is None:
+        def invalidate():
+            cache.set('fee_schedule:generation', uuid.uuid4().hex, timeout=None)
+    else:
+        student_ids = list(student_ids)
+
+        def invalidate():
+            generation = _generation()
+            cache.delete_many([_cache_key(student_id, generation) for student_id in student_ids])
+    transaction.on_commit(invalidate)
+
+
+@receiver([post_save, post_delete], sender=Enrollment)
+@receiver([post_save, post_delete], sender=Payment)
+def invalidate_on_enrollment_or_payment(sender, instance, **kwargs):
+    invalidate_fee_schedules([instance.student_id])
+
+
+@receiver([post_save, post_delete], sender=Student)
+def invalidate_on_student_change(sender, instance, **kwargs):
+    invalidate_fee_schedules([instance.pk])
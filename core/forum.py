@@ -0,0 +1,50 @@
+from django.db.models import F, Value
+from django.db.models.functions import Greatest
+from django.db.models.signals import post_delete, post_save
+from django.dispatch import receiver
+
+from .models import DiscussionForumPost, ForumThreadSummary, Reply
+
+
+def refresh_last_reply(post_id):
+    """Point the summary at the post's newest remaining reply (or none)."""
+    latest = Reply.objects.filter(post_id=post_id).order_by('-timestamp', '-pk').values('timestamp', 'author_id').first()
+    ForumThreadSummary.objects.filter(post_id=post_id).update(
+        last_reply_at=latest['timestamp'] if latest else None,
+        last_author_id=latest['author_id'] if latest else None,
+    )
+
+
+def rebuild_thread_summary(post_id):
+    """Recount a thread from its replies, e.g. if its summary row is missing."""
+    ForumThreadSummary.objects.update_or_create(
+        post_id=post_id, defaults={'reply_count': Reply.objects.filter(post_id=post_id).count()},
+    )
+    refresh_last_reply(post_id)
+
+
+@receiver(post_save, sender=DiscussionForumPost)
+def create_thread_summary(sender, instance, created, raw=False, **kwargs):
+    if created and not raw:
+        ForumThreadSummary.objects.get_or_create(post=instance)
+
+
+@receiver(post_save, sender=Reply)
+def count_new_reply(sender, instance, created, raw=False, **kwargs):
+    if not created or raw:
+        return
+    if not ForumThreadSummary.objects.filter(post_id=instance.post_id).update(reply_count=F('reply_count') + 1):
+        rebuild_thread_summary(instance.post_id)
+        return
+    # Concurrent replies may commit out of order; only move the pointer forwards.
+    summary = ForumThreadSummary.objects.filter(post_id=instance.post_id)
+    summary.filter(last_reply_at__isnull=True).update(last_reply_at=instance.timestamp, last_author_id=instance.author_id)
+    summary.filter(last_reply_at__lt=instance.timestamp).update(last_reply_at=instance.timestamp, last_author_id=instance.author_id)
+
+
+@receiver(post_delete, sender=Reply)
+def count_deleted_reply(sender, instance, **kwargs):
+    summary = ForumThreadSummary.objects.filter(post_id=instance.post_id)
+    summary.update(reply_count=Greatest(F('reply_count') - 1, Value(0)))
+    if summary.filter(last_reply_at=instance.timestamp, last_author_id=instance.author_id).exists():
+        refresh_last_reply(instance.post_id)
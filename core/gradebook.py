@@ -0,0 +1,235 @@
+import hashlib
+import math
+import statistics
+from collections import defaultdict
+
+from django.core.cache import cache
+from django.db import transaction
+from django.db.models import Count, F, Max, Min, Sum
+from django.db.models.signals import post_delete, post_save, pre_save
+from django.dispatch import receiver
+
+from .models import Assessment, StudentAssessment
+
+GRADEBOOK_TIMEOUT = 60 * 60
+PERCENTILES = (10, 25, 50, 75, 90)
+GRADE_BOUNDARIES = (('A', 80), ('B', 70), ('C', 60), ('D', 50), ('E', 0))
+
+
+def _keys(course_id):
+    # Course titles are the primary key and may contain spaces, which cache keys must not.
+    digest = hashlib.md5(str(course_id).encode()).hexdigest()
+    return f'gradebook:{digest}:state', f'gradebook:{digest}:version'
+
+
+def _current_version(version_key):
+    return cache.get_or_set(version_key, 0, timeout=None)
+
+
+def _bump_version(version_key):
+    try:
+        return cache.incr(version_key)
+    except ValueError:
+        cache.set(version_key, 1, timeout=None)
+        return 1
+
+
+def build_state(course_id):
+    """
+    The raw material of a course's gradebook, from three grouped queries.
+
+    Holds running sums per assessment and score totals per student and
+    assessment type, which is everything the report needs and small enough
+    to update in place when a single score changes.
+    """
+    assessments = {
+        row['pk']: dict(row, count=0, total=0, total_sq=0, low=None, high=None)
+        for row in Assessment.objects.filter(course_id=course_id).values('pk', 'title', 'type', 'max_score')
+    }
+    scores = StudentAssessment.objects.filter(assessment__course_id=course_id).order_by()
+    for row in scores.values('assessment').annotate(
+        count=Count('pk'), total=Sum('score'), total_sq=Sum(F('score') * F('score')), low=Min('score'), high=Max('score'),
+    ):
+        assessments[row.pop('assessment')].update(row)
+
+    students = defaultdict(dict)
+    for student_id, kind, total in scores.values_list('student_id', 'assessment__type').annotate(total=Sum('score')):
+        students[student_id][kind] = total
+    return {'assessments': assessments, 'students': dict(students), 'report': None}
+
+
+def _final_grades(state):
+    """Each student's weighted final grade in percent, given Assessment.TYPE_WEIGHTS."""
+    max_by_type = defaultdict(int)
+    for assessment in state['assessments'].values():
+        max_by_type[assessment['type']] += assessment['max_score']
+    weights = {kind: weight for kind, weight in Assessment.TYPE_WEIGHTS.items() if max_by_type[kind] > 0}
+    weight_total = sum(weights.values())
+    if not weight_total:
+        return {}, weights
+    return {
+        student_id: 100 * sum(weight * totals.get(kind, 0) / max_by_type[kind] for kind, weight in weights.items()) / weight_total
+        for student_id, totals in state['students'].items()
+    }, {kind: weight / weight_total for kind, weight in weights.items()}
+
+
+def build_report(course_id, state):
+    assessments = []
+    for pk, assessment in sorted(state['assessments'].items()):
+        count, total = assessment['count'], assessment['total']
+        average = total / count if count else None
+        variance = max(assessment['total_sq'] / count - average ** 2, 0) if count else None
+        assessments.append({
+            'id': pk,
+            'title': assessment['title'],
+            'type': assessment['type'],
+            'max_score': assessment['max_score'],
+            'submissions': count,
+            'average': round(average, 2) if count else None,
+            'average_percentage': round(100 * average / assessment['max_score'], 2) if count and assessment['max_score'] else None,
+            'stddev': round(math.sqrt(variance), 2) if count else None,
+            'min': assessment['low'],
+            'max': assessment['high'],
+        })
+
+    finals, weights = _final_grades(state)
+    grades = sorted(finals.values())
+    distribution = dict.fromkeys((letter for letter, _ in GRADE_BOUNDARIES), 0)
+    histogram = [0] * 10
+    for grade in grades:
+        distribution[next(letter for letter, floor in GRADE_BOUNDARIES if grade >= floor)] += 1
+        histogram[min(int(grade // 10), 9)] += 1
+
+    percentiles = {}
+    if len(grades) > 1:
+        cuts = statistics.quantiles(grades, n=100, method='inclusive')
+        percentiles = {f'p{p}': round(cuts[p - 1], 2) for p in PERCENTILES}
+    elif grades:
+        percentiles = {f'p{p}': round(grades[0], 2) for p in PERCENTILES}
+
+    return {
+        'course': course_id,
+        'students': len(grades),
+        'weights': weights,
+        'assessments': assessments,
+        'final_grades': {
+            'average': round(statistics.fmean(grades), 2) if grades else None,
+            'percentiles': percentiles,
+            'distribution': distribution,
+            'histogram': [{'from': 10 * bucket, 'to': 10 * bucket + 10, 'students': n} for bucket, n in enumerate(histogram)],
+        },
+    }
+
+
+def gradebook_report(course_id):
+    """
+    Averages, spread, final-grade percentiles and grade distribution of a course.
+
+    The state behind the report is cached per course together with a version
+    number that every score change bumps; a state built for another version
+    is rebuilt, so concurrent writers can never leave a stale report behind.
+    """
+    state_key, version_key = _keys(course_id)
+    version = _current_version(version_key)
+    state = cache.get(state_key)
+    if state is None or state['version'] != version:
+        state = build_state(course_id)
+        state['version'] = version
+    if state['report'] is None:
+        state['report'] = build_report(course_id, state)
+        cache.set(state_key, state, GRADEBOOK_TIMEOUT)
+    return state['report']
+
+
+def invalidate_gradebook(course_ids):
+    """Drop the cached gradebooks of ``course_ids`` once the transaction commits, e.g. after a bulk import."""
+    course_ids = list(course_ids)
+
+    def invalidate():
+        for course_id in course_ids:
+            state_key, version_key = _keys(course_id)
+            _bump_version(version_key)
+            cache.delete(state_key)
+    transaction.on_commit(invalidate)
+
+
+def apply_score_change(course_id, assessment_id, student_id, old_score, new_score):
+    """
+    Update the cached gradebook state for one changed score without going back
+    to the database (unless the change removed an assessment's lowest or
+    highest score). If the state is missing or another change raced this one,
+    the state is dropped and rebuilt on the next read.
+    """
+    state_key, version_key = _keys(course_id)
+    version = _bump_version(version_key)
+    state = cache.get(state_key)
+    assessment = state['assessments'].get(assessment_id) if state else None
+    if assessment is None or state['version'] != version - 1:
+        cache.delete(state_key)
+        return
+
+    if old_score is not None:
+        assessment['count'] -= 1
+        assessment['total'] -= old_score
+        assessment['total_sq'] -= old_score * old_score
+    if new_score is not None:
+        assessment['count'] += 1
+        assessment['total'] += new_score
+        assessment['total_sq'] += new_score * new_score
+    if old_score is not None and old_score in (assessment['low'], assessment['high']):
+        extremes = StudentAssessment.objects.filter(assessment_id=assessment_id).aggregate(low=Min('score'), high=Max('score'))
+        assessment.update(extremes)
+    elif new_score is not None:
+        assessment['low'] = new_score if assessment['low'] is None else min(assessment['low'], new_score)
+        assessment['high'] = new_score if assessment['high'] is None else max(assessment['high'], new_score)
+
+    totals = state['students'].setdefault(student_id, {})
+    kind = assessment['type']
+    totals[kind] = totals.get(kind, 0) - (old_score or 0) + (new_score or 0)
+    if new_score is None and not StudentAssessment.objects.filter(
+        student_id=student_id, assessment__course_id=course_id,
+    ).exists():
+        del state['students'][student_id]
+
+    state['version'] = version
+    state['report'] = None
+    cache.set(state_key, state, GRADEBOOK_TIMEOUT)
+
+
+@receiver(pre_save, sender=StudentAssessment)
+def remember_previous_score(sender, instance, raw=False, **kwargs):
+    if instance.pk and not raw:
+        instance._previous = (
+            StudentAssessment.objects.filter(pk=instance.pk)
+            .values_list('assessment__course_id', 'assessment_id', 'student_id', 'score')
+            .first()
+        )
+
+
+@receiver(post_save, sender=StudentAssessment)
+def update_gradebook_on_save(sender, instance, created, raw=False, **kwargs):
+    if raw:
+        return
+    course_id = instance.assessment.course_id
+    previous = None if created else getattr(instance, '_previous', None)
+    changes = []
+    if previous and previous[1:3] != (instance.assessment_id, instance.student_id):
+        # Moved to another student or assessment: remove it there, add it here.
+        changes.append((previous[0], previous[1], previous[2], previous[3], None))
+        previous = None
+    changes.append((course_id, instance.assessment_id, instance.student_id, previous[3] if previous else None, instance.score))
+    transaction.on_commit(lambda: [apply_score_change(*change) for change in changes])
+
+
+@receiver(post_delete, sender=StudentAssessment)
+def update_gradebook_on_delete(sender, instance, **kwargs):
+    course_id = Assessment.objects.filter(pk=instance.assessment_id).values_list('course_id', flat=True).first()
+    if course_id is not None:
+        transaction.on_commit(lambda: apply_score_change(
+            course_id, instance.assessment_id, instance.student_id, instance.score, None,
+        ))
+
+
+@receiver([post_save, post_delete], sender=Assessment)
+def invalidate_on_assessment_change(sender, instance, **kwargs):
+    invalidate_gradebook([instance.course_id])
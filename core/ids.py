@@ -0,0 +1,115 @@
+import os
+import threading
+from collections import defaultdict
+
+from django.db import DEFAULT_DB_ALIAS, IntegrityError, connections, transaction
+
+ID_BLOCK_SIZE = 100
+ID_DIGITS = 7
+
+
+class IdAllocator:
+    """
+    Hands out ``<prefix><7 digits>`` ids from a database sequence, in blocks.
+
+    Each process reserves ``block_size`` numbers at a time from the
+    ``IdSequence`` row for a prefix and serves ids from memory until the block
+    runs out, so creating a row needs no existence check and concurrent
+    workers never see the same number. Reservations are committed on their
+    own connection, so a block is never handed out twice even if the caller's
+    transaction rolls back (the unused numbers are simply skipped).
+
+    Legacy ids have 6 random digits, so 7-digit sequence ids cannot collide
+    with them.
+    """
+
+    def __init__(self, block_size=ID_BLOCK_SIZE, using=DEFAULT_DB_ALIAS):
+        self.block_size = block_size
+        self.using = using
+        self._lock = threading.Lock()
+        self._blocks = defaultdict(lambda: [0, 0])
+        self._pid = os.getpid()
+
+    def next_id(self, prefix):
+        return self.allocate(prefix, 1)[0]
+
+    def allocate(self, prefix, count):
+        """Return ``count`` new ids for ``prefix``."""
+        with self._lock:
+            if self._pid != os.getpid():
+                # A forked worker must not serve the block it inherited from its parent.
+                self._blocks.clear()
+                self._pid = os.getpid()
+            if connections[self.using].vendor == 'sqlite':
+                # SQLite allows a single writer, so a second connection would wait on
+                # the caller's transaction. Reserve exactly what is needed inside it
+                # instead, so a rollback also returns the numbers.
+                with transaction.atomic(using=self.using):
+                    start = self._advance(connections[self.using], prefix, count)
+                numbers = range(start, start + count)
+            else:
+                numbers = self._take(prefix, count)
+
+        if numbers[-1] >= 10 ** ID_DIGITS:
+            raise ValueError(f"The {prefix} id sequence is exhausted.")
+        return [f"{prefix}{number:0{ID_DIGITS}d}" for number in numbers]
+
+    def _take(self, prefix, count):
+        block = self._blocks[prefix]
+        numbers = []
+        while len(numbers) < count:
+            if block[0] >= block[1]:
+                size = max(self.block_size, count - len(numbers))
+                start = self._reserve(prefix, size)
+                block[:] = [start, start + size]
+            take = min(count - len(numbers), block[1] - block[0])
+            numbers.extend(range(block[0], block[0] + take))
+            block[0] += take
+        return numbers
+
+    def _reserve(self, prefix, size):
+        """Reserve ``size`` numbers in a transaction of their own and return the first."""
+        connection = connections.create_connection(self.using)
+        try:
+            connection.set_autocommit(False)
+            start = self._advance(connection, prefix, size)
+            connection.commit()
+        finally:
+            connection.close()
+        return start
+
+    def _advance(self, connection, prefix, size):
+        """Advance the prefix's sequence by ``size`` and return the first reserved number."""
+        from .models import IdSequence
+
+        table = connection.ops.quote_name(IdSequence._meta.db_table)
+        update = f"UPDATE {table} SET next_value = next_value + %s WHERE prefix = %s"
+        with connection.cursor() as cursor:
+            cursor.execute(update, [size, prefix])
+            if cursor.rowcount == 0:
+                savepoint = connection.savepoint()
+                try:
+                    cursor.execute(f"INSERT INTO {table} (prefix, next_value) VALUES (%s, %s)", [prefix, 1 + size])
+                except IntegrityError:
+                    # Another worker created the sequence first.
+                    connection.savepoint_rollback(savepoint)
+                    cursor.execute(update, [size, prefix])
+                else:
+                    connection.savepoint_commit(savepoint)
+            cursor.execute(f"SELECT next_value FROM {table} WHERE prefix = %s", [prefix])
+            return cursor.fetchone()[0] - size
+
+
+allocator = IdAllocator()
+
+
+def assign_ids(instances):
+    """Give every unsaved Teacher/Student in ``instances`` an id, e.g. before ``bulk_create``."""
+    by_prefix = defaultdict(list)
+    for instance in instances:
+        if not instance.id:
+            by_prefix[instance.ID_PREFIX].append(instance)
+    for prefix, pending in by_prefix.items():
+        for instance, new_id in zip(pending, allocator.allocate(prefix, len(pending))):
+            instance.id = new_id
+    return instances
@@ -0,0 +1,130 @@
+from django.core.cache import cache
+from django.db import IntegrityError, transaction
+from django.db.models import Count, F, OuterRef, Subquery, Value
+from django.db.models.functions import Coalesce, Greatest
+from django.db.models.signals import post_delete, post_save, pre_save
+from django.dispatch import receiver
+
+from .models import InboxCounter, Message
+
+UNREAD_COUNT_TIMEOUT = 60 * 60
+
+
+def _cache_key(user_id):
+    return f'inbox:unread:{user_id}'
+
+
+def unread_count(user):
+    """The user's unread message count (a User or its id), read through the cache."""
+    user_id = getattr(user, 'pk', user)
+    key = _cache_key(user_id)
+    count = cache.get(key)
+    if count is None:
+        count = (
+            InboxCounter.objects.filter(user_id=user_id)
+            .values_list('unread_count', flat=True)
+            .first()
+        ) or 0
+        cache.set(key, count, UNREAD_COUNT_TIMEOUT)
+    return count
+
+
+def _invalidate(user_ids):
+    user_ids = list(user_ids)
+    transaction.on_commit(lambda: cache.delete_many([_cache_key(user_id) for user_id in user_ids]))
+
+
+def adjust_unread_count(user_id, delta):
+    """
+    Add ``delta`` to the user's unread counter in the current transaction.
+
+    The counter is changed with UPDATE ... SET unread_count = unread_count + delta,
+    so concurrent writers never lose an update, and it never goes below zero.
+    """
+    if not delta:
+        return
+    value = Greatest(F('unread_count') + delta, Value(0)) if delta < 0 else F('unread_count') + delta
+    with transaction.atomic():
+        if not InboxCounter.objects.filter(user_id=user_id).update(unread_count=value):
+            try:
+                with transaction.atomic():
+                    InboxCounter.objects.create(user_id=user_id, unread_count=max(delta, 0))
+            except IntegrityError:
+                # Another transaction created the counter first.
+                InboxCounter.objects.filter(user_id=user_id).update(unread_count=value)
+    _invalidate([user_id])
+
+
+def mark_conversation_read(user, sender, course=None):
+    """
+    Mark every unread message from ``sender`` to ``user`` (optionally in one course) as read.
+
+    Uses a single UPDATE and decrements the counter by the number of rows it
+    actually changed. Returns that number.
+    """
+    messages = Message.objects.filter(receiver=user, sender=sender, is_read=False)
+    if course is not None:
+        messages = messages.filter(course=course)
+    with transaction.atomic():
+        updated = messages.update(is_read=True)
+        adjust_unread_count(getattr(user, 'pk', user), -updated)
+    return updated
+
+
+def rebuild_unread_counters():
+    """
+    Recount every user's unread messages from the Message table, e.g. after a
+    bulk import or a raw UPDATE. Returns the number of counters written.
+    """
+    unread = (
+        Message.objects.filter(receiver=OuterRef('user'), is_read=False)
+        .order_by()
+        .values('receiver')
+        .annotate(n=Count('pk'))
+        .values('n')
+    )
+    with transaction.atomic():
+        updated = InboxCounter.objects.update(unread_count=Coalesce(Subquery(unread), Value(0)))
+        missing = (
+            Message.objects.filter(is_read=False)
+            .filter(receiver__inbox_counter__isnull=True)
+            .order_by()
+            .values('receiver')
+            .annotate(n=Count('pk'))
+            .values_list('receiver', 'n')
+        )
+        created = InboxCounter.objects.bulk_create(
+            [InboxCounter(user_id=user_id, unread_count=n) for user_id, n in missing],
+            ignore_conflicts=True,
+        )
+        _invalidate(InboxCounter.objects.values_list('user_id', flat=True))
+    return updated + len(created)
+
+
+@receiver(pre_save, sender=Message)
+def remember_read_state(sender, instance, raw=False, **kwargs):
+    if instance.pk and not raw:
+        instance._unread_receiver = (
+            Message.objects.filter(pk=instance.pk, is_read=False)
+            .values_list('receiver_id', flat=True)
+            .first()
+        )
+
+
+@receiver(post_save, sender=Message)
+def count_saved_message(sender, instance, created, raw=False, **kwargs):
+    if raw:
+        return
+    previous_receiver = None if created else getattr(instance, '_unread_receiver', None)
+    current_receiver = None if instance.is_read else instance.receiver_id
+    if previous_receiver != current_receiver:
+        if previous_receiver is not None:
+            adjust_unread_count(previous_receiver, -1)
+        if current_receiver is not None:
+            adjust_unread_count(current_receiver, 1)
+
+
+@receiver(post_delete, sender=Message)
+def count_deleted_message(sender, instance, **kwargs):
+    if not instance.is_read:
+        adjust_unread_count(instance.receiver_id, -1)
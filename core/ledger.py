@@ -0,0 +1,93 @@
+from decimal import Decimal
+
+from django.db import IntegrityError, transaction
+from django.db.models import Case, DecimalField, F, OuterRef, Subquery, Sum, Value, When
+from django.db.models.functions import Coalesce
+
+from .fees import invalidate_fee_schedules
+from .models import Payment, Student
+from .student_dashboard import invalidate_student_dashboards
+
+CENT = Decimal('0.01')
+
+
+def _balance_update(paid):
+    """
+    UPDATE values setting ``fees_paid`` to ``paid`` and deriving the balance from it.
+
+    MySQL evaluates SET clauses left to right and later clauses see the new
+    values, so ``fees_paid`` is assigned last: that way an expression such as
+    ``F('fees_paid') + amount`` reads the old value in every clause, as it
+    does on other backends.
+    """
+    return {
+        'remaining_fee': F('total_fees') - paid,
+        'fee_status': Case(When(total_fees=paid, then=Value(True)), default=Value(False)),
+        'fees_paid': paid,
+    }
+
+
+def record_payment(student, amount, course=None, reference=None, payment_method='mpesa', **details):
+    """
+    Append a payment to the ledger and apply it to the student's balance.
+
+    The balance is updated with a single UPDATE ... SET fees_paid = fees_paid + amount
+    in the same transaction as the Payment insert, so concurrent callbacks for
+    the same student cannot lose a payment. ``reference`` (e.g. the M-Pesa
+    receipt number) is unique: replaying a callback returns the payment that
+    was already recorded. ``amount`` is rounded to cents; floats go through
+    their shortest repr, so 0.1 is recorded as 0.10 rather than its binary
+    expansion. Returns ``(payment, created)``.
+    """
+    amount = Decimal(str(amount)).quantize(CENT)
+    try:
+        with transaction.atomic():
+            payment = Payment.objects.create(
+                student=student,
+                course=course,
+                amount_paid=amount,
+                total_fee=student.total_fees,
+                reference=reference,
+                payment_method=payment_method,
+                **details,
+            )
+            Student.objects.filter(pk=student.pk).update(**_balance_update(F('fees_paid') + amount))
+    except IntegrityError:
+        if reference is None:
+            raise
+        return Payment.objects.get(reference=reference), False
+
+    student.refresh_from_db(fields=['fees_paid', 'remaining_fee', 'fee_status'])
+    return payment, True
+
+
+def reconcile_balances(students=None):
+    """
+    Rebuild ``fees_paid``, ``remaining_fee`` and ``fee_status`` from the ledger.
+
+    Runs as one set-based UPDATE over ``students`` (all students by default)
+    and returns the number of rows updated. Balances paid before the ledger
+    existed are carried by the opening-balance payments of migration 0015.
+    The UPDATE fires no signals, so the cached dashboards and fee schedules
+    of those students are dropped here.
+    """
+    if students is None:
+        students = Student.objects.all()
+    ledger_total = (
+        Payment.objects.filter(student=OuterRef('pk'))
+        .order_by()
+        .values('student')
+        .annotate(total=Sum('amount_paid'))
+        .values('total')
+    )
+    paid = Coalesce(
+        Subquery(ledger_total),
+        Value(Decimal('0.00')),
+        output_field=DecimalField(max_digits=10, decimal_places=2),
+    )
+    with transaction.atomic():
+        updated = students.update(**_balance_update(paid))
+        # By user id: the snapshots are keyed by it, and this saves looking it up per student.
+        invalidate_student_dashboards(user_ids=students.values_list('user_id', flat=True))
+        invalidate_fee_schedules()
+    return updated
@@ -0,0 +1,19 @@
+from django.conf import settings
+from django.core.management.base import BaseCommand
+
+from core.retention import ARCHIVE_BATCH_SIZE, archive_notifications
+
+
+class Command(BaseCommand):
+    help = "Move read notifications older than the retention period into the notification archive."
+
+    def add_arguments(self, parser):
+        parser.add_argument('--days', type=int, default=settings.NOTIFICATION_RETENTION_DAYS)
+        parser.add_argument('--batch-size', type=int, default=ARCHIVE_BATCH_SIZE)
+        parser.add_argument('--pause', type=float, default=0.0, help="Seconds to sleep between batches.")
+
+    def handle(self, *args, **options):
+        archived = archive_notifications(
+            days=options['days'], batch_size=options['batch_size'], pause=options['pause'],
+        )
+        self.stdout.write(self.style.SUCCESS(f"Archived {archived} notifications."))
@@ -0,0 +1,18 @@
+import time
+
+from django.core.management.base import BaseCommand
+
+from core.teacher_assignment import assign_pending_enrollments
+
+
+class Command(BaseCommand):
+    help = "Give a teacher to every enrollment that has none, e.g. after adding teachers at a full level."
+
+    def add_arguments(self, parser):
+        parser.add_argument('--chunk-size', type=int, default=1000)
+
+    def handle(self, *args, **options):
+        started = time.perf_counter()
+        assigned = assign_pending_enrollments(chunk_size=options['chunk_size'])
+        elapsed = time.perf_counter() - started
+        self.stdout.write(self.style.SUCCESS(f"Assigned teachers to {assigned} enrollments in {elapsed:.2f}s."))
@@ -0,0 +1,59 @@
+import os
+import subprocess
+import sys
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+from django.conf import settings
+from django.core.management.base import BaseCommand, CommandError
+
+from core.sandbox import WorkerPool, runner_limits
+
+SUBMISSION = "total = sum(i * i for i in range(10000))\nprint(total)\n"
+
+
+class Command(BaseCommand):
+    help = (
+        "Measure code runner throughput on this machine: submissions per second "
+        "through the warm worker pool, against starting a fresh interpreter per submission."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--submissions', type=int, default=200)
+        parser.add_argument('--workers', type=int, default=os.cpu_count() or 1)
+        parser.add_argument('--language', default='python')
+        parser.add_argument('--code', help="Source to run instead of the built-in sample.")
+
+    def handle(self, *args, **options):
+        code = options['code'] or SUBMISSION
+        submissions, workers = options['submissions'], options['workers']
+        limits = runner_limits()
+        pool = WorkerPool(workers, settings.CODE_RUNNER_UID, settings.CODE_RUNNER_GID)
+        if pool.runs_as_root():
+            raise CommandError("Set CODE_RUNNER_UID to an unprivileged uid before benchmarking the code runner as root.")
+
+        pool.start()
+        try:
+            pool.run(options['language'], code, limits)  # warm-up
+            started = time.perf_counter()
+            with ThreadPoolExecutor(workers) as executor:
+                results = list(executor.map(lambda _: pool.run(options['language'], code, limits), range(submissions)))
+            pooled = time.perf_counter() - started
+        finally:
+            pool.shutdown()
+        failed = sum(result['status'] != 'ok' for result in results)
+        self.stdout.write(
+            f"warm pool ({workers} workers): {submissions / pooled:.1f} submissions/s, "
+            f"{pooled / submissions * 1000:.1f} ms each, {failed} failed"
+        )
+
+        if options['language'] == 'python':
+            started = time.perf_counter()
+            with ThreadPoolExecutor(workers) as executor:
+                list(executor.map(
+                    lambda _: subprocess.run([sys.executable, '-I', '-c', code], capture_output=True, timeout=30),
+                    range(submissions),
+                ))
+            cold = time.perf_counter() - started
+            self.stdout.write(f"cold interpreter per submission: {submissions / cold:.1f} submissions/s")
+            self.stdout.write(self.style.SUCCESS(f"Speed-up: {cold / pooled:.1f}x"))
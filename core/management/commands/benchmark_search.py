@@ -0,0 +1,79 @@
+import random
+import time
+
+from django.core.management.base import BaseCommand
+from django.db import connection
+from django.db.models import Q
+
+from core.models import SearchDocument
+from core.search import INDEX_BATCH_SIZE, _ranked_documents, search_terms
+
+BENCHMARK_KIND = 'benchmark'
+
+
+class Command(BaseCommand):
+    help = (
+        "Compare the search index against icontains scans on a synthetic dataset. "
+        "The rows go into a throwaway test database (the one the test runner uses), "
+        "never the live tables; it is dropped afterwards unless --keep is given."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--rows', type=int, default=1_000_000)
+        parser.add_argument('--queries', type=int, default=20)
+        parser.add_argument('--vocabulary', type=int, default=20_000)
+        parser.add_argument('--seed', type=int, default=0)
+        parser.add_argument('--keep', action='store_true', help="Keep the test database for another run.")
+
+    def handle(self, *args, **options):
+        live_name = connection.settings_dict['NAME']
+        connection.creation.create_test_db(verbosity=0, autoclobber=True, serialize=False, keepdb=options['keep'])
+        try:
+            self.benchmark(options)
+        finally:
+            connection.creation.destroy_test_db(live_name, verbosity=0, keepdb=options['keep'])
+
+    def benchmark(self, options):
+        rng = random.Random(options['seed'])
+        words = [self.word(rng) for _ in range(options['vocabulary'])]
+        documents = SearchDocument.objects.filter(kind=BENCHMARK_KIND)
+
+        existing = documents.count()
+        if existing < options['rows']:
+            self.stdout.write(f"Writing {options['rows'] - existing} synthetic documents...")
+            self.populate(rng, words, existing, options['rows'])
+
+        queries = [' '.join(rng.sample(words[:2000], 2)) for _ in range(options['queries'])]
+        indexed = self.time_queries(queries, lambda terms: _ranked_documents(terms, documents, 20))
+        scanned = self.time_queries(queries, lambda terms: list(
+            documents.filter(Q(title__icontains=terms[0]) | Q(body__icontains=terms[0]))[:20]
+        ))
+
+        engine = 'FULLTEXT' if connection.vendor == 'mysql' else 'icontains fallback'
+        self.stdout.write(f"search ({engine}): {indexed * 1000:.1f} ms/query")
+        self.stdout.write(f"icontains scan: {scanned * 1000:.1f} ms/query")
+        if indexed:
+            self.stdout.write(self.style.SUCCESS(f"Speed-up: {scanned / indexed:.1f}x"))
+
+    def word(self, rng):
+        return ''.join(rng.choice('abcdefghijklmnopqrstuvwxyz') for _ in range(rng.randint(4, 10)))
+
+    def populate(self, rng, words, start, rows):
+        # A Zipf-like skew: a few words are common, most are rare.
+        weights = [1 / (rank + 1) for rank in range(len(words))]
+        for offset in range(start, rows, INDEX_BATCH_SIZE):
+            SearchDocument.objects.bulk_create([
+                SearchDocument(
+                    kind=BENCHMARK_KIND,
+                    object_id=str(number),
+                    title=' '.join(rng.choices(words, weights, k=4)),
+                    body=' '.join(rng.choices(words, weights, k=40)),
+                )
+                for number in range(offset, min(offset + INDEX_BATCH_SIZE, rows))
+            ])
+
+    def time_queries(self, queries, run):
+        started = time.perf_counter()
+        for query in queries:
+            run(search_terms(query))
+        return (time.perf_counter() - started) / len(queries)
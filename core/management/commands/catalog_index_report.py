@@ -0,0 +1,28 @@
+import time
+
+from django.core.management.base import BaseCommand
+
+from core.catalog_index import CatalogIndex
+
+
+class Command(BaseCommand):
+    help = "Load the in-memory catalog index and report its memory use and lookup speed."
+
+    def handle(self, *args, **options):
+        index = CatalogIndex()
+        started = time.perf_counter()
+        index.load()
+        loaded = time.perf_counter() - started
+
+        report = index.memory_report()
+        self.stdout.write(f"Indexed {report.pop('courses')} courses in {report.pop('slots')} slots ({loaded:.2f}s).")
+        for structure, size in report.items():
+            self.stdout.write(f"  {structure}: {size / 1024:.1f} KiB")
+        self.stdout.write(f"  total: {sum(report.values()) / 1024:.1f} KiB")
+
+        runs = 1000
+        started = time.perf_counter()
+        for _ in range(runs):
+            index.matching_bits(level=['Primary'], syllabus_status=['active'], syllabus_availability=['public'])
+        per_lookup = (time.perf_counter() - started) / runs
+        self.stdout.write(self.style.SUCCESS(f"Filter intersection: {per_lookup * 1e6:.1f} µs"))
@@ -0,0 +1,41 @@
+import sys
+
+from django.core.management.base import BaseCommand, CommandError
+
+from core.statements import STATEMENT_CHUNK_SIZE, statement_queryset, statement_rows, stream_csv, stream_pdf
+
+
+class Command(BaseCommand):
+    help = "Stream fee statements for a set of students as CSV or PDF."
+
+    def add_arguments(self, parser):
+        parser.add_argument('--format', choices=['csv', 'pdf'], default='csv')
+        parser.add_argument('--output', help="File to write to; CSV defaults to standard output.")
+        parser.add_argument('--education-level', help="Only students at this education level.")
+        parser.add_argument('--unpaid-only', action='store_true', help="Only students with an outstanding balance.")
+        parser.add_argument('--student', action='append', dest='students', help="Only this student id (repeatable).")
+        parser.add_argument('--chunk-size', type=int, default=STATEMENT_CHUNK_SIZE)
+        parser.add_argument('--processes', type=int, default=1, help="Render PDF pages on this many processes.")
+
+    def handle(self, *args, **options):
+        if options['format'] == 'pdf' and not options['output']:
+            raise CommandError("PDF statements need --output.")
+        students = statement_queryset(
+            education_level=options['education_level'],
+            unpaid_only=options['unpaid_only'],
+            student_ids=options['students'],
+        )
+        rows = statement_rows(students, chunk_size=options['chunk_size'])
+
+        if options['format'] == 'csv':
+            output = open(options['output'], 'w', newline='') if options['output'] else sys.stdout
+            try:
+                for line in stream_csv(rows):
+                    output.write(line)
+            finally:
+                if options['output']:
+                    output.close()
+        else:
+            with open(options['output'], 'wb') as output:
+                for chunk in stream_pdf(rows, processes=options['processes']):
+                    output.write(chunk)
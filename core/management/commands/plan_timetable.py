@@ -0,0 +1,37 @@
+import time
+from datetime import date
+
+from django.core.management.base import BaseCommand
+
+from core.scheduling import apply_timetable, propose_timetable
+
+
+class Command(BaseCommand):
+    help = (
+        "Propose conflict-free teacher assignments for the classrooms running in a term. "
+        "Nothing is saved unless --apply is given."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('start', type=date.fromisoformat, help="First day of the term (YYYY-MM-DD).")
+        parser.add_argument('end', type=date.fromisoformat, help="Last day of the term (YYYY-MM-DD).")
+        parser.add_argument('--apply', action='store_true', help="Save the proposed teachers.")
+
+    def handle(self, *args, **options):
+        started = time.perf_counter()
+        assignments, unassigned = propose_timetable(options['start'], options['end'])
+        elapsed = time.perf_counter() - started
+
+        for assignment in assignments:
+            if assignment['proposed_teacher'] != assignment['current_teacher']:
+                self.stdout.write(
+                    f"Classroom {assignment['classroom']}: "
+                    f"{assignment['current_teacher']} -> {assignment['proposed_teacher']}"
+                )
+        for classroom_id in unassigned:
+            self.stdout.write(self.style.WARNING(f"Classroom {classroom_id}: no qualified teacher is free."))
+        self.stdout.write(f"Planned {len(assignments)} classrooms in {elapsed * 1000:.1f} ms.")
+
+        if options['apply']:
+            changed = apply_timetable(assignments)
+            self.stdout.write(self.style.SUCCESS(f"Reassigned {changed} classrooms."))
@@ -0,0 +1,18 @@
+import time
+
+from django.core.management.base import BaseCommand
+
+from core.search import INDEX_BATCH_SIZE, rebuild_search_index
+
+
+class Command(BaseCommand):
+    help = "Re-create every search document from courses, forum posts and replies, e.g. after a bulk import."
+
+    def add_arguments(self, parser):
+        parser.add_argument('--batch-size', type=int, default=INDEX_BATCH_SIZE)
+
+    def handle(self, *args, **options):
+        started = time.perf_counter()
+        indexed = rebuild_search_index(batch_size=options['batch_size'])
+        elapsed = time.perf_counter() - started
+        self.stdout.write(self.style.SUCCESS(f"Indexed {indexed} documents in {elapsed:.2f}s."))
@@ -0,0 +1,15 @@
+import time
+
+from django.core.management.base import BaseCommand
+
+from core.inbox import rebuild_unread_counters
+
+
+class Command(BaseCommand):
+    help = "Recount every user's unread messages into InboxCounter, e.g. after a bulk import or a raw UPDATE."
+
+    def handle(self, *args, **options):
+        started = time.perf_counter()
+        counters = rebuild_unread_counters()
+        elapsed = time.perf_counter() - started
+        self.stdout.write(self.style.SUCCESS(f"Rebuilt {counters} unread counters in {elapsed:.2f}s."))
@@ -0,0 +1,11 @@
+from django.core.management.base import BaseCommand
+
+from core.ledger import reconcile_balances
+
+
+class Command(BaseCommand):
+    help = "Rebuild every student's fees_paid, remaining_fee and fee_status from the Payment ledger."
+
+    def handle(self, *args, **options):
+        updated = reconcile_balances()
+        self.stdout.write(self.style.SUCCESS(f"Reconciled fee balances for {updated} students."))
@@ -0,0 +1,19 @@
+import time
+
+from django.core.management.base import BaseCommand
+
+from core.teacher_dashboard import ROLLUP_BATCH_SIZE, refresh_rollups
+
+
+class Command(BaseCommand):
+    help = "Recompute the precomputed dashboard of every teacher, or of the given teacher ids."
+
+    def add_arguments(self, parser):
+        parser.add_argument('teachers', nargs='*')
+        parser.add_argument('--batch-size', type=int, default=ROLLUP_BATCH_SIZE)
+
+    def handle(self, *args, **options):
+        started = time.perf_counter()
+        refreshed = refresh_rollups(options['teachers'] or None, batch_size=options['batch_size'])
+        elapsed = time.perf_counter() - started
+        self.stdout.write(self.style.SUCCESS(f"Refreshed {refreshed} teacher dashboards in {elapsed:.2f}s."))
@@ -0,0 +1,37 @@
+from datetime import datetime
+
+from django.core.management.base import BaseCommand, CommandError
+from django.db import IntegrityError
+
+from core.models import PayrollRun
+from core.payroll import export_payouts, run_payroll
+
+
+class Command(BaseCommand):
+    help = "Issue payslips for all active teachers for a month and export payout files."
+
+    def add_arguments(self, parser):
+        parser.add_argument('period', help="Payroll month as YYYY-MM.")
+        parser.add_argument('--export-dir', help="Write payout CSVs, one per payment channel, to this directory.")
+
+    def handle(self, *args, **options):
+        try:
+            period = datetime.strptime(options['period'], '%Y-%m').date()
+        except ValueError:
+            raise CommandError("Period must be given as YYYY-MM.")
+
+        started = datetime.now()
+        try:
+            run = run_payroll(period)
+        except IntegrityError:
+            if PayrollRun.objects.filter(period=period).exists():
+                raise CommandError(f"Payroll for {period:%Y-%m} has already been run.")
+            raise
+        elapsed = (datetime.now() - started).total_seconds()
+        self.stdout.write(self.style.SUCCESS(
+            f"{run}: {run.teacher_count} payslips, net KES {run.total_net} ({elapsed:.1f}s)."
+        ))
+
+        if options['export_dir']:
+            for path in export_payouts(run, options['export_dir']):
+                self.stdout.write(f"Wrote {path}")
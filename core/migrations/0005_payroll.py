@@ -0,0 +1,129 @@
+# Generated by Django 4.2.30 on 2026-10-18 18:25
+
+from decimal import Decimal
+from django.db import migrations, models
+import django.db.models.deletion
+
+
+class Migration(migrations.Migration):
+    dependencies = [
+        ("core", "0004_payment_ledger"),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name="PayrollRun",
+            fields=[
+                (
+                    "id",
+                    models.BigAutoField(
+                        auto_created=True,
+                        primary_key=True,
+                        serialize=False,
+                        verbose_name="ID",
+                    ),
+                ),
+                ("period", models.DateField(unique=True)),
+                ("created_at", models.DateTimeField(auto_now_add=True)),
+                ("teacher_count", models.PositiveIntegerField(default=0)),
+                (
+                    "total_gross",
+                    models.DecimalField(
+                        decimal_places=2, default=Decimal("0.00"), max_digits=14
+                    ),
+                ),
+                (
+                    "total_deductions",
+                    models.DecimalField(
+                        decimal_places=2, default=Decimal("0.00"), max_digits=14
+                    ),
+                ),
+                (
+                    "total_net",
+                    models.DecimalField(
+                        decimal_places=2, default=Decimal("0.00"), max_digits=14
+                    ),
+                ),
+            ],
+        ),
+        migrations.CreateModel(
+            name="Payslip",
+            fields=[
+                (
+                    "id",
+                    models.BigAutoField(
+                        auto_created=True,
+                        primary_key=True,
+                        serialize=False,
+                        verbose_name="ID",
+                    ),
+                ),
+                ("teacher_name", models.CharField(max_length=255)),
+                ("gross_salary", models.DecimalField(decimal_places=2, max_digits=10)),
+                ("paye", models.DecimalField(decimal_places=2, max_digits=10)),
+                ("nhif", models.DecimalField(decimal_places=2, max_digits=10)),
+                ("nssf", models.DecimalField(decimal_places=2, max_digits=10)),
+                (
+                    "loan_deductions",
+                    models.DecimalField(decimal_places=2, max_digits=10),
+                ),
+                (
+                    "total_deductions",
+                    models.DecimalField(decimal_places=2, max_digits=10),
+                ),
+                ("net_salary", models.DecimalField(decimal_places=2, max_digits=10)),
+                (
+                    "payment_method",
+                    models.CharField(
+                        choices=[("mpesa", "M-Pesa"), ("bank", "Bank Transfer")],
+                        max_length=10,
+                    ),
+                ),
+                (
+                    "mpesa_number",
+                    models.CharField(blank=True, max_length=12, null=True),
+                ),
+                (
+                    "bank_name",
+                    models.CharField(
+                        blank=True,
+                        choices=[
+                            ("kcb", "Kenya Commercial Bank (KCB)"),
+                            ("equity", "Equity Bank"),
+                            ("cooperative", "Co-operative Bank"),
+                            ("absa", "ABSA Bank Kenya"),
+                            ("stanbic", "Stanbic Bank"),
+                            ("nbk", "National Bank of Kenya"),
+                            ("dtb", "Diamond Trust Bank"),
+                        ],
+                        max_length=50,
+                        null=True,
+                    ),
+                ),
+                (
+                    "bank_account_number",
+                    models.CharField(blank=True, max_length=20, null=True),
+                ),
+                (
+                    "run",
+                    models.ForeignKey(
+                        on_delete=django.db.models.deletion.PROTECT,
+                        related_name="payslips",
+                        to="core.payrollrun",
+                    ),
+                ),
+                (
+                    "teacher",
+                    models.ForeignKey(
+                        null=True,
+                        on_delete=django.db.models.deletion.SET_NULL,
+                        related_name="payslips",
+                        to="core.teacher",
+                    ),
+                ),
+            ],
+            options={
+                "unique_together": {("run", "teacher")},
+            },
+        ),
+    ]
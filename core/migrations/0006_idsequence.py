@@ -0,0 +1,22 @@
+# Generated by Django 4.2.30 on 2026-10-18 18:27
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+    dependencies = [
+        ("core", "0005_payroll"),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name="IdSequence",
+            fields=[
+                (
+                    "prefix",
+                    models.CharField(max_length=3, primary_key=True, serialize=False),
+                ),
+                ("next_value", models.BigIntegerField(default=1)),
+            ],
+        ),
+    ]
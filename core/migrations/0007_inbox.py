@@ -0,0 +1,61 @@
+# Generated by Django 4.2.30 on 2026-10-18 18:31
+
+from django.conf import settings
+from django.db import migrations, models
+import django.db.models.deletion
+
+
+def backfill_unread_counters(apps, schema_editor):
+    Message = apps.get_model("core", "Message")
+    InboxCounter = apps.get_model("core", "InboxCounter")
+    unread = (
+        Message.objects.filter(is_read=False)
+        .order_by()
+        .values("receiver")
+        .annotate(n=models.Count("pk"))
+        .values_list("receiver", "n")
+    )
+    InboxCounter.objects.bulk_create(
+        [InboxCounter(user_id=user_id, unread_count=n) for user_id, n in unread],
+        batch_size=1000,
+    )
+
+
+class Migration(migrations.Migration):
+    dependencies = [
+        ("auth", "0012_alter_user_first_name_max_length"),
+        ("core", "0006_idsequence"),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name="InboxCounter",
+            fields=[
+                (
+                    "user",
+                    models.OneToOneField(
+                        on_delete=django.db.models.deletion.CASCADE,
+                        primary_key=True,
+                        related_name="inbox_counter",
+                        serialize=False,
+                        to=settings.AUTH_USER_MODEL,
+                    ),
+                ),
+                ("unread_count", models.PositiveIntegerField(default=0)),
+            ],
+        ),
+        migrations.AddIndex(
+            model_name="message",
+            index=models.Index(
+                fields=["receiver", "is_read", "timestamp"], name="message_inbox_idx"
+            ),
+        ),
+        migrations.AddIndex(
+            model_name="message",
+            index=models.Index(
+                fields=["receiver", "sender", "is_read"],
+                name="message_conversation_idx",
+            ),
+        ),
+        migrations.RunPython(backfill_unread_counters, migrations.RunPython.noop),
+    ]
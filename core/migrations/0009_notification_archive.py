@@ -0,0 +1,58 @@
+# Generated by Django 4.2.30 on 2026-10-18 18:38
+
+from django.conf import settings
+from django.db import migrations, models
+import django.db.models.deletion
+
+
+class Migration(migrations.Migration):
+    dependencies = [
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+        ("core", "0008_broadcast"),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name="NotificationArchive",
+            fields=[
+                ("id", models.BigIntegerField(primary_key=True, serialize=False)),
+                ("content", models.TextField()),
+                ("link", models.URLField(blank=True, null=True)),
+                ("timestamp", models.DateTimeField()),
+                ("month", models.DateField()),
+                ("archived_at", models.DateTimeField(auto_now_add=True)),
+            ],
+        ),
+        migrations.AddIndex(
+            model_name="notification",
+            index=models.Index(
+                fields=["recipient", "is_read", "-timestamp"],
+                name="notification_inbox_idx",
+            ),
+        ),
+        migrations.AddIndex(
+            model_name="notification",
+            index=models.Index(
+                fields=["is_read", "timestamp"], name="notification_retention_idx"
+            ),
+        ),
+        migrations.AddField(
+            model_name="notificationarchive",
+            name="recipient",
+            field=models.ForeignKey(
+                on_delete=django.db.models.deletion.CASCADE,
+                related_name="archived_notifications",
+                to=settings.AUTH_USER_MODEL,
+            ),
+        ),
+        migrations.AddIndex(
+            model_name="notificationarchive",
+            index=models.Index(
+                fields=["recipient", "-timestamp"], name="notif_archive_recipient_idx"
+            ),
+        ),
+        migrations.AddIndex(
+            model_name="notificationarchive",
+            index=models.Index(fields=["month"], name="notif_archive_month_idx"),
+        ),
+    ]
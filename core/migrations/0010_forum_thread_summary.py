@@ -0,0 +1,74 @@
+# Generated by Django 4.2.30 on 2026-10-18 18:39
+
+from django.conf import settings
+from django.db import migrations, models
+import django.db.models.deletion
+
+
+def backfill_thread_summaries(apps, schema_editor):
+    DiscussionForumPost = apps.get_model("core", "DiscussionForumPost")
+    ForumThreadSummary = apps.get_model("core", "ForumThreadSummary")
+    Reply = apps.get_model("core", "Reply")
+    latest = Reply.objects.filter(post=models.OuterRef("pk")).order_by(
+        "-timestamp", "-pk"
+    )
+    posts = DiscussionForumPost.objects.annotate(
+        reply_count=models.Count("reply"),
+        last_reply_at=models.Subquery(latest.values("timestamp")[:1]),
+        last_author_id=models.Subquery(latest.values("author_id")[:1]),
+    ).values_list("pk", "reply_count", "last_reply_at", "last_author_id")
+    ForumThreadSummary.objects.bulk_create(
+        [
+            ForumThreadSummary(
+                post_id=pk,
+                reply_count=count,
+                last_reply_at=last_reply_at,
+                last_author_id=last_author_id,
+            )
+            for pk, count, last_reply_at, last_author_id in posts.iterator()
+        ],
+        batch_size=1000,
+    )
+
+
+class Migration(migrations.Migration):
+    dependencies = [
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+        ("core", "0009_notification_archive"),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name="ForumThreadSummary",
+            fields=[
+                (
+                    "post",
+                    models.OneToOneField(
+                        on_delete=django.db.models.deletion.CASCADE,
+                        primary_key=True,
+                        related_name="summary",
+                        serialize=False,
+                        to="core.discussionforumpost",
+                    ),
+                ),
+                ("reply_count", models.PositiveIntegerField(default=0)),
+                ("last_reply_at", models.DateTimeField(blank=True, null=True)),
+            ],
+        ),
+        migrations.AddIndex(
+            model_name="reply",
+            index=models.Index(fields=["post", "timestamp"], name="reply_thread_idx"),
+        ),
+        migrations.AddField(
+            model_name="forumthreadsummary",
+            name="last_author",
+            field=models.ForeignKey(
+                blank=True,
+                null=True,
+                on_delete=django.db.models.deletion.SET_NULL,
+                related_name="+",
+                to=settings.AUTH_USER_MODEL,
+            ),
+        ),
+        migrations.RunPython(backfill_thread_summaries, migrations.RunPython.noop),
+    ]
@@ -0,0 +1,124 @@
+# Generated by Django 4.2.30 on 2026-10-18 18:40
+
+from django.db import migrations, models
+import django.db.models.deletion
+
+
+def add_fulltext_index(apps, schema_editor):
+    if schema_editor.connection.vendor == "mysql":
+        schema_editor.execute(
+            "ALTER TABLE core_searchdocument "
+            "ADD FULLTEXT INDEX searchdocument_fulltext (title, body)"
+        )
+
+
+def drop_fulltext_index(apps, schema_editor):
+    if schema_editor.connection.vendor == "mysql":
+        schema_editor.execute(
+            "ALTER TABLE core_searchdocument DROP INDEX searchdocument_fulltext"
+        )
+
+
+BACKFILL_BATCH_SIZE = 1000
+
+
+def backfill_search_documents(apps, schema_editor):
+    # Streams the source tables and writes documents in batches, so memory
+    # stays flat however large they are.
+    SearchDocument = apps.get_model("core", "SearchDocument")
+    Course = apps.get_model("core", "Course")
+    DiscussionForumPost = apps.get_model("core", "DiscussionForumPost")
+    Reply = apps.get_model("core", "Reply")
+    sources = [
+        (
+            Course.objects.order_by("pk"),
+            lambda course: SearchDocument(
+                kind="course",
+                object_id=course.pk,
+                course_id=course.pk,
+                title=course.title,
+                body=f"{course.description}\n{course.requirements}",
+            ),
+        ),
+        (
+            DiscussionForumPost.objects.order_by("pk"),
+            lambda post: SearchDocument(
+                kind="post",
+                object_id=str(post.pk),
+                course_id=post.course_id,
+                body=post.post_content,
+            ),
+        ),
+        (
+            Reply.objects.select_related("post")
+            .only("content", "post__course_id")
+            .order_by("pk"),
+            lambda reply: SearchDocument(
+                kind="reply",
+                object_id=str(reply.pk),
+                course_id=reply.post.course_id,
+                body=reply.content,
+            ),
+        ),
+    ]
+    for queryset, build in sources:
+        batch = []
+        for instance in queryset.iterator(chunk_size=BACKFILL_BATCH_SIZE):
+            batch.append(build(instance))
+            if len(batch) == BACKFILL_BATCH_SIZE:
+                SearchDocument.objects.bulk_create(batch)
+                batch = []
+        SearchDocument.objects.bulk_create(batch)
+
+
+class Migration(migrations.Migration):
+    dependencies = [
+        ("core", "0010_forum_thread_summary"),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name="SearchDocument",
+            fields=[
+                (
+                    "id",
+                    models.BigAutoField(
+                        auto_created=True,
+                        primary_key=True,
+                        serialize=False,
+                        verbose_name="ID",
+                    ),
+                ),
+                (
+                    "kind",
+                    models.CharField(
+                        choices=[
+                            ("course", "Course"),
+                            ("post", "Forum post"),
+                            ("reply", "Reply"),
+                        ],
+                        max_length=10,
+                    ),
+                ),
+                ("object_id", models.CharField(max_length=100)),
+                ("title", models.CharField(blank=True, max_length=255)),
+                ("body", models.TextField(blank=True)),
+                ("updated_at", models.DateTimeField(auto_now=True)),
+                (
+                    "course",
+                    models.ForeignKey(
+                        blank=True,
+                        null=True,
+                        on_delete=django.db.models.deletion.CASCADE,
+                        related_name="+",
+                        to="core.course",
+                    ),
+                ),
+            ],
+            options={
+                "unique_together": {("kind", "object_id")},
+            },
+        ),
+        migrations.RunPython(add_fulltext_index, drop_fulltext_index),
+        migrations.RunPython(backfill_search_documents, migrations.RunPython.noop),
+    ]
@@ -0,0 +1,92 @@
+# Generated by Django 4.2.30 on 2026-10-18 18:48
+
+from django.db import migrations, models
+import django.db.models.deletion
+
+
+def merge_duplicate_progress(apps, schema_editor):
+    Progress = apps.get_model("core", "Progress")
+    Student = apps.get_model("core", "Student")
+    duplicates = (
+        Progress.objects.values("student_id", "course_id")
+        .annotate(n=models.Count("pk"))
+        .filter(n__gt=1)
+    )
+    for pair in duplicates.iterator():
+        rows = Progress.objects.filter(
+            student_id=pair["student_id"], course_id=pair["course_id"]
+        ).order_by("-modules_completed", "pk")
+        keep, *others = rows
+        others = [row.pk for row in others]
+        Student.objects.filter(progress_id__in=others).update(progress_id=keep.pk)
+        Progress.objects.filter(pk__in=others).delete()
+
+
+class Migration(migrations.Migration):
+    dependencies = [
+        ("core", "0011_search_document"),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name="ModuleCompletion",
+            fields=[
+                (
+                    "id",
+                    models.BigAutoField(
+                        auto_created=True,
+                        primary_key=True,
+                        serialize=False,
+                        verbose_name="ID",
+                    ),
+                ),
+                ("module", models.CharField(max_length=100)),
+                ("completed_at", models.DateTimeField(auto_now_add=True)),
+            ],
+        ),
+        migrations.AddField(
+            model_name="course",
+            name="total_modules",
+            field=models.PositiveIntegerField(default=0),
+        ),
+        migrations.AlterField(
+            model_name="student",
+            name="progress",
+            field=models.ForeignKey(
+                blank=True,
+                null=True,
+                on_delete=django.db.models.deletion.SET_NULL,
+                related_name="student_progress",
+                to="core.progress",
+            ),
+        ),
+        migrations.RunPython(merge_duplicate_progress, migrations.RunPython.noop),
+        migrations.AddConstraint(
+            model_name="progress",
+            constraint=models.UniqueConstraint(
+                fields=("student", "course"), name="unique_progress_per_course"
+            ),
+        ),
+        migrations.AddField(
+            model_name="modulecompletion",
+            name="course",
+            field=models.ForeignKey(
+                on_delete=django.db.models.deletion.CASCADE,
+                related_name="module_completions",
+                to="core.course",
+            ),
+        ),
+        migrations.AddField(
+            model_name="modulecompletion",
+            name="student",
+            field=models.ForeignKey(
+                on_delete=django.db.models.deletion.CASCADE,
+                related_name="module_completions",
+                to="core.student",
+            ),
+        ),
+        migrations.AlterUniqueTogether(
+            name="modulecompletion",
+            unique_together={("student", "course", "module")},
+        ),
+    ]
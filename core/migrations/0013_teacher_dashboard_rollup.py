@@ -0,0 +1,42 @@
+# Generated by Django 4.2.30 on 2026-10-18 18:52
+
+from django.db import migrations, models
+import django.db.models.deletion
+
+
+class Migration(migrations.Migration):
+    dependencies = [
+        ("core", "0012_module_progress"),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name="TeacherDashboardRollup",
+            fields=[
+                (
+                    "teacher",
+                    models.OneToOneField(
+                        on_delete=django.db.models.deletion.CASCADE,
+                        primary_key=True,
+                        related_name="dashboard",
+                        serialize=False,
+                        to="core.teacher",
+                    ),
+                ),
+                ("classroom_count", models.PositiveIntegerField(default=0)),
+                ("student_count", models.PositiveIntegerField(default=0)),
+                ("enrollment_count", models.PositiveIntegerField(default=0)),
+                ("pending_submissions", models.PositiveIntegerField(default=0)),
+                ("unread_messages", models.PositiveIntegerField(default=0)),
+                (
+                    "average_score",
+                    models.DecimalField(
+                        blank=True, decimal_places=2, max_digits=5, null=True
+                    ),
+                ),
+                ("classrooms", models.JSONField(default=list)),
+                ("course_scores", models.JSONField(default=list)),
+                ("refreshed_at", models.DateTimeField(blank=True, null=True)),
+            ],
+        ),
+    ]
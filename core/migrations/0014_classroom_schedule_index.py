@@ -0,0 +1,18 @@
+# Generated by Django 4.2.30 on 2026-10-18 18:56
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+    dependencies = [
+        ("core", "0013_teacher_dashboard_rollup"),
+    ]
+
+    operations = [
+        migrations.AddIndex(
+            model_name="classroom",
+            index=models.Index(
+                fields=["teacher", "start_date"], name="classroom_schedule_idx"
+            ),
+        ),
+    ]
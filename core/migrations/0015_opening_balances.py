@@ -0,0 +1,64 @@
+from decimal import Decimal
+
+from django.db import migrations
+from django.db.models import DecimalField, OuterRef, Subquery, Sum, Value
+from django.db.models.functions import Coalesce
+
+BATCH_SIZE = 1000
+
+
+def record_opening_balances(apps, schema_editor):
+    """
+    Give every student whose fees_paid predates the ledger an opening-balance
+    Payment for the difference, so reconcile_balances() keeps their balance.
+    """
+    Payment = apps.get_model("core", "Payment")
+    Student = apps.get_model("core", "Student")
+    ledger_total = (
+        Payment.objects.filter(student=OuterRef("pk"))
+        .order_by()
+        .values("student")
+        .annotate(total=Sum("amount_paid"))
+        .values("total")
+    )
+    students = Student.objects.annotate(
+        ledger=Coalesce(
+            Subquery(ledger_total),
+            Value(Decimal("0.00")),
+            output_field=DecimalField(max_digits=10, decimal_places=2),
+        )
+    ).values_list("pk", "fees_paid", "total_fees", "ledger")
+    batch = []
+    for student_id, fees_paid, total_fees, ledger in students.iterator(
+        chunk_size=BATCH_SIZE
+    ):
+        if fees_paid == ledger:
+            continue
+        batch.append(
+            Payment(
+                student_id=student_id,
+                amount_paid=fees_paid - ledger,
+                total_fee=total_fees,
+                is_fully_paid=fees_paid - ledger >= total_fees,
+                reference=f"opening-balance:{student_id}",
+            )
+        )
+        if len(batch) >= BATCH_SIZE:
+            Payment.objects.bulk_create(batch, ignore_conflicts=True)
+            batch = []
+    Payment.objects.bulk_create(batch, ignore_conflicts=True)
+
+
+def remove_opening_balances(apps, schema_editor):
+    Payment = apps.get_model("core", "Payment")
+    Payment.objects.filter(reference__startswith="opening-balance:").delete()
+
+
+class Migration(migrations.Migration):
+    dependencies = [
+        ("core", "0014_classroom_schedule_index"),
+    ]
+
+    operations = [
+        migrations.RunPython(record_opening_balances, remove_opening_balances),
+    ]
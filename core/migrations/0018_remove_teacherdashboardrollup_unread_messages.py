@@ -0,0 +1,16 @@
+# Generated by Django 4.2.30 on 2026-10-18 20:16
+
+from django.db import migrations
+
+
+class Migration(migrations.Migration):
+    dependencies = [
+        ("core", "0017_broadcast_batch"),
+    ]
+
+    operations = [
+        migrations.RemoveField(
+            model_name="teacherdashboardrollup",
+            name="unread_messages",
+        ),
+    ]
@@ -1,12 +1,13 @@
-from django.db import models
+from django.db import models, transaction
 from django.contrib.auth.models import User, Group, Permission
 from django.dispatch import receiver
 from django.db.models.signals import post_save
 from django.contrib.contenttypes.models import ContentType
 from django.conf import settings
-from django.utils.crypto import get_random_string
+from django.core.exceptions import ValidationError
 from django.core.validators import MinValueValidator, MaxValueValidator
 from decimal import Decimal
+from django.utils import timezone
 from django.core.mail import send_mail
 from twilio.rest import Client
 from django.contrib.auth import get_user_model
@@ -39,6 +40,14 @@ def remove_admins_group():
     except Group.DoesNotExist:
         pass
 
+class IdSequence(models.Model):
+    """Next free number per id prefix; advanced in blocks by core.ids.IdAllocator."""
+    prefix = models.CharField(max_length=3, primary_key=True)
+    next_value = models.BigIntegerField(default=1)
+
+    def __str__(self):
+        return f"{self.prefix}: {self.next_value}"
+
 class Admin(models.Model):
     id = models.CharField(max_length=10, primary_key=True)
     user = models.OneToOneField(settings.AUTH_USER_MODEL, on_delete=models.CASCADE)
@@ -63,6 +72,12 @@ class Teacher(models.Model):
         ('dtb', 'Diamond Trust Bank'),
     ]
 
+    ID_PREFIX = 'TEA'
+
+    PAYE_TAX_RATE = Decimal('0.30')
+    NHIF_RATE = Decimal('0.02')
+    NSSF_RATE = Decimal('0.06')
+
     id = models.CharField(max_length=10, primary_key=True, editable=False)
     user = models.OneToOneField(settings.AUTH_USER_MODEL, on_delete=models.CASCADE)
     full_name = models.CharField(max_length=255)
@@ -89,7 +104,7 @@ class Teacher(models.Model):
 
     net_salary = models.DecimalField(max_digits=10, decimal_places=2, blank=True, null=True, editable=False)
     tax_deductions = models.DecimalField(max_digits=10, decimal_places=2, blank=True, null=True, editable=False)
-    loan_deductions = models.DecimalField(max_digits=10, decimal_places=2, default=0.00, validators=[MinValueValidator(Decimal('0.00'))])
+    loan_deductions = models.DecimalField(max_digits=10, decimal_places=2, default=Decimal('0.00'), validators=[MinValueValidator(Decimal('0.00'))])
 
     students = models.ManyToManyField('Student', through='ClassStudent')
 
@@ -101,19 +116,14 @@ class Teacher(models.Model):
         super(Teacher, self).save(*args, **kwargs)
 
     def generate_id(self):
-        prefix = "TEA"
-        random_id = get_random_string(6, allowed_chars='0123456789')
-        return f"{prefix}{random_id}"
+        from .ids import allocator
+        return allocator.next_id(self.ID_PREFIX)
 
     def calculate_salary_deductions(self):
-        PAYE_TAX_RATE = Decimal('0.30')
-        NHIF_RATE = Decimal('0.02')
-        NSSF_RATE = Decimal('0.06')
-
         gross_salary = self.payment_rate
-        tax_deductions = gross_salary * PAYE_TAX_RATE
-        nhif_deductions = gross_salary * NHIF_RATE
-        nssf_deductions = gross_salary * NSSF_RATE
+        tax_deductions = gross_salary * self.PAYE_TAX_RATE
+        nhif_deductions = gross_salary * self.NHIF_RATE
+        nssf_deductions = gross_salary * self.NSSF_RATE
         total_deductions = tax_deductions + nhif_deductions + nssf_deductions + self.loan_deductions
 
         self.tax_deductions = total_deductions
@@ -132,7 +142,21 @@ class ClassStudent(models.Model):
         unique_together = ('class_obj', 'student', 'teacher')
 
     def __str__(self):
-        return f"{self.student.full_name} enrolled in {self.class_obj.course.name} class"
+        return f"{self.student.full_name} enrolled in {self.class_obj.course.title} class"
+
+    def clean(self):
+        """Reject a classroom whose dates overlap another one the student attends."""
+        from .scheduling import class_student_conflicts
+        errors = class_student_conflicts(self)
+        if errors:
+            raise ValidationError(errors)
+
+    def save(self, *args, **kwargs):
+        # clean() only runs for forms; the check is repeated here with the student locked.
+        from .scheduling import check_class_student
+        with transaction.atomic():
+            check_class_student(self)
+            super().save(*args, **kwargs)
 
 class Student(models.Model):
     PAYMENT_METHOD_CHOICES = [
@@ -162,6 +186,15 @@ class Student(models.Model):
 
     MPESA_PAYBILL_NUMBER = '123456'
 
+    ID_PREFIX = 'STU'
+
+    # Written only by core.ledger, from the Payment rows.
+    BALANCE_FIELDS = ['fees_paid', 'remaining_fee', 'fee_status']
+
+    MULTI_COURSE_DISCOUNT_RATE = Decimal('0.85')
+    INITIAL_PAYMENT_SHARE = Decimal('0.60')
+    FINAL_PAYMENT_SHARE = Decimal('0.40')
+
     id = models.CharField(max_length=10, primary_key=True, editable=False)
     user = models.OneToOneField(settings.AUTH_USER_MODEL, on_delete=models.CASCADE)
     full_name = models.CharField(max_length=255)
@@ -172,10 +205,11 @@ class Student(models.Model):
         ('High School', 'High School'),
         ('University', 'University'),
     ], blank=False)
-    fees_paid = models.DecimalField(max_digits=10, decimal_places=2, default=0.00)
+    fees_paid = models.DecimalField(max_digits=10, decimal_places=2, default=Decimal('0.00'))
     total_fees = models.DecimalField(max_digits=10, decimal_places=2)
     fee_status = models.BooleanField(default=False)
-    progress = models.ForeignKey('Progress', on_delete=models.CASCADE, related_name='student_progress')
+    # Legacy pointer to one Progress row; per-course progress lives in Student.progresses.
+    progress = models.ForeignKey('Progress', on_delete=models.SET_NULL, related_name='student_progress', blank=True, null=True)
     enrolled_courses = models.ManyToManyField('Course', through='Enrollment')
     remaining_fee = models.DecimalField(max_digits=10, decimal_places=2, editable=False)
 
@@ -187,14 +221,26 @@ class Student(models.Model):
     def save(self, *args, **kwargs):
         if not self.id:
             self.id = self.generate_id()
-        self.remaining_fee = self.total_fees - self.fees_paid
-        self.fee_status = self.remaining_fee == 0
-        super(Student, self).save(*args, **kwargs)
+        if self._state.adding:
+            self.remaining_fee = self.total_fees - self.fees_paid
+            self.fee_status = self.remaining_fee == 0
+            return super(Student, self).save(*args, **kwargs)
+
+        # This instance's fees_paid may be older than the ledger's: write every
+        # other field, then derive the balance from the stored value.
+        from .ledger import _balance_update
+        update_fields = kwargs.pop('update_fields', None)
+        if update_fields is None:
+            update_fields = [field.name for field in self._meta.concrete_fields if not field.primary_key]
+        update_fields = [name for name in update_fields if name not in self.BALANCE_FIELDS]
+        with transaction.atomic():
+            super(Student, self).save(*args, update_fields=update_fields, **kwargs)
+            Student.objects.filter(pk=self.pk).update(**_balance_update(models.F('fees_paid')))
+        self.refresh_from_db(fields=self.BALANCE_FIELDS)
 
     def generate_id(self):
-        prefix = "STU"
-        random_id = get_random_string(6, allowed_chars='0123456789')
-        return f"{prefix}{random_id}"
+        from .ids import allocator
+        return allocator.next_id(self.ID_PREFIX)
 
     def get_payment_instructions(self):
         if self.payment_method == 'mpesa':
@@ -206,19 +252,20 @@ class Student(models.Model):
 
     def apply_discount(self):
         """Apply a 15% discount if the student enrolls in more than one course."""
-        if self.enrolled_courses.count() > 1:
-            return self.total_fees * Decimal('0.85')
+        from .fees import enrolled_course_count
+        if enrolled_course_count(self) > 1:
+            return self.total_fees * self.MULTI_COURSE_DISCOUNT_RATE
         return self.total_fees
 
     def initial_payment(self):
         """Initial payment is 60% of the total (or discounted) fee."""
         discounted_fees = self.apply_discount()
-        return discounted_fees * Decimal('0.60')
+        return discounted_fees * self.INITIAL_PAYMENT_SHARE
 
     def final_payment(self):
         """Final payment is the remaining 40% of the total (or discounted) fee."""
         discounted_fees = self.apply_discount()
-        return discounted_fees * Decimal('0.40')
+        return discounted_fees * self.FINAL_PAYMENT_SHARE
 
     def __str__(self):
         return self.full_name
@@ -232,8 +279,25 @@ class Classroom(models.Model):
     start_date = models.DateField()
     end_date = models.DateField()
 
+    class Meta:
+        indexes = [models.Index(fields=['teacher', 'start_date'], name='classroom_schedule_idx')]
+
     def __str__(self):
-        return f"{self.course.name} taught by {self.teacher.full_name}"
+        return f"{self.course.title} taught by {self.teacher.full_name}"
+
+    def clean(self):
+        """Reject dates that double-book the teacher or a student already in the classroom."""
+        from .scheduling import classroom_conflicts
+        errors = classroom_conflicts(self)
+        if errors:
+            raise ValidationError(errors)
+
+    def save(self, *args, **kwargs):
+        # clean() only runs for forms; the check is repeated here with the teacher and roster locked.
+        from .scheduling import check_classroom
+        with transaction.atomic():
+            check_classroom(self)
+            super().save(*args, **kwargs)
 
 class Course(models.Model):
     PAYMENT_METHOD_CHOICES = [
@@ -322,6 +386,7 @@ class Course(models.Model):
     end_date = models.DateField()
     price = models.DecimalField(max_digits=10, decimal_places=2)
     requirements = models.TextField()
+    total_modules = models.PositiveIntegerField(default=0)
 
     payment_method = models.CharField(max_length=10, choices=PAYMENT_METHOD_CHOICES, blank=False, default='mpesa')
     mpesa_phone_number = models.CharField(max_length=12, blank=True, null=True)
@@ -372,10 +437,12 @@ class Payment(models.Model):
     MPESA_PAYBILL_NUMBER = '123456'
 
     student = models.ForeignKey(Student, related_name='payments', on_delete=models.CASCADE)
-    course = models.ForeignKey('Course', on_delete=models.CASCADE)
+    course = models.ForeignKey('Course', on_delete=models.CASCADE, blank=True, null=True)
     amount_paid = models.DecimalField(max_digits=10, decimal_places=2)
     total_fee = models.DecimalField(max_digits=10, decimal_places=2)
     is_fully_paid = models.BooleanField(default=False)
+    reference = models.CharField(max_length=64, unique=True, blank=True, null=True)
+    created_at = models.DateTimeField(auto_now_add=True)
     
     payment_method = models.CharField(max_length=10, choices=PAYMENT_METHOD_CHOICES, default='mpesa')
     mpesa_phone_number = models.CharField(max_length=12, blank=True, null=True)
@@ -447,6 +514,9 @@ class Assessment(models.Model):
         ('exam', 'Exam')
     ]
 
+    # Share of the final grade carried by each assessment type.
+    TYPE_WEIGHTS = {'quiz': 0.2, 'assignment': 0.3, 'exam': 0.5}
+
     title = models.CharField(max_length=100)
     course = models.ForeignKey('Course', on_delete=models.CASCADE)
     description = models.TextField(blank=False, null=False)
@@ -476,9 +546,26 @@ class Progress(models.Model):
     total_modules = models.IntegerField(default=0)
     progress_percentage = models.DecimalField(max_digits=5, decimal_places=2, default=0.0)
 
+    class Meta:
+        constraints = [models.UniqueConstraint(fields=['student', 'course'], name='unique_progress_per_course')]
+
     def __str__(self):
         return f"{self.student} - {self.course} - {self.progress_percentage}%"
 
+
+class ModuleCompletion(models.Model):
+    """A student finishing one module of a course; recorded once, see core.progress."""
+    student = models.ForeignKey('Student', related_name='module_completions', on_delete=models.CASCADE)
+    course = models.ForeignKey('Course', related_name='module_completions', on_delete=models.CASCADE)
+    module = models.CharField(max_length=100)
+    completed_at = models.DateTimeField(auto_now_add=True)
+
+    class Meta:
+        unique_together = ('student', 'course', 'module')
+
+    def __str__(self):
+        return f"{self.student} completed {self.module} of {self.course}"
+
 class Enrollment(models.Model):
     student = models.ForeignKey('Student', on_delete=models.CASCADE)
     course = models.ForeignKey('Course', on_delete=models.CASCADE)
@@ -491,18 +578,15 @@ class Enrollment(models.Model):
         return f"{self.student} - {self.course}"
 
     def save(self, *args, **kwargs):
-        if not self.teacher:
-            self.teacher = self.assign_teacher()
-        super(Enrollment, self).save(*args, **kwargs)
+        with transaction.atomic():
+            if not self.teacher:
+                self.teacher = self.assign_teacher()
+            super(Enrollment, self).save(*args, **kwargs)
 
     def assign_teacher(self):
-        """Assign a teacher with less than 10 classes and relevant to the student's level."""
-        relevant_teachers = Teacher.objects.filter(teaching_level=self.student.education_level)
-        suitable_teachers = [teacher for teacher in relevant_teachers if teacher.enrollment_set.count() < 10]
-        
-        if suitable_teachers:
-            return suitable_teachers[0]
-        return None
+        """Assign the least loaded teacher with less than 10 classes at the student's level."""
+        from .teacher_assignment import assign_teacher
+        return assign_teacher(self.student.education_level)
     
 
 class Message(models.Model):
@@ -513,9 +597,30 @@ class Message(models.Model):
     course = models.ForeignKey('Course', on_delete=models.CASCADE)
     is_read = models.BooleanField(default=False)
 
+    class Meta:
+        indexes = [
+            models.Index(fields=['receiver', 'is_read', 'timestamp'], name='message_inbox_idx'),
+            models.Index(fields=['receiver', 'sender', 'is_read'], name='message_conversation_idx'),
+        ]
+
     def __str__(self):
         return f"{self.sender} to {self.receiver}: {self.content[:20]}"
 
+    def save(self, *args, **kwargs):
+        # core.inbox adjusts the unread counters from post_save; running the
+        # save in a transaction keeps the row and its counter change together.
+        with transaction.atomic():
+            super().save(*args, **kwargs)
+
+
+class InboxCounter(models.Model):
+    """Unread message count per user, kept in step with Message by core.inbox."""
+    user = models.OneToOneField(settings.AUTH_USER_MODEL, on_delete=models.CASCADE, primary_key=True, related_name='inbox_counter')
+    unread_count = models.PositiveIntegerField(default=0)
+
+    def __str__(self):
+        return f"{self.user}: {self.unread_count} unread"
+
 
 class DiscussionForumPost(models.Model):
     course = models.ForeignKey('Course', on_delete=models.CASCADE)
@@ -533,8 +638,22 @@ class Reply(models.Model):
     content = models.TextField()
     timestamp = models.DateTimeField(auto_now_add=True)
 
+    class Meta:
+        indexes = [models.Index(fields=['post', 'timestamp'], name='reply_thread_idx')]
+
     def __str__(self):
         return f"{self.author} - {self.post}: {self.content[:20]}"
+
+
+class ForumThreadSummary(models.Model):
+    """Reply count and latest reply of a forum post, kept up to date by core.forum."""
+    post = models.OneToOneField(DiscussionForumPost, related_name='summary', on_delete=models.CASCADE, primary_key=True)
+    reply_count = models.PositiveIntegerField(default=0)
+    last_reply_at = models.DateTimeField(blank=True, null=True)
+    last_author = models.ForeignKey(settings.AUTH_USER_MODEL, related_name='+', on_delete=models.SET_NULL, blank=True, null=True)
+
+    def __str__(self):
+        return f"{self.post}: {self.reply_count} replies"
     
 class Notification(models.Model):
     recipient = models.ForeignKey(settings.AUTH_USER_MODEL, on_delete=models.CASCADE)
@@ -542,9 +661,43 @@ class Notification(models.Model):
     link = models.URLField(blank=True, null=True)
     is_read = models.BooleanField(default=False)
     timestamp = models.DateTimeField(auto_now_add=True)
+    broadcast = models.ForeignKey('Broadcast', related_name='notifications', on_delete=models.SET_NULL, blank=True, null=True)
+
+    class Meta:
+        indexes = [
+            # "Recent unread for user", newest first.
+            models.Index(fields=['recipient', 'is_read', '-timestamp'], name='notification_inbox_idx'),
+            # Finds read notifications past retention for core.retention.
+            models.Index(fields=['is_read', 'timestamp'], name='notification_retention_idx'),
+        ]
 
     def __str__(self):
         return f"{self.recipient}: {self.content[:20]}"
+
+
+class NotificationArchive(models.Model):
+    """
+    Read notifications moved out of the hot Notification table by core.retention.
+
+    Rows keep their original id, so archiving a batch twice is harmless, and
+    are bucketed by ``month`` so old months can be exported or dropped as a unit.
+    """
+    id = models.BigIntegerField(primary_key=True)
+    recipient = models.ForeignKey(settings.AUTH_USER_MODEL, related_name='archived_notifications', on_delete=models.CASCADE)
+    content = models.TextField()
+    link = models.URLField(blank=True, null=True)
+    timestamp = models.DateTimeField()
+    month = models.DateField()
+    archived_at = models.DateTimeField(auto_now_add=True)
+
+    class Meta:
+        indexes = [
+            models.Index(fields=['recipient', '-timestamp'], name='notif_archive_recipient_idx'),
+            models.Index(fields=['month'], name='notif_archive_month_idx'),
+        ]
+
+    def __str__(self):
+        return f"{self.recipient}: {self.content[:20]} (archived)"
     
 class Assignment(models.Model):
     title = models.CharField(max_length=255)
@@ -571,6 +724,24 @@ class TeacherBoard(models.Model):
         return f"{self.teacher} - {self.course}"
     
 
+class TeacherDashboardRollup(models.Model):
+    """Everything a teacher's dashboard shows but the unread count, precomputed by core.teacher_dashboard."""
+    teacher = models.OneToOneField('Teacher', related_name='dashboard', on_delete=models.CASCADE, primary_key=True)
+    classroom_count = models.PositiveIntegerField(default=0)
+    student_count = models.PositiveIntegerField(default=0)
+    enrollment_count = models.PositiveIntegerField(default=0)
+    pending_submissions = models.PositiveIntegerField(default=0)
+    average_score = models.DecimalField(max_digits=5, decimal_places=2, blank=True, null=True)
+    # Per classroom: id, name, course, dates and roster size.
+    classrooms = models.JSONField(default=list)
+    # Per course: graded submissions and average score in percent.
+    course_scores = models.JSONField(default=list)
+    refreshed_at = models.DateTimeField(blank=True, null=True)
+
+    def __str__(self):
+        return f"{self.teacher} dashboard"
+
+
 
 class CodeEditor(models.Model):
     student = models.ForeignKey('Student', on_delete=models.CASCADE)
@@ -594,4 +765,166 @@ class CameraInteraction(models.Model):
     is_active = models.BooleanField(default=True)
 
     def __str__(self):
-        return f"Session ID: {self.session_id}"
\ No newline at end of file
+        return f"Session ID: {self.session_id}"
+
+class PaymentNotification(models.Model):
+    """Outbox row for one payment email or SMS, delivered by the Celery workers in core.tasks."""
+    CHANNEL_CHOICES = [
+        ('email', 'Email'),
+        ('sms', 'SMS'),
+    ]
+
+    STATUS_CHOICES = [
+        ('pending', 'Pending'),
+        ('sending', 'Sending'),
+        ('sent', 'Sent'),
+        ('failed', 'Failed'),
+    ]
+
+    idempotency_key = models.CharField(max_length=64)
+    channel = models.CharField(max_length=10, choices=CHANNEL_CHOICES)
+    recipient = models.CharField(max_length=255)
+    subject = models.CharField(max_length=255, blank=True)
+    body = models.TextField()
+    status = models.CharField(max_length=10, choices=STATUS_CHOICES, default='pending')
+    attempts = models.PositiveIntegerField(default=0)
+    last_error = models.TextField(blank=True)
+    created_at = models.DateTimeField(auto_now_add=True)
+    claimed_at = models.DateTimeField(blank=True, null=True)
+    sent_at = models.DateTimeField(blank=True, null=True)
+
+    class Meta:
+        unique_together = ('idempotency_key', 'channel', 'recipient')
+        indexes = [models.Index(fields=['channel', 'status'])]
+
+    def __str__(self):
+        return f"{self.channel} to {self.recipient} ({self.status})"
+
+
+
+class PayrollRun(models.Model):
+    """One month-end payroll; its payslips are written once and never changed."""
+    period = models.DateField(unique=True)
+    created_at = models.DateTimeField(auto_now_add=True)
+    teacher_count = models.PositiveIntegerField(default=0)
+    total_gross = models.DecimalField(max_digits=14, decimal_places=2, default=Decimal('0.00'))
+    total_deductions = models.DecimalField(max_digits=14, decimal_places=2, default=Decimal('0.00'))
+    total_net = models.DecimalField(max_digits=14, decimal_places=2, default=Decimal('0.00'))
+
+    def __str__(self):
+        return f"Payroll {self.period:%Y-%m}"
+
+
+class Payslip(models.Model):
+    run = models.ForeignKey(PayrollRun, related_name='payslips', on_delete=models.PROTECT)
+    teacher = models.ForeignKey(Teacher, related_name='payslips', on_delete=models.SET_NULL, null=True)
+    teacher_name = models.CharField(max_length=255)
+    gross_salary = models.DecimalField(max_digits=10, decimal_places=2)
+    paye = models.DecimalField(max_digits=10, decimal_places=2)
+    nhif = models.DecimalField(max_digits=10, decimal_places=2)
+    nssf = models.DecimalField(max_digits=10, decimal_places=2)
+    loan_deductions = models.DecimalField(max_digits=10, decimal_places=2)
+    total_deductions = models.DecimalField(max_digits=10, decimal_places=2)
+    net_salary = models.DecimalField(max_digits=10, decimal_places=2)
+
+    payment_method = models.CharField(max_length=10, choices=Teacher.PAYMENT_METHOD_CHOICES)
+    mpesa_number = models.CharField(max_length=12, blank=True, null=True)
+    bank_name = models.CharField(max_length=50, choices=Teacher.BANK_CHOICES, blank=True, null=True)
+    bank_account_number = models.CharField(max_length=20, blank=True, null=True)
+
+    class Meta:
+        unique_together = ('run', 'teacher')
+
+    def save(self, *args, **kwargs):
+        if not self._state.adding:
+            raise ValueError("Payslips are immutable once issued.")
+        super(Payslip, self).save(*args, **kwargs)
+
+    def delete(self, *args, **kwargs):
+        raise ValueError("Payslips are immutable once issued.")
+
+    def __str__(self):
+        return f"{self.teacher_name} - {self.run}"
+
+
+class Broadcast(models.Model):
+    """A course-wide announcement, written as one Notification per recipient."""
+    STATUS_CHOICES = [
+        ('pending', 'Pending'),
+        ('creating', 'Creating notifications'),
+        ('delivering', 'Delivering'),
+        ('done', 'Done'),
+    ]
+
+    course = models.ForeignKey(Course, related_name='broadcasts', on_delete=models.CASCADE)
+    sender = models.ForeignKey(settings.AUTH_USER_MODEL, related_name='broadcasts', on_delete=models.CASCADE)
+    content = models.TextField()
+    link = models.URLField(blank=True, null=True)
+    status = models.CharField(max_length=10, choices=STATUS_CHOICES, default='pending')
+    recipient_count = models.PositiveIntegerField(default=0)
+    created_count = models.PositiveIntegerField(default=0)
+    delivered_count = models.PositiveIntegerField(default=0)
+    created_at = models.DateTimeField(auto_now_add=True)
+    started_at = models.DateTimeField(blank=True, null=True)
+    finished_at = models.DateTimeField(blank=True, null=True)
+    # Moved on by every written chunk and delivered batch; core.broadcasts resumes broadcasts it stops moving.
+    last_progress_at = models.DateTimeField(blank=True, null=True)
+
+    @property
+    def progress(self):
+        """Share of recipients whose notification has been pushed, from 0 to 1."""
+        if not self.recipient_count:
+            return 1.0 if self.status == 'done' else 0.0
+        return self.delivered_count / self.recipient_count
+
+    @property
+    def throughput(self):
+        """Notifications created per second since the broadcast started."""
+        if not self.started_at:
+            return 0.0
+        elapsed = ((self.finished_at or timezone.now()) - self.started_at).total_seconds()
+        return self.created_count / elapsed if elapsed > 0 else float(self.created_count)
+
+    def __str__(self):
+        return f"{self.course} broadcast ({self.status})"
+
+
+class BroadcastBatch(models.Model):
+    """
+    One chunk of a broadcast's recipients, written in the same transaction as
+    their notifications. ``delivered_at`` stays empty until the chunk has been
+    pushed, so an interrupted broadcast knows which chunks still need it.
+    """
+    broadcast = models.ForeignKey(Broadcast, related_name='batches', on_delete=models.CASCADE)
+    recipients = models.JSONField(default=list)
+    created_at = models.DateTimeField(auto_now_add=True)
+    delivered_at = models.DateTimeField(blank=True, null=True)
+
+    def __str__(self):
+        return f"{self.broadcast} batch of {len(self.recipients)}"
+
+
+class SearchDocument(models.Model):
+    """
+    Searchable text of one course, forum post or reply, kept in sync by core.search.
+
+    On MySQL the table carries a FULLTEXT index over (title, body).
+    """
+    KIND_CHOICES = [
+        ('course', 'Course'),
+        ('post', 'Forum post'),
+        ('reply', 'Reply'),
+    ]
+
+    kind = models.CharField(max_length=10, choices=KIND_CHOICES)
+    object_id = models.CharField(max_length=100)
+    course = models.ForeignKey(Course, related_name='+', on_delete=models.CASCADE, blank=True, null=True)
+    title = models.CharField(max_length=255, blank=True)
+    body = models.TextField(blank=True)
+    updated_at = models.DateTimeField(auto_now=True)
+
+    class Meta:
+        unique_together = ('kind', 'object_id')
+
+    def __str__(self):
+        return f"{self.kind} {self.object_id}"
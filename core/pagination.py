@@ -0,0 +1,22 @@
+from rest_framework.pagination import CursorPagination
+
+
+class KeysetPagination(CursorPagination):
+    """
+    Cursor (keyset) pagination over a unique, indexed ordering.
+
+    Pages are fetched with ``WHERE key < last_seen ORDER BY key LIMIT n``
+    rather than OFFSET, so deep pages cost the same as the first one. Views
+    pick their key with a ``cursor_ordering`` attribute; the primary key is
+    used otherwise.
+    """
+    ordering = 'pk'
+    page_size = 50
+    page_size_query_param = 'page_size'
+    max_page_size = 200
+
+    def get_ordering(self, request, queryset, view):
+        ordering = getattr(view, 'cursor_ordering', self.ordering)
+        if isinstance(ordering, str):
+            return (ordering,)
+        return tuple(ordering)
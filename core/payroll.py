@@ -0,0 +1,129 @@
+import csv
+import os
+from decimal import ROUND_HALF_UP, Decimal
+from itertools import groupby
+
+from django.db import transaction
+from django.db.models import Count, OuterRef, Subquery, Sum
+
+from .models import PayrollRun, Payslip, Teacher
+
+PAYSLIP_BATCH_SIZE = 5000
+
+CENT = Decimal('0.01')
+
+TEACHER_COLUMNS = (
+    'pk', 'full_name', 'payment_rate', 'loan_deductions', 'payment_method',
+    'mpesa_number', 'bank_name', 'bank_account_number',
+)
+
+
+def _money(value):
+    return value.quantize(CENT, rounding=ROUND_HALF_UP)
+
+
+def build_payslips(run, rows):
+    """Payslips for ``rows`` of TEACHER_COLUMNS values, in exact Decimal arithmetic."""
+    paye_rate, nhif_rate, nssf_rate = Teacher.PAYE_TAX_RATE, Teacher.NHIF_RATE, Teacher.NSSF_RATE
+    payslips = []
+    for teacher_id, name, gross, loan, method, mpesa_number, bank_name, account in rows:
+        loan = loan or Decimal('0.00')
+        paye = _money(gross * paye_rate)
+        nhif = _money(gross * nhif_rate)
+        nssf = _money(gross * nssf_rate)
+        total = paye + nhif + nssf + loan
+        payslips.append(Payslip(
+            run=run,
+            teacher_id=teacher_id,
+            teacher_name=name,
+            gross_salary=gross,
+            paye=paye,
+            nhif=nhif,
+            nssf=nssf,
+            loan_deductions=loan,
+            total_deductions=total,
+            net_salary=gross - total,
+            payment_method=method,
+            mpesa_number=mpesa_number,
+            bank_name=bank_name,
+            bank_account_number=account,
+        ))
+    return payslips
+
+
+def run_payroll(period, batch_size=PAYSLIP_BATCH_SIZE):
+    """
+    Issue payslips for every active teacher for ``period`` (the first day of the month).
+
+    Teachers are streamed as plain value tuples and payslips are written with
+    chunked bulk_create; the teachers' stored ``tax_deductions`` and
+    ``net_salary`` are then copied from their payslips with one UPDATE. A
+    period can only be run once.
+    """
+    with transaction.atomic():
+        run = PayrollRun.objects.create(period=period)
+        rows = (
+            Teacher.objects.filter(status=True)
+            .order_by('pk')
+            .values_list(*TEACHER_COLUMNS)
+            .iterator(chunk_size=batch_size)
+        )
+        batch = []
+        for row in rows:
+            batch.append(row)
+            if len(batch) == batch_size:
+                Payslip.objects.bulk_create(build_payslips(run, batch))
+                batch = []
+        if batch:
+            Payslip.objects.bulk_create(build_payslips(run, batch))
+
+        totals = run.payslips.aggregate(
+            teacher_count=Count('pk'),
+            total_gross=Sum('gross_salary'),
+            total_deductions=Sum('total_deductions'),
+            total_net=Sum('net_salary'),
+        )
+        for field, value in totals.items():
+            if value is not None:
+                setattr(run, field, value)
+        run.save()
+
+        # Copied from the payslips, so the stored figures carry the same per-line rounding.
+        payslip = run.payslips.filter(teacher=OuterRef('pk'))
+        Teacher.objects.filter(status=True).update(
+            tax_deductions=Subquery(payslip.values('total_deductions')),
+            net_salary=Subquery(payslip.values('net_salary')),
+        )
+    return run
+
+
+def export_payouts(run, directory):
+    """
+    Write one payout CSV per payment channel (M-Pesa, or each bank) for ``run``.
+
+    Returns the paths of the files written.
+    """
+    os.makedirs(directory, exist_ok=True)
+    payslips = (
+        run.payslips.order_by('payment_method', 'bank_name', 'teacher_name')
+        .values_list(
+            'payment_method', 'bank_name', 'teacher_id', 'teacher_name',
+            'mpesa_number', 'bank_account_number', 'net_salary',
+        )
+        .iterator(chunk_size=PAYSLIP_BATCH_SIZE)
+    )
+    paths = []
+    channel_of = lambda row: (row[0], (row[1] or '') if row[0] == 'bank' else '')
+    for (method, bank_name), group in groupby(payslips, key=channel_of):
+        channel = bank_name if method == 'bank' and bank_name else method
+        path = os.path.join(directory, f"payroll_{run.period:%Y_%m}_{channel}.csv")
+        with open(path, 'w', newline='') as output:
+            writer = csv.writer(output)
+            if method == 'mpesa':
+                writer.writerow(['teacher_id', 'name', 'mpesa_number', 'amount'])
+                writer.writerows((row[2], row[3], row[4], row[6]) for row in group)
+            else:
+                writer.writerow(['teacher_id', 'name', 'bank', 'account_number', 'amount'])
+                writer.writerows((row[2], row[3], bank_name, row[5], row[6]) for row in group)
+        paths.append(path)
+    return paths
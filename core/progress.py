@@ -0,0 +1,165 @@
+import hashlib
+
+from django.core.cache import cache
+from django.db import IntegrityError, transaction
+from django.db.models import Avg, Case, Count, DecimalField, ExpressionWrapper, F, Q, QuerySet, Value, When
+from django.db.models.functions import Least
+from django.db.models.lookups import GreaterThan
+from django.db.models.signals import post_delete, post_save
+from django.dispatch import receiver
+
+from .models import Course, ModuleCompletion, Progress, Student
+from .student_dashboard import invalidate_student_dashboards
+
+OVERVIEW_TIMEOUT = 60 * 60
+# Upper bounds (exclusive, except the last) of the overview's percentage buckets.
+PERCENTAGE_BUCKETS = (25, 50, 75, 100)
+
+
+def _overview_key(course_id):
+    # Course titles are the primary key and may contain spaces, which cache keys must not.
+    return f'progress:overview:{hashlib.md5(str(course_id).encode()).hexdigest()}'
+
+
+def invalidate_overview(course_id):
+    transaction.on_commit(lambda: cache.delete(_overview_key(course_id)))
+
+
+def _percentage(completed, total):
+    """SQL for ``completed / total`` in percent, capped at 100 and 0 while the course has no modules."""
+    return Case(
+        When(GreaterThan(total, 0), then=Least(
+            ExpressionWrapper(Value(100.0) * completed / total, output_field=DecimalField()), Value(100),
+        )),
+        default=Value(0),
+        output_field=DecimalField(max_digits=5, decimal_places=2),
+    )
+
+
+def record_module_completion(student_id, course_id, module):
+    """
+    Record that a student finished ``module`` of a course and move their
+    Progress on in the same transaction.
+
+    The count and the percentage are updated with one UPDATE computed in SQL,
+    so concurrent completions cannot lose each other's increments. Completing
+    the same module again changes nothing. Returns the up-to-date Progress.
+    """
+    with transaction.atomic():
+        try:
+            with transaction.atomic():
+                ModuleCompletion.objects.create(student_id=student_id, course_id=course_id, module=module)
+        except IntegrityError:
+            return Progress.objects.get(student_id=student_id, course_id=course_id)
+
+        course_modules = Course.objects.values_list('total_modules', flat=True).get(pk=course_id)
+        progress, created = Progress.objects.get_or_create(
+            student_id=student_id, course_id=course_id, defaults={'total_modules': course_modules},
+        )
+        if created:
+            Student.objects.filter(pk=student_id, progress__isnull=True).update(progress=progress)
+        # Older rows may predate Course.total_modules; the course's count wins once it is set.
+        total = Value(course_modules) if course_modules else F('total_modules')
+        # MySQL assigns SET columns left to right, so the percentage must be
+        # computed before modules_completed is incremented.
+        Progress.objects.filter(pk=progress.pk).update(
+            progress_percentage=_percentage(F('modules_completed') + 1, total),
+            modules_completed=F('modules_completed') + 1,
+            total_modules=total,
+        )
+        invalidate_overview(course_id)
+        invalidate_student_dashboards(student_ids=[student_id])
+    progress.refresh_from_db()
+    return progress
+
+
+def set_course_modules(course_id, total_modules):
+    """Change how many modules a course has and rescale every student's percentage to match."""
+    with transaction.atomic():
+        Course.objects.filter(pk=course_id).update(total_modules=total_modules)
+        Progress.objects.filter(course_id=course_id).update(
+            total_modules=total_modules,
+            progress_percentage=_percentage(F('modules_completed'), Value(total_modules)),
+        )
+        invalidate_overview(course_id)
+        invalidate_student_dashboards(student_ids=Progress.objects.filter(course_id=course_id).values_list('student_id', flat=True))
+
+
+def recompute_progress(student_id, course_id):
+    """Recount a student's completed modules from their ModuleCompletion rows."""
+    completed = ModuleCompletion.objects.filter(student_id=student_id, course_id=course_id).count()
+    Progress.objects.filter(student_id=student_id, course_id=course_id).update(
+        progress_percentage=_percentage(Value(completed), F('total_modules')),
+        modules_completed=completed,
+    )
+    invalidate_overview(course_id)
+    invalidate_student_dashboards(student_ids=[student_id])
+
+
+def overview_aggregates(course_id):
+    """Average, completion counts and percentage buckets of a course, cached until progress changes."""
+    key = _overview_key(course_id)
+    aggregates = cache.get(key)
+    if aggregates is None:
+        buckets, low = {}, 0
+        for high in PERCENTAGE_BUCKETS:
+            within = Q(progress_percentage__gte=low, progress_percentage__lt=high)
+            if high == PERCENTAGE_BUCKETS[-1]:
+                within = Q(progress_percentage__gte=low)
+            buckets[f'{low}-{high}'] = Count('pk', filter=within)
+            low = high
+        aggregates = Progress.objects.filter(course_id=course_id).aggregate(
+            students=Count('pk'),
+            average=Avg('progress_percentage'),
+            not_started=Count('pk', filter=Q(modules_completed=0)),
+            completed=Count('pk', filter=Q(progress_percentage__gte=100)),
+            **buckets,
+        )
+        average = aggregates.pop('average')
+        aggregates = {
+            'students': aggregates.pop('students'),
+            'average': round(float(average), 2) if average is not None else None,
+            'not_started': aggregates.pop('not_started'),
+            'completed': aggregates.pop('completed'),
+            'buckets': aggregates,
+        }
+        cache.set(key, aggregates, OVERVIEW_TIMEOUT)
+    return aggregates
+
+
+def course_progress_overview(course_id):
+    """Every student's progress in a course, from a single query, with the cached aggregates."""
+    rows = (
+        Progress.objects.filter(course_id=course_id)
+        .order_by('-progress_percentage', 'student_id')
+        .values('student_id', 'student__full_name', 'modules_completed', 'total_modules', 'progress_percentage')
+    )
+    return {
+        'course': course_id,
+        'summary': overview_aggregates(course_id),
+        'students': [
+            {
+                'student': row['student_id'],
+                'full_name': row['student__full_name'],
+                'modules_completed': row['modules_completed'],
+                'total_modules': row['total_modules'],
+                'progress_percentage': row['progress_percentage'],
+            }
+            for row in rows
+        ],
+    }
+
+
+@receiver([post_save, post_delete], sender=Progress)
+def invalidate_on_progress_change(sender, instance, raw=False, **kwargs):
+    if not raw:
+        invalidate_overview(instance.course_id)
+
+
+@receiver(post_delete, sender=ModuleCompletion)
+def recount_on_completion_delete(sender, instance, origin=None, **kwargs):
+    # Only when completions themselves are deleted: in a cascade from a
+    # student, course or user, the Progress row is going away as well.
+    origin_model = origin.model if isinstance(origin, QuerySet) else type(origin)
+    if origin is None or origin_model is ModuleCompletion:
+        recompute_progress(instance.student_id, instance.course_id)
@@ -0,0 +1,62 @@
+import asyncio
+
+from asgiref.sync import async_to_sync
+from channels.layers import get_channel_layer
+from django.db import transaction
+from django.db.models.signals import post_save
+from django.dispatch import receiver
+
+from .models import Message, Notification
+from .serializers import MessageSerializer, NotificationSerializer
+
+FANOUT_BATCH_SIZE = 500
+
+
+def user_group(user_id):
+    return f'user_{user_id}'
+
+
+def _event(kind, payload):
+    return {'type': 'deliver', 'kind': kind, 'payload': payload}
+
+
+async def _group_send_all(layer, groups, event):
+    await asyncio.gather(*(layer.group_send(group, event) for group in groups))
+
+
+def push_to_groups(groups, kind, payload, batch_size=FANOUT_BATCH_SIZE):
+    """
+    Send one event to every group, ``batch_size`` group_send calls at a time.
+
+    Each batch is sent concurrently on one event loop, so pushing to
+    thousands of users costs a handful of round trips rather than one per user.
+    Does nothing when no channel layer is configured.
+    """
+    layer = get_channel_layer()
+    if layer is None:
+        return
+    groups = list(groups)
+    event = _event(kind, payload)
+    for start in range(0, len(groups), batch_size):
+        async_to_sync(_group_send_all)(layer, groups[start:start + batch_size], event)
+
+
+def push_to_users(user_ids, kind, payload, batch_size=FANOUT_BATCH_SIZE):
+    push_to_groups((user_group(user_id) for user_id in user_ids), kind, payload, batch_size)
+
+
+@receiver(post_save, sender=Message)
+def push_new_message(sender, instance, created, raw=False, **kwargs):
+    if created and not raw:
+        payload = MessageSerializer(instance).data
+        # The message is already committed; a channel layer outage is logged, not raised from save().
+        transaction.on_commit(lambda: push_to_users(
+            {instance.receiver_id, instance.sender_id}, 'message', payload
+        ), robust=True)
+
+
+@receiver(post_save, sender=Notification)
+def push_new_notification(sender, instance, created, raw=False, **kwargs):
+    if created and not raw:
+        payload = NotificationSerializer(instance).data
+        transaction.on_commit(lambda: push_to_users([instance.recipient_id], 'notification', payload), robust=True)
@@ -0,0 +1,55 @@
+import time
+from datetime import timedelta
+
+from django.conf import settings
+from django.db import transaction
+from django.utils import timezone
+
+from .models import Notification, NotificationArchive
+
+ARCHIVE_BATCH_SIZE = 1000
+
+
+def archive_notifications(days=None, batch_size=ARCHIVE_BATCH_SIZE, pause=0.0, max_batches=None):
+    """
+    Move read notifications older than ``days`` into NotificationArchive.
+
+    Works in batches of ``batch_size`` rows, each copied and deleted in its own
+    short transaction, so the hot table is never locked for long; rows another
+    worker holds are skipped. ``pause`` seconds are slept between batches to
+    leave room for regular traffic. Returns the number of rows archived.
+    """
+    if days is None:
+        days = settings.NOTIFICATION_RETENTION_DAYS
+    cutoff = timezone.now() - timedelta(days=days)
+    expired = Notification.objects.filter(is_read=True, timestamp__lt=cutoff).order_by('pk')
+
+    archived = 0
+    batches = 0
+    while max_batches is None or batches < max_batches:
+        with transaction.atomic():
+            rows = list(
+                expired.select_for_update(skip_locked=True)
+                .values_list('pk', 'recipient_id', 'content', 'link', 'timestamp')[:batch_size]
+            )
+            if not rows:
+                break
+            NotificationArchive.objects.bulk_create(
+                [
+                    NotificationArchive(
+                        id=pk, recipient_id=recipient_id, content=content, link=link,
+                        timestamp=timestamp, month=timezone.localdate(timestamp).replace(day=1),
+                    )
+                    for pk, recipient_id, content, link, timestamp in rows
+                ],
+                ignore_conflicts=True,
+            )
+            Notification.objects.filter(pk__in=[row[0] for row in rows]).delete()
+
+        archived += len(rows)
+        batches += 1
+        if len(rows) < batch_size:
+            break
+        if pause:
+            time.sleep(pause)
+    return archived
@@ -0,0 +1,224 @@
+import json
+import os
+import queue
+import shutil
+import signal
+import subprocess
+import sys
+import threading
+
+from django.conf import settings
+from django.db import transaction
+from django.db.models.signals import post_save
+from django.dispatch import receiver
+
+from .models import CodeEditor
+
+WORKER_SCRIPT = os.path.join(os.path.dirname(os.path.abspath(__file__)), 'sandbox_worker.py')
+# Extra seconds the pool waits past a job's wall-clock limit before giving up on the worker.
+WORKER_GRACE_SECONDS = 5
+# The runner gets none of this process's environment (secrets, DATABASE_URL, ...).
+WORKER_ENV = {'PATH': '/usr/local/bin:/usr/bin:/bin', 'LANG': 'C.UTF-8'}
+# Host paths visible, read-only, inside a submission's root filesystem. The
+# runner adds its own Python installation.
+DEFAULT_MOUNTS = ('/usr', '/bin', '/lib', '/lib64', '/etc/alternatives')
+
+
+def runner_limits():
+    return {
+        'cpu_seconds': getattr(settings, 'CODE_RUNNER_CPU_SECONDS', 2),
+        'wall_seconds': getattr(settings, 'CODE_RUNNER_WALL_SECONDS', 5),
+        'memory_mb': getattr(settings, 'CODE_RUNNER_MEMORY_MB', 256),
+        'file_size_kb': getattr(settings, 'CODE_RUNNER_FILE_SIZE_KB', 1024),
+        'output_kb': getattr(settings, 'CODE_RUNNER_OUTPUT_KB', 64),
+        'processes': getattr(settings, 'CODE_RUNNER_PROCESSES', 16),
+        'mounts': list(getattr(settings, 'CODE_RUNNER_MOUNTS', DEFAULT_MOUNTS)),
+        'cgroup': getattr(settings, 'CODE_RUNNER_CGROUP', None),
+    }
+
+
+def build_job(language, code, limits):
+    """
+    The files and steps that run ``code``, or None when this server has no
+    toolchain for ``language``. Python runs inside the warm worker itself;
+    other languages are compiled or started in the submission's directory.
+    Runtimes that reserve large address spaces (Node, the JVM) get their
+    own heap limit instead of RLIMIT_AS. Each step names how its runtime
+    dies when it runs out of memory: Node and C++'s std::bad_alloc abort,
+    the JVM is told to exit with code 3.
+    """
+    memory = limits['memory_mb']
+    if language == 'python':
+        return {'steps': [{'python': code}]}
+    if language == 'javascript' and shutil.which('node'):
+        return {
+            'files': {'main.js': code},
+            'steps': [{
+                'argv': ['node', f'--max-old-space-size={memory}', 'main.js'], 'memory': False,
+                'memory_signals': [signal.SIGABRT],
+            }],
+        }
+    if language == 'c++' and shutil.which('g++'):
+        return {
+            'files': {'main.cpp': code},
+            'steps': [
+                {'argv': ['g++', '-O2', '-o', 'main', 'main.cpp'], 'memory': False},
+                {'argv': ['./main'], 'memory_signals': [signal.SIGABRT]},
+            ],
+        }
+    if language == 'java' and shutil.which('java'):
+        # Single-file source launch (Java 11+): the public class goes in Main.java.
+        return {
+            'files': {'Main.java': code},
+            'steps': [{
+                'argv': ['java', f'-Xmx{memory}m', '-XX:+ExitOnOutOfMemoryError', 'Main.java'], 'memory': False,
+                'memory_exit_codes': [3],
+            }],
+        }
+    return None
+
+
+class Worker:
+    def __init__(self, uid=None, gid=None):
+        # A root process hands the worker to the unprivileged uid; otherwise it runs as this process's user.
+        identity = {'user': uid, 'group': gid or uid, 'extra_groups': []} if uid else {}
+        self.process = subprocess.Popen(
+            [sys.executable, '-I', WORKER_SCRIPT],
+            stdin=subprocess.PIPE, stdout=subprocess.PIPE, text=True, bufsize=1, env=WORKER_ENV, **identity,
+        )
+
+    def run(self, job, timeout):
+        """Send one job and wait for its result; raises TimeoutError if the worker hangs."""
+        self.process.stdin.write(json.dumps(job) + '\n')
+        self.process.stdin.flush()
+        result = {}
+        reader = threading.Thread(target=lambda: result.update(line=self.process.stdout.readline()), daemon=True)
+        reader.start()
+        reader.join(timeout)
+        if not result.get('line'):
+            raise TimeoutError('The code runner did not answer.')
+        return json.loads(result['line'])
+
+    def alive(self):
+        return self.process.poll() is None
+
+    def stop(self):
+        self.process.kill()
+        self.process.wait()
+
+
+class WorkerPool:
+    """
+    A fixed set of started runner interpreters shared by the threads of one process.
+
+    Starting Python costs tens of milliseconds; the workers pay it once and
+    then fork a fresh child per submission, which is where the limits are
+    applied. A worker that dies or stops answering is replaced.
+    """
+
+    def __init__(self, size, uid=None, gid=None):
+        self.size = size
+        # Only needed when this process is root: the workers switch to this uid and gid.
+        self.uid, self.gid = uid, gid
+        self.idle = queue.Queue()
+        self._lock = threading.Lock()
+        self._started = False
+
+    def start(self):
+        with self._lock:
+            if not self._started:
+                for _ in range(self.size):
+                    self.idle.put(Worker(self.uid, self.gid))
+                self._started = True
+
+    def runs_as_root(self):
+        return not self.uid and os.geteuid() == 0
+
+    def run(self, language, code, limits=None):
+        """Run one submission; returns the worker's result dict (status, stdout, stderr, ...)."""
+        limits = limits or runner_limits()
+        if self.runs_as_root():
+            # Fail closed: a submission would act as root on every file it can reach.
+            return {
+                'status': 'unavailable', 'exit_code': None, 'stdout': '', 'truncated': False,
+                'stderr': "The code runner will not run as root; set CODE_RUNNER_UID to an unprivileged uid.",
+            }
+        job = build_job(language, code, limits)
+        if job is None:
+            return {
+                'status': 'unsupported', 'exit_code': None, 'stdout': '', 'truncated': False,
+                'stderr': f"There is no {language} toolchain on this server.",
+            }
+        job['limits'] = limits
+        self.start()
+        worker = self.idle.get()
+        try:
+            return worker.run(job, timeout=limits['wall_seconds'] * len(job['steps']) + WORKER_GRACE_SECONDS)
+        except (OSError, TimeoutError, ValueError):
+            worker.stop()
+            raise
+        finally:
+            self.idle.put(worker if worker.alive() else Worker(self.uid, self.gid))
+
+    def shutdown(self):
+        with self._lock:
+            while not self.idle.empty():
+                self.idle.get().stop()
+            self._started = False
+
+
+_pool = None
+_pool_lock = threading.Lock()
+
+
+def get_pool():
+    """The process-wide pool, started on first use (so each Celery worker process gets its own)."""
+    global _pool
+    with _pool_lock:
+        if _pool is None:
+            _pool = WorkerPool(
+                getattr(settings, 'CODE_RUNNER_WORKERS', 1),
+                getattr(settings, 'CODE_RUNNER_UID', None), getattr(settings, 'CODE_RUNNER_GID', None),
+            )
+        return _pool
+
+
+def format_output(result):
+    """What is stored in CodeEditor.output: the program's output plus a note when it did not finish normally."""
+    output = result['stdout']
+    if result['stderr']:
+        output += ('\n' if output and not output.endswith('\n') else '') + result['stderr']
+    notes = {
+        'error': f"Exited with code {result['exit_code']}.",
+        'timeout': "Stopped: time limit exceeded.",
+        'cpu_limit': "Stopped: CPU time limit exceeded.",
+        'memory_limit': "Stopped: memory limit exceeded.",
+        'killed': "Stopped by the runner.",
+        'unsupported': "Not run.",
+        'unavailable': "Not run.",
+        'internal_error': "The code runner failed.",
+    }
+    if result['status'] in notes:
+        output += ('\n' if output and not output.endswith('\n') else '') + f"[{notes[result['status']]}]"
+    if result.get('truncated'):
+        output += "\n[Output truncated.]"
+    return output
+
+
+def execute_submission(code_editor_id):
+    """Run a CodeEditor submission in the pool and store what it printed."""
+    submission = CodeEditor.objects.only('code', 'language').get(pk=code_editor_id)
+    try:
+        result = get_pool().run(submission.language, submission.code)
+    except (OSError, TimeoutError, ValueError):
+        result = {'status': 'internal_error', 'exit_code': None, 'stdout': '', 'stderr': '', 'truncated': False}
+    CodeEditor.objects.filter(pk=code_editor_id).update(output=format_output(result))
+    return result
+
+
+@receiver(post_save, sender=CodeEditor)
+def queue_new_submission(sender, instance, created, raw=False, **kwargs):
+    from .tasks import run_code_submission
+
+    if created and not raw:
+        transaction.on_commit(lambda: run_code_submission.delay(instance.pk), robust=True)
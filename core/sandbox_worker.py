@@ -0,0 +1,374 @@
+"""
+A warm code runner started by core.sandbox.
+
+Runs as a standalone interpreter (``python -I sandbox_worker.py``), so it
+imports nothing from Django or the project. It reads one JSON job per line
+on stdin and answers with one JSON line on stdout. Every job runs in a
+process forked from this already-started interpreter, inside fresh user,
+PID, network, mount, IPC and UTS namespaces:
+
+- the filesystem is an empty tmpfs holding read-only bind mounts of the
+  configured toolchain paths, plus the submission's directory at /tmp;
+- the network namespace has no interfaces but a loopback that is down;
+- the submission drops every capability and gets CPU, memory, file size
+  and process limits and an empty environment. Its process count is charged
+  to the job's own user namespace (Linux 5.14+), and, when a cgroup is
+  configured, to a per-job child cgroup with its own pids.max;
+- it is killed if it outlives the wall-clock limit, and whatever it left
+  behind dies with the PID namespace when the job ends.
+
+The user namespace maps only the worker's own uid and gid, so the worker
+needs no privileges, only a kernel that allows unprivileged user namespaces.
+It refuses to run as root: a submission would then act as root on the
+files it can reach.
+"""
+import ctypes
+import json
+import os
+import resource
+import select
+import shutil
+import signal
+import sys
+import tempfile
+import time
+import traceback
+
+CLONE_NEWNS = 0x00020000
+CLONE_NEWUTS = 0x04000000
+CLONE_NEWIPC = 0x08000000
+CLONE_NEWUSER = 0x10000000
+CLONE_NEWPID = 0x20000000
+CLONE_NEWNET = 0x40000000
+MS_RDONLY = 0x1
+MS_NOSUID = 0x2
+MS_NODEV = 0x4
+MS_NOEXEC = 0x8
+MS_REMOUNT = 0x20
+MS_BIND = 0x1000
+MS_REC = 0x4000
+MS_PRIVATE = 0x40000
+PR_SET_NO_NEW_PRIVS = 38
+LINUX_CAPABILITY_VERSION_3 = 0x20080522
+# The submission's uid and gid inside its user namespace, mapped to the worker's own.
+NAMESPACE_ID = 1000
+# What a Python submission exits with when it runs out of memory (as the JVM's ExitOnOutOfMemoryError does).
+PYTHON_MEMORY_EXIT = 3
+# The descriptor the job's init process reports the submission's wait status on.
+STATUS_FD = 3
+SUBMISSION_ENV = {'PATH': '/usr/local/bin:/usr/bin:/bin', 'HOME': '/tmp', 'LANG': 'C.UTF-8'}
+
+libc = ctypes.CDLL(None, use_errno=True)
+
+
+def _check(result, call):
+    if result != 0:
+        error = ctypes.get_errno()
+        raise OSError(error, f'{call}: {os.strerror(error)}')
+
+
+def mount(source, target, flags, fstype=None, data=None):
+    _check(
+        libc.mount(
+            source and source.encode(), target.encode(), fstype and fstype.encode(), flags, data and data.encode(),
+        ),
+        f'mount {target}',
+    )
+
+
+def unshare(flags):
+    _check(libc.unshare(flags), 'unshare')
+
+
+class CapabilityHeader(ctypes.Structure):
+    _fields_ = [('version', ctypes.c_uint32), ('pid', ctypes.c_int)]
+
+
+class CapabilityData(ctypes.Structure):
+    _fields_ = [('effective', ctypes.c_uint32), ('permitted', ctypes.c_uint32), ('inheritable', ctypes.c_uint32)]
+
+
+def drop_capabilities():
+    """Clear the capabilities the new user namespace granted; the submission keeps none."""
+    _check(libc.capset(ctypes.byref(CapabilityHeader(LINUX_CAPABILITY_VERSION_3, 0)), (CapabilityData * 2)()), 'capset')
+
+
+def check_identity():
+    """Refuse to run submissions as root; the runner needs no privileges."""
+    if os.geteuid() == 0 or os.getegid() == 0:
+        raise PermissionError('The code runner must run as an unprivileged user (see CODE_RUNNER_UID).')
+
+
+def map_identity(uid, gid):
+    """Map NAMESPACE_ID in a new user namespace to the worker's uid and gid, the only mapping an unprivileged process may write."""
+    for name, content in (('setgroups', 'deny'), ('uid_map', f'{NAMESPACE_ID} {uid} 1'), ('gid_map', f'{NAMESPACE_ID} {gid} 1')):
+        with open(f'/proc/self/{name}', 'w') as proc:
+            proc.write(content)
+
+
+def remount_bind(target, source, readonly=True):
+    """
+    Remount the bind mount at ``target`` nosuid (and read-only). Flags the
+    host mount already has are kept: a user namespace may not clear them.
+    """
+    kept = os.statvfs(source).f_flag & (MS_RDONLY | MS_NOSUID | MS_NODEV | MS_NOEXEC)
+    mount(None, target, MS_BIND | MS_REMOUNT | kept | (MS_RDONLY if readonly else 0) | MS_NOSUID)
+
+
+def enter_cgroup(cgroup, limits):
+    """Move this process into ``cgroup`` and cap the tasks in it: the submission's, plus its init and parent."""
+    with open(os.path.join(cgroup, 'pids.max'), 'w') as pids:
+        pids.write(str(limits['processes'] + 2))
+    with open(os.path.join(cgroup, 'cgroup.procs'), 'w') as procs:
+        procs.write(str(os.getpid()))
+
+
+def build_root(jail, workdir, mounts):
+    """
+    Make ``jail`` a root filesystem that exposes only ``mounts`` (read-only)
+    and ``workdir`` (at /tmp), then chroot into it. Runs in the job's own
+    mount namespace, so nothing here is visible to the host.
+    """
+    mount(None, '/', MS_REC | MS_PRIVATE)
+    mount('tmpfs', jail, MS_NOSUID | MS_NODEV, fstype='tmpfs', data='size=1m,mode=0755')
+    mounted = []
+    for path in (*mounts, '/dev/null', '/dev/zero', '/dev/urandom'):
+        path = os.path.normpath(path)
+        if not os.path.lexists(path) or any(path.startswith(parent + '/') for parent in mounted):
+            continue
+        target = jail + path
+        if os.path.islink(path):
+            # Merged-/usr systems link /bin and /lib into /usr; keep the link.
+            os.makedirs(os.path.dirname(target), exist_ok=True)
+            os.symlink(os.readlink(path), target)
+            continue
+        mounted.append(path)
+        if os.path.isdir(path):
+            os.makedirs(target, exist_ok=True)
+        else:
+            os.makedirs(os.path.dirname(target), exist_ok=True)
+            open(target, 'a').close()
+        mount(path, target, MS_BIND | MS_REC)
+        remount_bind(target, path, readonly=not path.startswith('/dev/'))
+    os.makedirs(jail + '/tmp')
+    mount(workdir, jail + '/tmp', MS_BIND)
+    remount_bind(jail + '/tmp', workdir, readonly=False)
+    mount(None, jail, MS_REMOUNT | MS_RDONLY | MS_NOSUID | MS_NODEV, fstype='tmpfs')
+    os.chroot(jail)
+    os.chdir('/tmp')
+
+
+def apply_limits(limits, memory=True):
+    cpu = limits['cpu_seconds']
+    resource.setrlimit(resource.RLIMIT_CPU, (cpu, cpu + 1))
+    if memory:
+        size = limits['memory_mb'] * 1024 * 1024
+        resource.setrlimit(resource.RLIMIT_AS, (size, size))
+    written = limits['file_size_kb'] * 1024
+    resource.setrlimit(resource.RLIMIT_FSIZE, (written, written))
+    resource.setrlimit(resource.RLIMIT_CORE, (0, 0))
+    resource.setrlimit(resource.RLIMIT_NPROC, (limits['processes'], limits['processes']))
+    _check(libc.prctl(PR_SET_NO_NEW_PRIVS, 1, 0, 0, 0), 'prctl')
+    drop_capabilities()
+
+
+def run_python(code):
+    try:
+        exec(compile(code, 'main.py', 'exec'), {'__name__': '__main__', '__builtins__': __builtins__})
+    except SystemExit as exit:
+        if exit.code is None or isinstance(exit.code, int):
+            return exit.code or 0
+        print(exit.code, file=sys.stderr)
+        return 1
+    except BaseException:
+        # Leave this file's frame out of the traceback the student sees.
+        error_type, error, trace = sys.exc_info()
+        traceback.print_exception(error_type, error, trace.tb_next)
+        return PYTHON_MEMORY_EXIT if isinstance(error, MemoryError) else 1
+    finally:
+        sys.stdout.flush()
+        sys.stderr.flush()
+    return 0
+
+
+def run_step(limits, step):
+    """The submission process: drop privileges and run one step."""
+    os.close(STATUS_FD)
+    os.environ.clear()
+    os.environ.update(SUBMISSION_ENV)
+    apply_limits(limits, memory=step.get('memory', True))
+    if 'python' in step:
+        os._exit(run_python(step['python']))
+    os.execvpe(step['argv'][0], step['argv'], SUBMISSION_ENV)
+
+
+def init(jail, workdir, limits, step):
+    """
+    PID 1 of the job's namespace: build the root, run the step in a child and
+    report its wait status. Exiting takes every process left in the namespace
+    with it, including ones that started their own session.
+    """
+    build_root(jail, workdir, limits['mounts'])
+    pid = os.fork()
+    if pid == 0:
+        try:
+            run_step(limits, step)
+        except BaseException:
+            traceback.print_exc()
+        os._exit(127)
+    _, status = os.waitpid(pid, 0)
+    os.write(STATUS_FD, str(status).encode())
+    os._exit(0)
+
+
+def spawn(base, limits, step, cgroup=None):
+    """
+    Fork a child that runs one step in new namespaces (and ``cgroup``, if
+    given) with stdout and stderr on pipes. Returns its pid, the two output
+    pipes and the status pipe.
+    """
+    out_read, out_write = os.pipe()
+    err_read, err_write = os.pipe()
+    status_read, status_write = os.pipe()
+    sys.stdout.flush()
+    pid = os.fork()
+    if pid == 0:
+        try:
+            os.setsid()
+            devnull = os.open(os.devnull, os.O_RDONLY)
+            os.dup2(devnull, 0)
+            os.dup2(out_write, 1)
+            os.dup2(err_write, 2)
+            os.dup2(status_write, STATUS_FD)
+            # Drops the other pipe ends and the worker's protocol stream from the child.
+            os.closerange(STATUS_FD + 1, resource.getrlimit(resource.RLIMIT_NOFILE)[0])
+            resource.setrlimit(resource.RLIMIT_CORE, (0, 0))
+            if cgroup:
+                enter_cgroup(cgroup, limits)
+            uid, gid = os.getuid(), os.getgid()
+            unshare(CLONE_NEWUSER | CLONE_NEWPID | CLONE_NEWNET | CLONE_NEWNS | CLONE_NEWIPC | CLONE_NEWUTS)
+            map_identity(uid, gid)
+            # Only children enter the new PID namespace; the first becomes its init.
+            child = os.fork()
+            if child == 0:
+                try:
+                    init(os.path.join(base, 'root'), os.path.join(base, 'work'), limits, step)
+                except BaseException:
+                    traceback.print_exc()
+                os._exit(127)
+            _, status = os.waitpid(child, 0)
+            os._exit(os.WEXITSTATUS(status) if os.WIFEXITED(status) else 127)
+        except BaseException:
+            traceback.print_exc()
+        os._exit(127)
+    for fd in (out_write, err_write, status_write):
+        os.close(fd)
+    return pid, out_read, err_read, status_read
+
+
+def classify(status, step):
+    """
+    The result status for a step's wait status. Running out of memory is
+    told apart by how each runtime dies of it, never by what the program
+    printed: native code and Node abort (SIGABRT), Python and the JVM exit
+    with a dedicated code.
+    """
+    if os.WIFSIGNALED(status):
+        signal_number = os.WTERMSIG(status)
+        if signal_number == signal.SIGXCPU:
+            return 'cpu_limit'
+        return 'memory_limit' if signal_number in step.get('memory_signals', ()) else 'killed'
+    exit_code = os.WEXITSTATUS(status)
+    if exit_code and exit_code in step.get('memory_exit_codes', ()):
+        return 'memory_limit'
+    return 'error' if exit_code else 'ok'
+
+
+def collect(pid, out_read, err_read, status_read, limits, step):
+    """Read the child's output until it exits or the wall-clock limit passes."""
+    deadline = time.monotonic() + limits['wall_seconds']
+    cap = limits['output_kb'] * 1024
+    buffers = {out_read: bytearray(), err_read: bytearray()}
+    open_fds = [out_read, err_read]
+    timed_out = False
+    while open_fds:
+        remaining = deadline - time.monotonic()
+        if remaining <= 0:
+            timed_out = True
+            break
+        ready, _, _ = select.select(open_fds, [], [], remaining)
+        for fd in ready:
+            chunk = os.read(fd, 65536)
+            if not chunk:
+                open_fds.remove(fd)
+            elif len(buffers[fd]) < cap:
+                buffers[fd] += chunk[:cap - len(buffers[fd])]
+    # Killing the job's process group takes down its PID namespace init, and
+    # with it anything the submission started, whether or not it timed out.
+    try:
+        os.killpg(pid, signal.SIGKILL)
+    except ProcessLookupError:
+        pass
+    _, status = os.waitpid(pid, 0)
+    reported = os.read(status_read, 32)
+    for fd in (out_read, err_read, status_read):
+        os.close(fd)
+    if reported:
+        status = int(reported)
+
+    return {
+        'status': 'timeout' if timed_out else classify(status, step),
+        'exit_code': os.WEXITSTATUS(status) if os.WIFEXITED(status) else -os.WTERMSIG(status),
+        'stdout': bytes(buffers[out_read]).decode('utf-8', 'replace'),
+        'stderr': bytes(buffers[err_read]).decode('utf-8', 'replace'),
+        'truncated': any(len(buffer) >= cap for buffer in buffers.values()),
+    }
+
+
+def run_job(job):
+    started = time.monotonic()
+    limits = job['limits']
+    check_identity()
+    limits['mounts'] = [*limits.get('mounts', ()), sys.base_prefix]
+    base = tempfile.mkdtemp(prefix='submission-')
+    cgroup = limits.get('cgroup') and os.path.join(limits['cgroup'], os.path.basename(base))
+    try:
+        workdir = os.path.join(base, 'work')
+        os.mkdir(workdir)
+        os.mkdir(os.path.join(base, 'root'))
+        for name, content in job.get('files', {}).items():
+            with open(os.path.join(workdir, name), 'w') as source:
+                source.write(content)
+        if cgroup:
+            os.mkdir(cgroup)
+        for step in job['steps']:
+            if 'python' in step:
+                step['memory_exit_codes'] = [PYTHON_MEMORY_EXIT]
+            result = collect(*spawn(base, limits, step, cgroup), limits, step)
+            # A failed compile step ends the job with the compiler's output.
+            if result['status'] != 'ok':
+                break
+    finally:
+        shutil.rmtree(base, ignore_errors=True)
+        # Every task in it has exited: each step's PID namespace died with its init.
+        if cgroup and os.path.isdir(cgroup):
+            os.rmdir(cgroup)
+    result['elapsed_ms'] = round((time.monotonic() - started) * 1000, 1)
+    return result
+
+
+def main():
+    protocol = os.fdopen(os.dup(1), 'w')
+    # Keep stray prints away from the protocol stream.
+    os.dup2(2, 1)
+    for line in sys.stdin:
+        try:
+            result = run_job(json.loads(line))
+        except Exception as error:
+            result = {'status': 'internal_error', 'exit_code': None, 'stdout': '', 'stderr': repr(error), 'truncated': False}
+        protocol.write(json.dumps(result) + '\n')
+        protocol.flush()
+
+
+if __name__ == '__main__':
+    main()
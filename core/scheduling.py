@@ -0,0 +1,224 @@
+from bisect import bisect_right
+from collections import defaultdict
+
+from django.core.exceptions import ValidationError
+from django.db import transaction
+
+from .models import Classroom, ClassStudent, Student, Teacher
+from .teacher_dashboard import mark_stale
+
+
+class IntervalIndex:
+    """
+    Closed date intervals sorted by start, for O(log n) overlap checks.
+
+    Next to the sorted starts it keeps the running maximum of the ends, so
+    "does anything overlap [start, end]?" is one bisect: among the intervals
+    starting on or before ``end``, the latest end must fall before ``start``.
+    That stays correct even if stored intervals overlap each other, as
+    schedules written before validation existed may. The index is built once
+    and never changed.
+    """
+
+    def __init__(self, intervals=()):
+        self.starts, self.ends, self.keys, self.max_ends = [], [], [], []
+        for start, end, key in sorted(intervals, key=lambda interval: interval[0]):
+            self.starts.append(start)
+            self.ends.append(end)
+            self.keys.append(key)
+            self.max_ends.append(max(end, self.max_ends[-1]) if self.max_ends else end)
+
+    def __len__(self):
+        return len(self.starts)
+
+    def overlaps(self, start, end):
+        position = bisect_right(self.starts, end)
+        return bool(position) and self.max_ends[position - 1] >= start
+
+    def conflict(self, start, end):
+        """The key of an interval overlapping [start, end], or None."""
+        if not self.overlaps(start, end):
+            return None
+        for index in range(bisect_right(self.starts, end) - 1, -1, -1):
+            if self.ends[index] >= start:
+                return self.keys[index]
+
+
+def overlapping(start, end, prefix=''):
+    """Lookups for date ranges (at ``prefix``) that share at least one day with [start, end]."""
+    return {f'{prefix}start_date__lte': end, f'{prefix}end_date__gte': start}
+
+
+def teacher_conflict(teacher_id, start, end, exclude=None):
+    """
+    The id of another classroom ``teacher_id`` teaches during [start, end], or
+    None. One range scan of classroom_schedule_idx (teacher, start_date).
+    """
+    return (
+        Classroom.objects.filter(teacher_id=teacher_id, **overlapping(start, end)).exclude(pk=exclude)
+        .values_list('pk', flat=True).first()
+    )
+
+
+def student_conflict(students, start, end, exclude=None, exclude_row=None):
+    """
+    ``(student_id, classroom_id)`` for one of ``students`` (ids or a subquery)
+    attending another classroom during [start, end], or None; ``exclude`` is a
+    classroom and ``exclude_row`` a ClassStudent row to leave out.
+    """
+    return (
+        ClassStudent.objects.filter(student_id__in=students, **overlapping(start, end, prefix='class_obj__'))
+        .exclude(class_obj_id=exclude).exclude(pk=exclude_row)
+        .values_list('student_id', 'class_obj_id').first()
+    )
+
+
+def lock_schedules(teacher_ids=(), student_ids=()):
+    """
+    Lock the Teacher and Student rows whose timetables are about to change,
+    so concurrent bookings for the same person run one after the other.
+    Rows are locked in primary key order to avoid deadlocks.
+    """
+    list(Teacher.objects.select_for_update().filter(pk__in=teacher_ids).order_by('pk').values_list('pk', flat=True))
+    list(Student.objects.select_for_update().filter(pk__in=student_ids).order_by('pk').values_list('pk', flat=True))
+
+
+def classroom_conflicts(classroom):
+    """
+    Why ``classroom`` cannot be saved as it is, as a dict of field errors
+    (empty when it fits): its teacher, or a student already in it, is booked
+    into another classroom over the same dates.
+    """
+    if not (classroom.start_date and classroom.end_date and classroom.teacher_id):
+        return {}
+    if classroom.end_date < classroom.start_date:
+        return {'end_date': "The end date must not be before the start date."}
+    conflict = teacher_conflict(classroom.teacher_id, classroom.start_date, classroom.end_date, exclude=classroom.pk)
+    if conflict is not None:
+        return {'teacher': f"The teacher already teaches classroom {conflict} during these dates."}
+    if classroom.pk:
+        roster = ClassStudent.objects.filter(class_obj_id=classroom.pk).values('student_id')
+        conflict = student_conflict(roster, classroom.start_date, classroom.end_date, exclude=classroom.pk)
+        if conflict is not None:
+            return {'start_date': "Student {} already attends classroom {} during these dates.".format(*conflict)}
+    return {}
+
+
+def class_student_conflicts(class_student):
+    """Field errors for putting a student in a classroom that overlaps another of theirs."""
+    if not (class_student.class_obj_id and class_student.student_id):
+        return {}
+    classroom = Classroom.objects.only('start_date', 'end_date').get(pk=class_student.class_obj_id)
+    conflict = student_conflict(
+        [class_student.student_id], classroom.start_date, classroom.end_date,
+        exclude=classroom.pk, exclude_row=class_student.pk,
+    )
+    if conflict is not None:
+        return {'class_obj': f"The student already attends classroom {conflict[1]} during these dates."}
+    return {}
+
+
+def check_classroom(classroom):
+    """Lock the people a classroom books and raise ValidationError if it double-books them; call inside atomic()."""
+    roster = ClassStudent.objects.filter(class_obj_id=classroom.pk).values_list('student_id', flat=True) if classroom.pk else []
+    lock_schedules([classroom.teacher_id], roster)
+    errors = classroom_conflicts(classroom)
+    if errors:
+        raise ValidationError(errors)
+
+
+def check_class_student(class_student):
+    """Lock the student and raise ValidationError if the classroom overlaps another of theirs; call inside atomic()."""
+    lock_schedules(student_ids=[class_student.student_id])
+    errors = class_student_conflicts(class_student)
+    if errors:
+        raise ValidationError(errors)
+
+
+def propose_timetable(term_start, term_end):
+    """
+    Conflict-free teacher assignments for every classroom running in a term.
+
+    Classrooms are taken in start order. Each keeps its current teacher if
+    that teacher is free and qualified (``teaching_level`` equal to the
+    course level); otherwise it goes to the least loaded qualified teacher
+    who is free over its dates. Classrooms outside the term stay as they are
+    and count as fixed bookings, held in one IntervalIndex per teacher.
+    Because the term's classrooms arrive in start order, the ones already
+    planned for a teacher overlap a new one exactly when the latest of their
+    end dates reaches its start, so that date is all that is kept for them.
+    Each check is a bisect plus a comparison, and the whole term is planned
+    in O(c · t · log n) for c classrooms and t candidate teachers per level.
+
+    Returns ``(assignments, unassigned)``: dicts of classroom, current and
+    proposed teacher, and the ids of classrooms no teacher could take.
+    """
+    classrooms = list(
+        Classroom.objects.filter(**overlapping(term_start, term_end))
+        .order_by('start_date', 'end_date', 'pk')
+        .values('pk', 'start_date', 'end_date', 'teacher_id', 'course__level')
+    )
+    teachers_by_level = defaultdict(list)
+    for teacher_id, level in Teacher.objects.order_by('pk').values_list('pk', 'teaching_level'):
+        teachers_by_level[level].append(teacher_id)
+    planned = [classroom['pk'] for classroom in classrooms]
+    fixed = Classroom.objects.exclude(pk__in=planned).filter(**overlapping(
+        min((classroom['start_date'] for classroom in classrooms), default=term_start),
+        max((classroom['end_date'] for classroom in classrooms), default=term_end),
+    ))
+    bookings = defaultdict(list)
+    loads = defaultdict(int)
+    for teacher_id, start, end, pk in fixed.values_list('teacher_id', 'start_date', 'end_date', 'pk'):
+        bookings[teacher_id].append((start, end, pk))
+        loads[teacher_id] += 1
+    schedules = defaultdict(IntervalIndex, {teacher_id: IntervalIndex(entries) for teacher_id, entries in bookings.items()})
+    booked_until = {}
+
+    def is_free(teacher_id, start, end):
+        planned_end = booked_until.get(teacher_id)
+        return (planned_end is None or planned_end < start) and not schedules[teacher_id].overlaps(start, end)
+
+    assignments, unassigned = [], []
+    for classroom in classrooms:
+        start, end = classroom['start_date'], classroom['end_date']
+        candidates = teachers_by_level[classroom['course__level']]
+        current = classroom['teacher_id']
+        if current in candidates and is_free(current, start, end):
+            chosen = current
+        else:
+            free = [(loads[teacher_id], teacher_id) for teacher_id in candidates if is_free(teacher_id, start, end)]
+            chosen = min(free)[1] if free else None
+        if chosen is None:
+            unassigned.append(classroom['pk'])
+            continue
+        booked_until[chosen] = max(end, booked_until.get(chosen, end))
+        loads[chosen] += 1
+        assignments.append({'classroom': classroom['pk'], 'current_teacher': current, 'proposed_teacher': chosen})
+    return assignments, unassigned
+
+
+def apply_timetable(assignments):
+    """
+    Save proposed teachers, on the classrooms and their ClassStudent rows,
+    and return how many changed. The teachers involved are locked first and
+    every moved classroom is checked against the saved schedule before the
+    transaction commits, so a proposal that went stale in the meantime
+    raises ValidationError and changes nothing.
+    """
+    changed = [assignment for assignment in assignments if assignment['proposed_teacher'] != assignment['current_teacher']]
+    teachers = {
+        teacher_id for assignment in changed
+        for teacher_id in (assignment['current_teacher'], assignment['proposed_teacher'])
+    }
+    with transaction.atomic():
+        lock_schedules(teachers)
+        for assignment in changed:
+            Classroom.objects.filter(pk=assignment['classroom']).update(teacher_id=assignment['proposed_teacher'])
+            ClassStudent.objects.filter(class_obj_id=assignment['classroom']).update(teacher_id=assignment['proposed_teacher'])
+        moved = Classroom.objects.filter(pk__in=[assignment['classroom'] for assignment in changed])
+        for pk, teacher_id, start, end in moved.values_list('pk', 'teacher_id', 'start_date', 'end_date'):
+            conflict = teacher_conflict(teacher_id, start, end, exclude=pk)
+            if conflict is not None:
+                raise ValidationError(f"Classroom {pk} would overlap classroom {conflict} for teacher {teacher_id}.")
+        mark_stale(teachers=teachers)
+    return len(changed)
@@ -0,0 +1,154 @@
+import html
+import re
+
+from django.db import connection
+from django.db.models import Q
+from django.db.models.expressions import RawSQL
+from django.db.models.signals import post_delete, post_save
+from django.dispatch import receiver
+
+from .models import Course, DiscussionForumPost, Reply, SearchDocument
+
+SEARCH_LIMIT = 20
+FALLBACK_CANDIDATES = 500
+SNIPPET_LENGTH = 160
+INDEX_BATCH_SIZE = 1000
+
+
+def course_document(course):
+    return SearchDocument(
+        kind='course', object_id=course.pk, course_id=course.pk, title=course.title,
+        body=f"{course.description}\n{course.requirements}",
+    )
+
+
+def post_document(post):
+    return SearchDocument(kind='post', object_id=str(post.pk), course_id=post.course_id, body=post.post_content)
+
+
+def reply_document(reply, course_id):
+    return SearchDocument(kind='reply', object_id=str(reply.pk), course_id=course_id, body=reply.content)
+
+
+def index_document(document):
+    SearchDocument.objects.update_or_create(
+        kind=document.kind, object_id=document.object_id,
+        defaults={'course_id': document.course_id, 'title': document.title, 'body': document.body},
+    )
+
+
+def rebuild_search_index(batch_size=INDEX_BATCH_SIZE):
+    """
+    Re-create every search document from the source tables, e.g. after a bulk
+    import that bypassed signals. Returns the number of documents indexed.
+
+    Source rows are streamed and documents written ``batch_size`` at a time,
+    so memory stays flat however large the tables are.
+    """
+    sources = [
+        (Course.objects.order_by('pk'), course_document),
+        (DiscussionForumPost.objects.order_by('pk'), post_document),
+        (Reply.objects.select_related('post').only('content', 'post__course_id').order_by('pk'),
+         lambda reply: reply_document(reply, reply.post.course_id)),
+    ]
+    SearchDocument.objects.all().delete()
+    indexed = 0
+    for queryset, build in sources:
+        batch = []
+        for instance in queryset.iterator(chunk_size=batch_size):
+            batch.append(build(instance))
+            if len(batch) == batch_size:
+                SearchDocument.objects.bulk_create(batch)
+                indexed += len(batch)
+                batch = []
+        SearchDocument.objects.bulk_create(batch)
+        indexed += len(batch)
+    return indexed
+
+
+def search_terms(query):
+    return [term for term in re.findall(r'\w+', query.lower()) if len(term) > 1]
+
+
+def highlight(text, terms, length=SNIPPET_LENGTH):
+    """An HTML-escaped snippet of ``text`` around the first match, with matches in ``<mark>``."""
+    if not terms:
+        return html.escape(text[:length])
+    pattern = re.compile(r'\b(' + '|'.join(re.escape(term) for term in terms) + r')', re.IGNORECASE)
+    match = pattern.search(text)
+    start = max(0, match.start() - length // 4) if match else 0
+    snippet = text[start:start + length]
+    marked = pattern.sub(lambda m: '\0' + m.group(0) + '\1', snippet)
+    marked = html.escape(marked).replace('\0', '<mark>').replace('\1', '</mark>')
+    return ('…' if start else '') + marked + ('…' if start + length < len(text) else '')
+
+
+def _ranked_documents(terms, documents, limit):
+    if connection.vendor == 'mysql':
+        score = RawSQL(
+            'MATCH (title, body) AGAINST (%s IN NATURAL LANGUAGE MODE)', [' '.join(terms)],
+        )
+        return list(documents.annotate(score=score).filter(score__gt=0).order_by('-score')[:limit])
+
+    # No FULLTEXT index elsewhere: every term must appear, ranked by how often.
+    condition = Q()
+    for term in terms:
+        condition &= Q(title__icontains=term) | Q(body__icontains=term)
+    candidates = list(documents.filter(condition)[:FALLBACK_CANDIDATES])
+    for document in candidates:
+        text = f"{document.title} {document.body}".lower()
+        document.score = sum(text.count(term) for term in terms)
+    candidates.sort(key=lambda document: -document.score)
+    return candidates[:limit]
+
+
+def search(query, kinds=None, course=None, limit=SEARCH_LIMIT):
+    """
+    Ranked matches for ``query`` as dicts with ``kind``, ``id``, ``course``,
+    ``title``, ``score`` and a highlighted ``snippet``.
+    """
+    terms = search_terms(query)
+    if not terms:
+        return []
+    documents = SearchDocument.objects.all()
+    if kinds:
+        documents = documents.filter(kind__in=kinds)
+    if course:
+        documents = documents.filter(course=course)
+    return [
+        {
+            'kind': document.kind,
+            'id': document.object_id,
+            'course': document.course_id,
+            'title': highlight(document.title, terms) if document.title else '',
+            'score': float(document.score),
+            'snippet': highlight(document.body, terms),
+        }
+        for document in _ranked_documents(terms, documents, limit)
+    ]
+
+
+@receiver(post_save, sender=Course)
+def index_course(sender, instance, raw=False, **kwargs):
+    if not raw:
+        index_document(course_document(instance))
+
+
+@receiver(post_save, sender=DiscussionForumPost)
+def index_post(sender, instance, raw=False, **kwargs):
+    if not raw:
+        index_document(post_document(instance))
+
+
+@receiver(post_save, sender=Reply)
+def index_reply(sender, instance, raw=False, **kwargs):
+    if not raw:
+        index_document(reply_document(instance, instance.post.course_id))
+
+
+@receiver(post_delete, sender=Course)
+@receiver(post_delete, sender=DiscussionForumPost)
+@receiver(post_delete, sender=Reply)
+def unindex(sender, instance, **kwargs):
+    kind = {Course: 'course', DiscussionForumPost: 'post', Reply: 'reply'}[sender]
+    SearchDocument.objects.filter(kind=kind, object_id=str(instance.pk)).delete()
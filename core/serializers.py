@@ -4,9 +4,25 @@ from .models import (
     Admin, Classroom, ClassStudent, StudentAssessment, Teacher, Student, Course, 
     Payment, Subject, Qualification, Assessment, Progress, Enrollment, Message, 
     DiscussionForumPost, Reply, Notification, Assignment, TeacherBoard, CodeEditor, 
-    CameraInteraction
+    CameraInteraction, Broadcast
 )
 
+class EagerLoadingMixin:
+    """
+    Lets a serializer declare the relations it renders, so list views can
+    fetch them up front instead of issuing queries per row.
+    """
+    select_related_fields = ()
+    prefetch_related_fields = ()
+
+    @classmethod
+    def setup_eager_loading(cls, queryset):
+        if cls.select_related_fields:
+            queryset = queryset.select_related(*cls.select_related_fields)
+        if cls.prefetch_related_fields:
+            queryset = queryset.prefetch_related(*cls.prefetch_related_fields)
+        return queryset
+
 class UserSerializer(serializers.ModelSerializer):
     class Meta:
         model = User
@@ -17,10 +33,12 @@ class AdminSerializer(serializers.ModelSerializer):
         model = Admin
         fields = '__all__'
 
-class ClassroomSerializer(serializers.ModelSerializer):
+class ClassroomSerializer(EagerLoadingMixin, serializers.ModelSerializer):
     course = serializers.StringRelatedField() 
     teacher = serializers.StringRelatedField() 
     students = serializers.StringRelatedField(many=True)
+    select_related_fields = ('course', 'teacher')
+    prefetch_related_fields = ('students',)
     class Meta:
         model = Classroom
         fields = '__all__'
@@ -35,37 +53,48 @@ class StudentAssessmentSerializer(serializers.ModelSerializer):
         model = StudentAssessment
         fields = '__all__'
 
-        def validate_score(self, value):
-            if value > self.instance.assessment.max_score:
-                raise serializers.ValidationError("Score cannot exceed the maximum score for this assessment.")
-            return value
+    def validate(self, attrs):
+        assessment = attrs.get('assessment') or self.instance.assessment
+        score = attrs.get('score', getattr(self.instance, 'score', None))
+        if score is not None and not 0 <= score <= assessment.max_score:
+            raise serializers.ValidationError(
+                {'score': "Score must be between 0 and the maximum score for this assessment."}
+            )
+        return attrs
 
-class TeacherSerializer(serializers.ModelSerializer):
+class TeacherSerializer(EagerLoadingMixin, serializers.ModelSerializer):
     expertise_area = serializers.StringRelatedField(many=True)
     qualifications = serializers.StringRelatedField(many=True)
+    prefetch_related_fields = ('expertise_area', 'qualifications', 'students')
 
     class Meta:
         model = Teacher
         fields = '__all__'
 
 
-class StudentSerializer(serializers.ModelSerializer):
+class StudentSerializer(EagerLoadingMixin, serializers.ModelSerializer):
     progress = serializers.StringRelatedField()  
     enrolled_courses = serializers.StringRelatedField(many=True)
+    # Progress.__str__ renders its student and course.
+    select_related_fields = ('progress__student', 'progress__course')
+    prefetch_related_fields = ('enrolled_courses',)
     class Meta:
         model = Student
         fields = '__all__'
 
-class CourseSerializer(serializers.ModelSerializer):
+class CourseSerializer(EagerLoadingMixin, serializers.ModelSerializer):
     subjects = serializers.StringRelatedField(many=True) 
     teacher = serializers.StringRelatedField()
+    select_related_fields = ('teacher',)
+    prefetch_related_fields = ('subjects',)
     class Meta:
         model = Course
         fields = '__all__'
 
-class PaymentSerializer(serializers.ModelSerializer):
+class PaymentSerializer(EagerLoadingMixin, serializers.ModelSerializer):
     student = serializers.StringRelatedField()  
     course = serializers.StringRelatedField()
+    select_related_fields = ('student', 'course')
     class Meta:
         model = Payment
         fields = '__all__'
@@ -100,12 +129,19 @@ class MessageSerializer(serializers.ModelSerializer):
         model = Message
         fields = '__all__'
 
-class DiscussionForumPostSerializer(serializers.ModelSerializer):
+class DiscussionForumPostSerializer(EagerLoadingMixin, serializers.ModelSerializer):
+    creator_name = serializers.CharField(source='creator.username', read_only=True)
+    reply_count = serializers.IntegerField(source='summary.reply_count', read_only=True)
+    last_reply_at = serializers.DateTimeField(source='summary.last_reply_at', read_only=True)
+    last_author = serializers.CharField(source='summary.last_author.username', read_only=True, default=None)
+    select_related_fields = ('creator', 'summary__last_author')
     class Meta:
         model = DiscussionForumPost
         fields = '__all__'
 
-class ReplySerializer(serializers.ModelSerializer):
+class ReplySerializer(EagerLoadingMixin, serializers.ModelSerializer):
+    author_name = serializers.CharField(source='author.username', read_only=True)
+    select_related_fields = ('author',)
     class Meta:
         model = Reply
         fields = '__all__'
@@ -115,6 +151,18 @@ class NotificationSerializer(serializers.ModelSerializer):
         model = Notification
         fields = '__all__'
 
+class BroadcastSerializer(serializers.ModelSerializer):
+    progress = serializers.FloatField(read_only=True)
+    throughput = serializers.FloatField(read_only=True)
+
+    class Meta:
+        model = Broadcast
+        fields = '__all__'
+        read_only_fields = [
+            'sender', 'status', 'recipient_count', 'created_count', 'delivered_count',
+            'created_at', 'started_at', 'finished_at', 'last_progress_at',
+        ]
+
 class AssignmentSerializer(serializers.ModelSerializer):
     class Meta:
         model = Assignment
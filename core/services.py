@@ -1,23 +1,188 @@
-from .models import Student, Teacher
-
-def process_payment(student: Student, amount: float):
-    """Processes payment for the student and sends notifications."""
-    student.fees_paid += amount
-    student.save()
-
-    
-    student.send_payment_notification(amount)
-
-    
-    try:
-        teacher = Teacher.objects.get(user=student.user) 
-        teacher.send_payment_notification(amount)
-    except Teacher.DoesNotExist:
-        print(f"No associated teacher found for student: {student.full_name}")
-
-    
-    student.send_sms_notification(amount)
-    try:
-        teacher.send_sms_notification(amount)
-    except Teacher.DoesNotExist:
-        print(f"No associated teacher found for student: {student.full_name}")
+import uuid
+
+from django.db import connection, transaction
+
+from .fees import invalidate_fee_schedules
+from .gradebook import invalidate_gradebook
+from .ledger import record_payment
+from .models import Assessment, Broadcast, Course, Enrollment, Student, StudentAssessment
+from .student_dashboard import invalidate_student_dashboards
+from .tasks import run_broadcast, send_payment_notifications
+from .teacher_assignment import bulk_assign_teachers
+from .teacher_dashboard import mark_stale
+
+ENROLLMENT_BATCH_SIZE = 1000
+SCORE_IMPORT_BATCH_SIZE = 1000
+
+
+def process_payment(student: Student, amount: float, idempotency_key: str = None, course: Course = None):
+    """
+    Records the payment for the student in the ledger and queues the notifications.
+
+    ``idempotency_key`` is stored as the payment reference (a fresh one is
+    generated when omitted): replaying the same payment records nothing new
+    and sends no further notifications. Emails and SMS messages are sent by
+    Celery workers once the payment is committed.
+    """
+    idempotency_key = idempotency_key or uuid.uuid4().hex
+    with transaction.atomic():
+        payment, created = record_payment(student, amount, course=course, reference=idempotency_key)
+        if created:
+            transaction.on_commit(
+                lambda: send_payment_notifications.delay(idempotency_key, student.pk, str(payment.amount_paid))
+            )
+    return payment
+
+
+def bulk_enroll(rows, chunk_size=ENROLLMENT_BATCH_SIZE):
+    """
+    Enroll a batch of students into courses.
+
+    ``rows`` is a list of mappings with ``student`` (student id) and ``course``
+    (course title) keys. Invalid rows are reported back by their 1-based
+    position and skipped; the valid rows are written with chunked
+    ``bulk_create`` after a single teacher assignment pass over the batch.
+    """
+    errors = []
+    wanted = []
+    for index, row in enumerate(rows, start=1):
+        student_id = str(row.get('student') or '').strip()
+        course_title = str(row.get('course') or '').strip()
+        if not student_id or not course_title:
+            errors.append({'row': index, 'error': 'Both student and course are required.'})
+            continue
+        wanted.append((index, student_id, course_title))
+
+    student_ids = list({student_id for _, student_id, _ in wanted})
+    course_titles = list({course_title for _, _, course_title in wanted})
+    students = Student.objects.only('id', 'education_level').in_bulk(student_ids)
+    courses = Course.objects.only('title').in_bulk(course_titles)
+
+    existing = set()
+    for start in range(0, len(student_ids), chunk_size):
+        existing.update(
+            Enrollment.objects.filter(
+                student_id__in=student_ids[start:start + chunk_size],
+                course_id__in=course_titles,
+            ).values_list('student_id', 'course_id')
+        )
+
+    enrollments = []
+    for index, student_id, course_title in wanted:
+        student = students.get(student_id)
+        course = courses.get(course_title)
+        if student is None:
+            errors.append({'row': index, 'error': f"Student '{student_id}' does not exist."})
+        elif course is None:
+            errors.append({'row': index, 'error': f"Course '{course_title}' does not exist."})
+        elif (student_id, course_title) in existing:
+            errors.append({'row': index, 'error': f"{student_id} is already enrolled in '{course_title}'."})
+        else:
+            existing.add((student_id, course_title))
+            enrollments.append(Enrollment(student=student, course=course))
+
+    with transaction.atomic():
+        unassigned = bulk_assign_teachers(enrollments)
+        Enrollment.objects.bulk_create(enrollments, batch_size=chunk_size)
+        invalidate_fee_schedules({enrollment.student_id for enrollment in enrollments})
+        mark_stale(teachers={enrollment.teacher_id for enrollment in enrollments if enrollment.teacher_id})
+        invalidate_student_dashboards(student_ids={enrollment.student_id for enrollment in enrollments})
+
+    return {
+        'created': len(enrollments),
+        'without_teacher': len(unassigned),
+        'errors': sorted(errors, key=lambda error: error['row']),
+    }
+
+
+def start_broadcast(course: Course, sender, content: str, link: str = None):
+    """
+    Records a course-wide announcement and queues it for fan-out.
+
+    Notifications are written and pushed by Celery workers once the broadcast
+    is committed; its counters report the progress.
+    """
+    with transaction.atomic():
+        broadcast = Broadcast.objects.create(course=course, sender=sender, content=content, link=link)
+        transaction.on_commit(lambda: run_broadcast.delay(broadcast.pk), robust=True)
+    return broadcast
+
+
+def import_scores(rows, allowed_courses=None, chunk_size=SCORE_IMPORT_BATCH_SIZE):
+    """
+    Create or update StudentAssessment scores from an upload.
+
+    ``rows`` is a list of mappings with ``student`` (student id),
+    ``assessment`` (assessment id) and ``score`` keys. The whole upload is
+    validated in memory against the assessments' ``max_score`` values, which
+    are fetched once; invalid rows are reported by their 1-based position
+    and skipped. Valid rows are upserted on (student, assessment) with
+    chunked ``bulk_create``. ``allowed_courses`` (course titles) limits which
+    assessments may be scored; None allows all.
+    """
+    errors = []
+    parsed = []
+    for index, row in enumerate(rows, start=1):
+        student_id = str(row.get('student') or '').strip()
+        try:
+            assessment_id = int(str(row.get('assessment') or '').strip())
+            score = int(str(row.get('score', '')).strip())
+        except ValueError:
+            errors.append({'row': index, 'error': 'student, assessment (id) and score (whole number) are required.'})
+            continue
+        if not student_id:
+            errors.append({'row': index, 'error': 'student is required.'})
+            continue
+        parsed.append((index, student_id, assessment_id, score))
+
+    assessments = Assessment.objects.only('id', 'max_score', 'course_id').in_bulk(
+        list({assessment_id for _, _, assessment_id, _ in parsed})
+    )
+    student_ids = list({student_id for _, student_id, _, _ in parsed})
+    students = set()
+    existing = set()
+    for start in range(0, len(student_ids), chunk_size):
+        chunk = student_ids[start:start + chunk_size]
+        students.update(Student.objects.filter(pk__in=chunk).values_list('pk', flat=True))
+        existing.update(
+            StudentAssessment.objects.filter(student_id__in=chunk, assessment_id__in=list(assessments))
+            .values_list('student_id', 'assessment_id')
+        )
+
+    scores = {}
+    for index, student_id, assessment_id, score in parsed:
+        assessment = assessments.get(assessment_id)
+        if assessment is None:
+            errors.append({'row': index, 'error': f"Assessment {assessment_id} does not exist."})
+        elif allowed_courses is not None and assessment.course_id not in allowed_courses:
+            errors.append({'row': index, 'error': f"You cannot record scores for assessment {assessment_id}."})
+        elif student_id not in students:
+            errors.append({'row': index, 'error': f"Student '{student_id}' does not exist."})
+        elif not 0 <= score <= assessment.max_score:
+            errors.append({'row': index, 'error': f"Score must be between 0 and {assessment.max_score}."})
+        elif (student_id, assessment_id) in scores:
+            errors.append({'row': index, 'error': f"Duplicate score for {student_id} in assessment {assessment_id}."})
+        else:
+            scores[student_id, assessment_id] = score
+
+    upsert = {'update_conflicts': True, 'update_fields': ['score']}
+    if connection.features.supports_update_conflicts_with_target:
+        upsert['unique_fields'] = ['student', 'assessment']
+    objects = [
+        StudentAssessment(student_id=student_id, assessment_id=assessment_id, score=score)
+        for (student_id, assessment_id), score in scores.items()
+    ]
+    with transaction.atomic():
+        for start in range(0, len(objects), chunk_size):
+            StudentAssessment.objects.bulk_create(objects[start:start + chunk_size], **upsert)
+        course_ids = {assessments[assessment_id].course_id for _, assessment_id in scores}
+        invalidate_gradebook(course_ids)
+        mark_stale(courses=course_ids)
+        invalidate_student_dashboards(student_ids={student_id for student_id, _ in scores})
+
+    updated = len(existing & scores.keys())
+    return {
+        'created': len(scores) - updated,
+        'updated': updated,
+        'errors': sorted(errors, key=lambda error: error['row']),
+    }
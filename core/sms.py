@@ -0,0 +1,38 @@
+from django.conf import settings
+from django.utils.module_loading import import_string
+
+
+def get_sms_backend():
+    return import_string(settings.SMS_BACKEND)()
+
+
+class TwilioSMSBackend:
+    """Sends a batch of SMS messages over a single Twilio client."""
+
+    def send_messages(self, messages):
+        """Send ``(to, body)`` pairs; returns an error string, or None on success, per message."""
+        from twilio.rest import Client
+
+        client = Client(settings.TWILIO_ACCOUNT_SID, settings.TWILIO_AUTH_TOKEN)
+        results = []
+        for to, body in messages:
+            try:
+                client.messages.create(to=to, from_=settings.TWILIO_FROM_NUMBER, body=body)
+            except Exception as exc:
+                # API errors and transport errors (timeouts, refused connections)
+                # alike fail only this message.
+                results.append(str(exc) or type(exc).__name__)
+            else:
+                results.append(None)
+        return results
+
+
+outbox = []
+
+
+class LocMemSMSBackend:
+    """Keeps sent messages in ``core.sms.outbox``; for tests and local development."""
+
+    def send_messages(self, messages):
+        outbox.extend(messages)
+        return [None] * len(messages)
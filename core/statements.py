@@ -0,0 +1,193 @@
+import csv
+from collections import deque
+from concurrent.futures import ProcessPoolExecutor
+
+from django.db.models import Prefetch
+
+from .fees import annotate_fee_schedule, build_fee_schedule
+from .models import Payment, Student
+
+STATEMENT_CHUNK_SIZE = 2000
+PDF_RENDER_BATCH = 50
+
+CSV_COLUMNS = [
+    'student', 'full_name', 'education_level', 'enrolled_courses', 'total_fees', 'discounted_fee',
+    'initial_payment', 'final_payment', 'fees_paid', 'remaining_fee', 'fee_status',
+    'payments', 'last_payment', 'payment_instructions',
+]
+
+
+def statement_queryset(education_level=None, unpaid_only=False, student_ids=None):
+    students = Student.objects.order_by('pk')
+    if education_level:
+        students = students.filter(education_level=education_level)
+    if unpaid_only:
+        students = students.filter(fee_status=False)
+    if student_ids:
+        students = students.filter(pk__in=student_ids)
+    return students
+
+
+def statement_rows(students, chunk_size=STATEMENT_CHUNK_SIZE):
+    """
+    Yield one plain dict per student with their fee schedule and payments.
+
+    Students are read ``chunk_size`` at a time with their payments prefetched
+    per chunk, so memory use does not grow with the number of students.
+    """
+    payments = Prefetch(
+        'payments',
+        queryset=Payment.objects.order_by('created_at', 'pk').only(
+            'student_id', 'amount_paid', 'reference', 'created_at', 'course_id',
+        ),
+    )
+    students = annotate_fee_schedule(students).prefetch_related(payments)
+    for student in students.iterator(chunk_size=chunk_size):
+        row = build_fee_schedule(student)
+        row.update({
+            'full_name': student.full_name,
+            'education_level': student.education_level,
+            'fee_status': 'Paid' if student.fee_status else 'Outstanding',
+            'payment_instructions': student.get_payment_instructions(),
+            'payments': [
+                (payment.created_at.date().isoformat(), payment.reference or '', payment.amount_paid)
+                for payment in student.payments.all()
+            ],
+        })
+        yield row
+
+
+class _Echo:
+    """File-like object whose write() hands the line back, so csv.writer can feed a generator."""
+
+    def write(self, value):
+        return value
+
+
+def stream_csv(rows):
+    writer = csv.writer(_Echo())
+    yield writer.writerow(CSV_COLUMNS)
+    for row in rows:
+        payments = row['payments']
+        yield writer.writerow([
+            row['student'], row['full_name'], row['education_level'], row['enrolled_courses'],
+            row['total_fees'], row['discounted_fee'], row['initial_payment'], row['final_payment'],
+            row['fees_paid'], row['remaining_fee'], row['fee_status'], len(payments),
+            payments[-1][0] if payments else '', row['payment_instructions'],
+        ])
+
+
+def _pdf_text(value):
+    text = str(value).replace('\\', '\\\\').replace('(', '\\(').replace(')', '\\)')
+    return text.encode('latin-1', errors='replace')
+
+
+def render_statement_page(row):
+    """The PDF content stream for one student's statement page."""
+    lines = [
+        'EduLearn Fee Statement',
+        '',
+        f"Student: {row['full_name']} ({row['student']})",
+        f"Level: {row['education_level']}",
+        f"Courses enrolled: {row['enrolled_courses']}",
+        '',
+        f"Total fees: KES {row['total_fees']}",
+        f"Fees after discount: KES {row['discounted_fee']}",
+        f"Initial payment (60%): KES {row['initial_payment']}",
+        f"Final payment (40%): KES {row['final_payment']}",
+        f"Paid to date: KES {row['fees_paid']}",
+        f"Remaining balance: KES {row['remaining_fee']} ({row['fee_status']})",
+        '',
+        'Payments:',
+    ]
+    lines += [f"  {day}  {reference}  KES {amount}" for day, reference, amount in row['payments'][-30:]]
+    if not row['payments']:
+        lines.append('  None recorded.')
+    lines += ['', row['payment_instructions']]
+
+    stream = [b'BT /F1 11 Tf 14 TL 50 790 Td']
+    for line in lines:
+        stream.append(b'(' + _pdf_text(line) + b') Tj T*')
+    stream.append(b'ET')
+    return b'\n'.join(stream)
+
+
+def _render_batch(rows):
+    return [render_statement_page(row) for row in rows]
+
+
+def _batched(rows, size):
+    batch = []
+    for row in rows:
+        batch.append(row)
+        if len(batch) == size:
+            yield batch
+            batch = []
+    if batch:
+        yield batch
+
+
+def render_pages(rows, processes=1):
+    """
+    Yield rendered pages in order, optionally rendering on a process pool.
+
+    Only a bounded window of batches is in flight at once, so a slow
+    consumer never makes the whole result set pile up in memory.
+    """
+    if processes <= 1:
+        for row in rows:
+            yield render_statement_page(row)
+        return
+
+    with ProcessPoolExecutor(max_workers=processes) as pool:
+        in_flight = deque()
+        for batch in _batched(rows, PDF_RENDER_BATCH):
+            in_flight.append(pool.submit(_render_batch, batch))
+            if len(in_flight) >= processes * 2:
+                yield from in_flight.popleft().result()
+        while in_flight:
+            yield from in_flight.popleft().result()
+
+
+def stream_pdf(rows, processes=1):
+    """
+    Stream a single PDF with one statement page per row.
+
+    Objects are written as soon as each page is rendered; only their byte
+    offsets are kept so the page tree and cross-reference table can be
+    written at the end.
+    """
+    offsets = [0, 0, 0, 0]
+    position = 0
+
+    def obj(number, body):
+        nonlocal position
+        offsets[number] = position
+        data = b'%d 0 obj\n' % number + body + b'\nendobj\n'
+        position += len(data)
+        return data
+
+    header = b'%PDF-1.4\n%\xe2\xe3\xcf\xd3\n'
+    position = len(header)
+    yield header
+    yield obj(1, b'<< /Type /Catalog /Pages 2 0 R >>')
+    yield obj(3, b'<< /Type /Font /Subtype /Type1 /BaseFont /Helvetica /Encoding /WinAnsiEncoding >>')
+
+    page_ids = []
+    for content in render_pages(rows, processes):
+        content_id = len(offsets)
+        offsets.extend([0, 0])
+        yield obj(content_id, b'<< /Length %d >>\nstream\n' % len(content) + content + b'\nendstream')
+        yield obj(content_id + 1, (
+            b'<< /Type /Page /Parent 2 0 R /MediaBox [0 0 595 842] '
+            b'/Resources << /Font << /F1 3 0 R >> >> /Contents %d 0 R >>' % content_id
+        ))
+        page_ids.append(content_id + 1)
+
+    kids = b' '.join(b'%d 0 R' % page_id for page_id in page_ids)
+    yield obj(2, b'<< /Type /Pages /Kids [' + kids + b'] /Count %d >>' % len(page_ids))
+
+    xref = [b'xref\n0 %d\n' % len(offsets), b'0000000000 65535 f \n']
+    xref += [b'%010d 00000 n \n' % offset for offset in offsets[1:]]
+    yield b''.join(xref)
+    yield b'trailer\n<< /Size %d /Root 1 0 R >>\nstartxref\n%d\n%%%%EOF\n' % (len(offsets), position)
@@ -0,0 +1,164 @@
+from django.core.cache import cache
+from django.db import transaction
+from django.db.models import Exists, OuterRef
+from django.db.models.functions import Coalesce
+from django.db.models.signals import post_delete, post_save
+from django.dispatch import receiver
+from django.utils import timezone
+
+from .models import (
+    Assessment, DiscussionForumPost, Enrollment, Notification, Payment, Progress, Student, StudentAssessment,
+)
+
+# Forum activity and newly scheduled assessments are not invalidated per
+# student, so snapshots are also short-lived.
+SNAPSHOT_TIMEOUT = 5 * 60
+UPCOMING_ASSESSMENTS = 10
+RECENT_NOTIFICATIONS = 5
+RECENT_FORUM_POSTS = 5
+HITS_KEY = 'student_dashboard:hits'
+MISSES_KEY = 'student_dashboard:misses'
+
+
+def _cache_key(user_id):
+    return f'student_dashboard:{user_id}'
+
+
+def _count(key):
+    cache.add(key, 0, timeout=None)
+    cache.incr(key)
+
+
+def build_snapshot(student):
+    """Everything on a student's dashboard, from six queries."""
+    enrollments = list(
+        Enrollment.objects.filter(student=student).order_by('enrollment_date')
+        .values('course_id', 'teacher_id', 'enrollment_date', 'payment_status', 'completion_status')
+    )
+    courses = [enrollment['course_id'] for enrollment in enrollments]
+    progress = {
+        row.pop('course_id'): row
+        for row in Progress.objects.filter(student=student)
+        .values('course_id', 'modules_completed', 'total_modules', 'progress_percentage')
+    }
+    scored = StudentAssessment.objects.filter(student=student, assessment=OuterRef('pk'))
+    upcoming = (
+        Assessment.objects.filter(course__in=courses, due_date__gte=timezone.localdate())
+        .annotate(scored=Exists(scored)).order_by('due_date', 'pk')
+        .values('pk', 'title', 'course_id', 'type', 'due_date', 'max_score', 'scored')[:UPCOMING_ASSESSMENTS]
+    )
+    unread = Notification.objects.filter(recipient_id=student.user_id, is_read=False)
+    posts = (
+        DiscussionForumPost.objects.filter(course__in=courses)
+        .annotate(last_activity=Coalesce('summary__last_reply_at', 'timestamp')).order_by('-last_activity')
+        .values('pk', 'course_id', 'creator__username', 'post_content', 'summary__reply_count', 'last_activity')
+        [:RECENT_FORUM_POSTS]
+    )
+    return {
+        'student': student.pk,
+        'full_name': student.full_name,
+        'fees': {
+            'total_fees': student.total_fees,
+            'fees_paid': student.fees_paid,
+            'remaining_fee': student.remaining_fee,
+            'fee_status': student.fee_status,
+        },
+        'enrolled_courses': [
+            {
+                'course': enrollment['course_id'],
+                'teacher': enrollment['teacher_id'],
+                'enrollment_date': enrollment['enrollment_date'],
+                'payment_status': enrollment['payment_status'],
+                'completion_status': enrollment['completion_status'],
+                'progress': progress.get(enrollment['course_id']),
+            }
+            for enrollment in enrollments
+        ],
+        'upcoming_assessments': [
+            {
+                'id': assessment['pk'],
+                'title': assessment['title'],
+                'course': assessment['course_id'],
+                'type': assessment['type'],
+                'due_date': assessment['due_date'],
+                'max_score': assessment['max_score'],
+                'scored': assessment['scored'],
+            }
+            for assessment in upcoming
+        ],
+        'notifications': {
+            'unread': unread.count(),
+            'latest': list(unread.order_by('-timestamp').values('id', 'content', 'link', 'timestamp')[:RECENT_NOTIFICATIONS]),
+        },
+        'forum_activity': [
+            {
+                'post': post['pk'],
+                'course': post['course_id'],
+                'author': post['creator__username'],
+                'excerpt': post['post_content'][:140],
+                'replies': post['summary__reply_count'] or 0,
+                'last_activity': post['last_activity'],
+            }
+            for post in posts
+        ],
+    }
+
+
+def student_snapshot(user):
+    """
+    The dashboard snapshot of ``user``'s student profile, cached per user.
+
+    Returns None for users without one. Every lookup counts as a hit or a
+    miss; see cache_stats().
+    """
+    key = _cache_key(user.pk)
+    snapshot = cache.get(key)
+    if snapshot is not None:
+        _count(HITS_KEY)
+        return snapshot
+    _count(MISSES_KEY)
+    student = Student.objects.filter(user=user).first()
+    if student is None:
+        return None
+    snapshot = build_snapshot(student)
+    cache.set(key, snapshot, SNAPSHOT_TIMEOUT)
+    return snapshot
+
+
+def cache_stats():
+    hits, misses = cache.get(HITS_KEY, 0), cache.get(MISSES_KEY, 0)
+    lookups = hits + misses
+    return {'hits': hits, 'misses': misses, 'hit_ratio': round(hits / lookups, 4) if lookups else None}
+
+
+def invalidate_student_dashboards(user_ids=(), student_ids=()):
+    """Drop the snapshots of the given users and students once the transaction commits."""
+    user_ids, student_ids = set(user_ids), set(student_ids)
+
+    def invalidate():
+        if student_ids:
+            user_ids.update(Student.objects.filter(pk__in=student_ids).values_list('user_id', flat=True))
+        cache.delete_many([_cache_key(user_id) for user_id in user_ids])
+    if user_ids or student_ids:
+        transaction.on_commit(invalidate)
+
+
+@receiver([post_save, post_delete], sender=Enrollment)
+@receiver([post_save, post_delete], sender=Payment)
+@receiver([post_save, post_delete], sender=Progress)
+@receiver([post_save, post_delete], sender=StudentAssessment)
+def invalidate_on_student_data_change(sender, instance, **kwargs):
+    invalidate_student_dashboards(student_ids=[instance.student_id])
+
+
+@receiver([post_save, post_delete], sender=Student)
+def invalidate_on_student_change(sender, instance, **kwargs):
+    invalidate_student_dashboards(user_ids=[instance.user_id])
+
+
+# Only saves: the snapshot shows unread notifications, and the ones that get
+# deleted (archived by core.retention) are read. A post_delete receiver would
+# also stop Django from fast-deleting the retention batches.
+@receiver(post_save, sender=Notification)
+def invalidate_on_notification_change(sender, instance, **kwargs):
+    invalidate_student_dashboards(user_ids=[instance.recipient_id])
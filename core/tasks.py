@@ -0,0 +1,227 @@
+from datetime import timedelta
+from decimal import Decimal
+
+from celery import shared_task
+from django.conf import settings
+from django.core.mail import send_mail
+from django.db import transaction
+from django.db.models import F, Q
+from django.utils import timezone
+
+from .broadcasts import create_notifications, deliver_batch, stalled_broadcasts, undelivered_batches
+from .models import Broadcast, PaymentNotification, Student, Teacher
+from .retention import archive_notifications
+from .sandbox import execute_submission
+from .sms import get_sms_backend
+from .teacher_assignment import assign_pending_enrollments
+from .teacher_dashboard import affected_teachers, refresh_rollups
+
+MAX_ATTEMPTS = 5
+# Seconds after which a notification claimed by a worker that never reported back may be sent again.
+CLAIM_TIMEOUT = 10 * 60
+
+
+def retry_countdown(attempt):
+    """Exponential backoff in seconds: 30s, 60s, 120s, ... capped at 30 minutes."""
+    return min(30 * 2 ** attempt, 1800)
+
+
+@shared_task
+def send_payment_notifications(idempotency_key, student_id, amount):
+    """
+    Queue the email and SMS notifications for one payment.
+
+    Rows are keyed on (idempotency_key, channel, recipient), so running this
+    task twice for the same payment never sends anything twice.
+    """
+    amount = Decimal(amount)
+    student = Student.objects.select_related('user').get(pk=student_id)
+    teachers = Teacher.objects.filter(enrollment__student=student).select_related('user').distinct()
+
+    student_message = (
+        f"Dear {student.full_name}, we have received your payment of KES {amount}. "
+        f"Your remaining balance is KES {student.remaining_fee}."
+    )
+    teacher_message = f"{student.full_name} has paid KES {amount} towards their fees."
+
+    outgoing = [
+        ('email', student.user.email, student_message),
+        ('sms', student.mpesa_phone_number, student_message),
+    ]
+    for teacher in teachers:
+        outgoing.append(('email', teacher.user.email, teacher_message))
+        outgoing.append(('sms', teacher.mpesa_number, teacher_message))
+
+    email_ids = []
+    for channel, recipient, body in outgoing:
+        if not recipient:
+            continue
+        notification, created = PaymentNotification.objects.get_or_create(
+            idempotency_key=idempotency_key,
+            channel=channel,
+            recipient=recipient,
+            defaults={'subject': 'Payment received', 'body': body},
+        )
+        if channel == 'email' and notification.status == 'pending':
+            email_ids.append(notification.pk)
+
+    for notification_id in email_ids:
+        send_notification_email.delay(notification_id)
+    flush_sms_queue.delay()
+
+
+def claimable(now):
+    """Rows that may be claimed: pending ones, and claims left behind by a worker that died mid-send."""
+    return Q(status='pending') | Q(status='sending', claimed_at__lt=now - timedelta(seconds=CLAIM_TIMEOUT))
+
+
+def record_result(notification_id, attempts, error, now):
+    """Mark one claimed notification sent, or put it back (failed after MAX_ATTEMPTS) with the error."""
+    if error is None:
+        changes = {'status': 'sent', 'sent_at': now}
+    else:
+        changes = {'status': 'failed' if attempts >= MAX_ATTEMPTS else 'pending', 'last_error': error}
+    PaymentNotification.objects.filter(pk=notification_id, status='sending').update(**changes)
+    return changes['status']
+
+
+@shared_task(bind=True, max_retries=MAX_ATTEMPTS - 1, acks_late=True)
+def send_notification_email(self, notification_id):
+    """
+    Send one queued email, retrying with exponential backoff on failure.
+
+    The row is claimed with a conditional UPDATE that commits on its own, so
+    no lock is held while the mail server is talking; a second delivery of
+    the task finds nothing to claim.
+    """
+    now = timezone.now()
+    claimed = PaymentNotification.objects.filter(claimable(now), pk=notification_id).update(
+        status='sending', claimed_at=now, attempts=F('attempts') + 1,
+    )
+    if not claimed:
+        return
+    notification = PaymentNotification.objects.get(pk=notification_id)
+    try:
+        send_mail(notification.subject, notification.body, None, [notification.recipient])
+    except Exception as exc:
+        status = record_result(notification.pk, notification.attempts, str(exc), timezone.now())
+        if status == 'pending':
+            raise self.retry(exc=exc, countdown=retry_countdown(self.request.retries))
+    else:
+        record_result(notification.pk, notification.attempts, None, timezone.now())
+
+
+def claim_sms_batch(batch_size):
+    """Claim up to ``batch_size`` pending SMS rows in a short transaction and return them."""
+    now = timezone.now()
+    with transaction.atomic():
+        batch = list(
+            PaymentNotification.objects.select_for_update(skip_locked=True)
+            .filter(claimable(now), channel='sms')
+            .order_by('pk')[:batch_size]
+        )
+        PaymentNotification.objects.filter(pk__in=[notification.pk for notification in batch]).update(
+            status='sending', claimed_at=now, attempts=F('attempts') + 1,
+        )
+    for notification in batch:
+        notification.attempts += 1
+    return batch
+
+
+@shared_task(acks_late=True)
+def flush_sms_queue():
+    """
+    Send pending SMS notifications in batches through one SMS backend.
+
+    Each batch is claimed (status ``sending``) and committed before anything
+    is sent, so no row lock is held while the gateway is called and other
+    workers can claim the next batch at the same time. Every message is then
+    marked sent or put back on its own. A worker dying mid-batch leaves its
+    claims to be picked up again after CLAIM_TIMEOUT. Failed messages go back
+    to pending and a delayed flush is scheduled for them.
+    """
+    batch_size = settings.SMS_BATCH_SIZE
+    backend = get_sms_backend()
+    sent = 0
+    retry_attempt = None
+    while True:
+        batch = claim_sms_batch(batch_size)
+        if not batch:
+            break
+        try:
+            results = backend.send_messages([(n.recipient, n.body) for n in batch])
+        except Exception as exc:
+            results = [str(exc)] * len(batch)
+        now = timezone.now()
+        for notification, error in zip(batch, results):
+            status = record_result(notification.pk, notification.attempts, error, now)
+            if status == 'sent':
+                sent += 1
+            elif status == 'pending':
+                retry_attempt = max(retry_attempt or 0, notification.attempts)
+
+        if retry_attempt is not None:
+            # Leave the failures for a later, delayed flush instead of hammering the gateway.
+            flush_sms_queue.apply_async(countdown=retry_countdown(retry_attempt))
+            break
+    return sent
+
+
+@shared_task(acks_late=True)
+def run_broadcast(broadcast_id):
+    """
+    Write a broadcast's notifications chunk by chunk, queueing delivery of each chunk.
+
+    Safe to run again on a broadcast that was interrupted: batches that were
+    written but not delivered are queued first, then the recipients still
+    without a notification are written.
+    """
+    broadcast = Broadcast.objects.get(pk=broadcast_id)
+    if broadcast.status == 'done':
+        return
+    for batch_id in undelivered_batches(broadcast_id).values_list('pk', flat=True):
+        deliver_broadcast_batch.delay(batch_id)
+    for batch in create_notifications(broadcast):
+        deliver_broadcast_batch.delay(batch.pk)
+
+
+@shared_task(acks_late=True)
+def deliver_broadcast_batch(batch_id):
+    deliver_batch(batch_id)
+
+
+@shared_task
+def resume_stalled_broadcasts():
+    """Run again the broadcasts whose worker died, or whose queued deliveries were lost."""
+    now = timezone.now()
+    stalled = list(stalled_broadcasts(now).values_list('pk', flat=True))
+    # Restart the clock so the next beat does not queue them again while they wait.
+    Broadcast.objects.filter(pk__in=stalled).update(last_progress_at=now)
+    for broadcast_id in stalled:
+        run_broadcast.delay(broadcast_id)
+    return len(stalled)
+
+
+@shared_task
+def archive_old_notifications():
+    return archive_notifications()
+
+
+@shared_task
+def assign_pending_teachers():
+    """Give teachers to enrollments saved while no teacher at their level had room."""
+    return assign_pending_enrollments()
+
+
+@shared_task
+def refresh_teacher_dashboards(teachers=None, users=(), courses=()):
+    """Recompute the dashboards touched by a change, or every dashboard when called without arguments."""
+    if teachers is None:
+        return refresh_rollups()
+    return refresh_rollups(affected_teachers(teachers, users, courses))
+
+
+@shared_task(acks_late=True)
+def run_code_submission(code_editor_id):
+    """Run a CodeEditor submission in this worker's sandbox pool and save its output."""
+    return execute_submission(code_editor_id)['status']
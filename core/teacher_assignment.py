@@ -0,0 +1,112 @@
+import heapq
+from collections import defaultdict
+
+from django.db import transaction
+from django.db.models import Count
+
+from .models import Enrollment, Teacher
+from .student_dashboard import invalidate_student_dashboards
+from .teacher_dashboard import mark_stale
+
+MAX_ENROLLMENTS_PER_TEACHER = 10
+
+
+def eligible_teachers(teaching_level):
+    """Teachers at the given level that still have room, least loaded first."""
+    return (
+        Teacher.objects.filter(teaching_level=teaching_level)
+        .annotate(load=Count('enrollment'))
+        .filter(load__lt=MAX_ENROLLMENTS_PER_TEACHER)
+        .order_by('load', 'pk')
+    )
+
+
+def assign_teacher(teaching_level):
+    """
+    Pick the least loaded teacher for ``teaching_level`` and lock their row.
+
+    Must run inside the transaction that inserts the enrollment, so the row
+    lock is held until the new enrollment is committed and concurrent callers
+    cannot push the same teacher past the cap.
+    """
+    candidates = list(eligible_teachers(teaching_level).values_list('pk', flat=True))
+    for teacher_id in candidates:
+        teacher = Teacher.objects.select_for_update().get(pk=teacher_id)
+        # Re-count under the lock: another request may have filled the slot
+        # between the annotated query and the lock.
+        if Enrollment.objects.filter(teacher_id=teacher_id).count() < MAX_ENROLLMENTS_PER_TEACHER:
+            return teacher
+    return None
+
+
+def bulk_assign_teachers(enrollments):
+    """
+    Assign teachers to many enrollments at once, keeping capacity in memory.
+
+    Sets ``teacher`` on each enrollment without saving it and returns the
+    enrollments no teacher could be found for. Eligible teacher rows are
+    locked, so call this inside a transaction and write the enrollments
+    before it commits.
+    """
+    by_level = defaultdict(list)
+    for enrollment in enrollments:
+        by_level[enrollment.student.education_level].append(enrollment)
+
+    unassigned = []
+    for level, pending in by_level.items():
+        teacher_ids = list(
+            Teacher.objects.select_for_update()
+            .filter(teaching_level=level)
+            .values_list('pk', flat=True)
+        )
+        loads = dict(
+            Enrollment.objects.filter(teacher_id__in=teacher_ids)
+            .values_list('teacher_id')
+            .annotate(load=Count('pk'))
+            .order_by()
+        )
+        heap = [
+            (loads.get(teacher_id, 0), teacher_id)
+            for teacher_id in teacher_ids
+            if loads.get(teacher_id, 0) < MAX_ENROLLMENTS_PER_TEACHER
+        ]
+        heapq.heapify(heap)
+
+        for enrollment in pending:
+            if not heap:
+                unassigned.append(enrollment)
+                continue
+            load, teacher_id = heapq.heappop(heap)
+            enrollment.teacher_id = teacher_id
+            if load + 1 < MAX_ENROLLMENTS_PER_TEACHER:
+                heapq.heappush(heap, (load + 1, teacher_id))
+    return unassigned
+
+
+def assign_pending_enrollments(chunk_size=1000):
+    """
+    Give a teacher to every saved enrollment that does not have one yet, e.g.
+    once teachers are added at a level that had none with room. Run
+    periodically by the ``assign_pending_teachers`` task and on demand by
+    the ``assign_pending_enrollments`` command. Returns how many were assigned.
+    """
+    assigned = 0
+    last_pk = 0
+    while True:
+        with transaction.atomic():
+            chunk = list(
+                Enrollment.objects.filter(teacher__isnull=True, pk__gt=last_pk)
+                .select_related('student')
+                .order_by('pk')[:chunk_size]
+            )
+            if not chunk:
+                break
+            last_pk = chunk[-1].pk
+            bulk_assign_teachers(chunk)
+            updated = [e for e in chunk if e.teacher_id is not None]
+            Enrollment.objects.bulk_update(updated, ['teacher'])
+            # bulk_update sends no signals.
+            mark_stale(teachers={enrollment.teacher_id for enrollment in updated})
+            invalidate_student_dashboards(student_ids={enrollment.student_id for enrollment in updated})
+            assigned += len(updated)
+    return assigned
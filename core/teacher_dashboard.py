@@ -0,0 +1,168 @@
+from collections import defaultdict
+
+from django.db import connection, transaction
+from django.db.models import Count, ExpressionWrapper, F, FloatField, Q, Sum
+from django.db.models.signals import post_delete, post_save
+from django.dispatch import receiver
+from django.utils import timezone
+
+from .inbox import unread_count
+from .models import (
+    Assessment, Assignment, Classroom, ClassStudent, Enrollment, StudentAssessment, Teacher, TeacherDashboardRollup,
+)
+
+ROLLUP_BATCH_SIZE = 500
+ROLLUP_FIELDS = [
+    'classroom_count', 'student_count', 'enrollment_count', 'pending_submissions', 'average_score', 'classrooms',
+    'course_scores', 'refreshed_at',
+]
+
+
+def _compute(teacher_ids):
+    """Rollups for a batch of teachers from five grouped queries, whatever the roster sizes."""
+    now = timezone.now()
+    rollups = {teacher_id: TeacherDashboardRollup(teacher_id=teacher_id, refreshed_at=now) for teacher_id in teacher_ids}
+
+    courses = defaultdict(set)
+    classrooms = (
+        Classroom.objects.filter(teacher_id__in=teacher_ids).annotate(roster=Count('classstudent'))
+        .order_by('start_date', 'pk').values('pk', 'teacher_id', 'name', 'course_id', 'start_date', 'end_date', 'roster')
+    )
+    for classroom in classrooms:
+        rollup = rollups[classroom['teacher_id']]
+        rollup.classrooms.append({
+            'id': classroom['pk'],
+            'name': classroom['name'],
+            'course': classroom['course_id'],
+            'start_date': classroom['start_date'].isoformat(),
+            'end_date': classroom['end_date'].isoformat(),
+            'students': classroom['roster'],
+        })
+        rollup.classroom_count += 1
+        courses[classroom['teacher_id']].add(classroom['course_id'])
+
+    counts = [
+        ('student_count', ClassStudent.objects.filter(class_obj__teacher_id__in=teacher_ids)
+         .values_list('class_obj__teacher_id').annotate(n=Count('student', distinct=True))),
+        ('enrollment_count', Enrollment.objects.filter(teacher_id__in=teacher_ids)
+         .values_list('teacher_id').annotate(n=Count('pk'))),
+        ('pending_submissions', Assignment.objects.filter(
+            teacher__teacher__in=teacher_ids, submission_date__isnull=False,
+        ).filter(Q(feedback__isnull=True) | Q(feedback='')).values_list('teacher__teacher').annotate(n=Count('pk'))),
+    ]
+    for field, rows in counts:
+        for teacher_id, n in rows.order_by():
+            setattr(rollups[teacher_id], field, n)
+
+    percentage = ExpressionWrapper(F('score') * 100.0 / F('assessment__max_score'), output_field=FloatField())
+    scores = {
+        course_id: (n, total)
+        for course_id, n, total in StudentAssessment.objects.filter(
+            assessment__course_id__in={course for taught in courses.values() for course in taught},
+            assessment__max_score__gt=0,
+        ).order_by().values_list('assessment__course_id').annotate(n=Count('pk'), total=Sum(percentage))
+    }
+    for teacher_id, taught in courses.items():
+        rollup = rollups[teacher_id]
+        graded = total = 0
+        for course_id in sorted(taught):
+            n, course_total = scores.get(course_id, (0, 0))
+            graded += n
+            total += course_total
+            rollup.course_scores.append({
+                'course': course_id, 'graded': n, 'average': round(course_total / n, 2) if n else None,
+            })
+        rollup.average_score = round(total / graded, 2) if graded else None
+    return list(rollups.values())
+
+
+def refresh_rollups(teacher_ids=None, batch_size=ROLLUP_BATCH_SIZE):
+    """
+    Recompute the dashboard rollups of ``teacher_ids`` (all teachers when
+    None) in batches, upserting the rows. Returns the number refreshed.
+    """
+    if teacher_ids is None:
+        teacher_ids = Teacher.objects.order_by('pk').values_list('pk', flat=True)
+    teacher_ids = list(teacher_ids)
+    upsert = {'update_conflicts': True, 'update_fields': ROLLUP_FIELDS}
+    if connection.features.supports_update_conflicts_with_target:
+        upsert['unique_fields'] = ['teacher']
+    for start in range(0, len(teacher_ids), batch_size):
+        batch = teacher_ids[start:start + batch_size]
+        with transaction.atomic():
+            TeacherDashboardRollup.objects.bulk_create(_compute(batch), **upsert)
+    return len(teacher_ids)
+
+
+def affected_teachers(teachers=(), users=(), courses=()):
+    """Ids of the teachers behind ``teachers``, teacher ``users`` and teachers with a classroom in ``courses``."""
+    affected = set(teachers)
+    if users:
+        affected.update(Teacher.objects.filter(user_id__in=users).values_list('pk', flat=True))
+    if courses:
+        affected.update(Classroom.objects.filter(course_id__in=courses).values_list('teacher_id', flat=True))
+    return affected
+
+
+def dashboard(teacher_id):
+    """
+    A teacher's rollup as a dict; built on the spot only if it has never been
+    computed. The unread count comes from the teacher's inbox counter, which
+    is always current, so messages never queue a rollup refresh.
+    """
+    rollups = TeacherDashboardRollup.objects.annotate(user_id=F('teacher__user_id'))
+    rollup = rollups.filter(teacher_id=teacher_id).first()
+    if rollup is None:
+        refresh_rollups([teacher_id])
+        rollup = rollups.get(teacher_id=teacher_id)
+    return {
+        'teacher': teacher_id, **{field: getattr(rollup, field) for field in ROLLUP_FIELDS},
+        'unread_messages': unread_count(rollup.user_id),
+    }
+
+
+def mark_stale(teachers=(), users=(), courses=()):
+    """
+    Refresh the affected rollups in the background once the transaction commits.
+
+    The write that made them stale has already committed by then, so a broker
+    outage is logged rather than raised; the periodic refresh catches up.
+    """
+    from .tasks import refresh_teacher_dashboards
+
+    teachers, users, courses = list(teachers), list(users), list(courses)
+    if teachers or users or courses:
+        transaction.on_commit(lambda: refresh_teacher_dashboards.delay(teachers, users, courses), robust=True)
+
+
+@receiver(post_save, sender=Teacher)
+def create_rollup(sender, instance, created, raw=False, **kwargs):
+    if created and not raw:
+        TeacherDashboardRollup.objects.get_or_create(teacher=instance, defaults={'refreshed_at': timezone.now()})
+
+
+@receiver([post_save, post_delete], sender=Classroom)
+@receiver([post_save, post_delete], sender=ClassStudent)
+@receiver([post_save, post_delete], sender=Enrollment)
+def refresh_on_roster_change(sender, instance, raw=False, **kwargs):
+    if not raw and instance.teacher_id:
+        mark_stale(teachers=[instance.teacher_id])
+
+
+@receiver([post_save, post_delete], sender=Assignment)
+def refresh_on_assignment_change(sender, instance, raw=False, **kwargs):
+    if not raw:
+        mark_stale(users=[instance.teacher_id])
+
+
+@receiver([post_save, post_delete], sender=Assessment)
+def refresh_on_assessment_change(sender, instance, raw=False, **kwargs):
+    if not raw:
+        mark_stale(courses=[instance.course_id])
+
+
+@receiver([post_save, post_delete], sender=StudentAssessment)
+def refresh_on_score_change(sender, instance, raw=False, **kwargs):
+    course_id = Assessment.objects.filter(pk=instance.assessment_id).values_list('course_id', flat=True).first()
+    if not raw and course_id is not None:
+        mark_stale(courses=[course_id])
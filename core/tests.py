@@ -1,3 +1,1454 @@
-from django.test import TestCase
+import csv
+import io
+import os
+import shutil
+import subprocess
+import sys
+import threading
+from collections import Counter
+from datetime import date, timedelta
+from decimal import Decimal
+from importlib import import_module
+from unittest import mock, skipUnless
+
+from channels.db import database_sync_to_async
+from channels.exceptions import InvalidChannelLayerError
+from channels.routing import URLRouter
+from channels.testing import WebsocketCommunicator
+from django.apps import apps
+from django.contrib.auth import get_user_model
+from django.core import mail
+from django.core.cache import cache
+from django.core.exceptions import ValidationError
+from django.core.files.uploadedfile import SimpleUploadedFile
+from django.core.management import CommandError, call_command
+from django.db import DatabaseError, connection, connections, transaction
+from django.db.migrations.executor import MigrationExecutor
+from django.db.models import Case, When
+from django.db.models.deletion import Collector
+from django.test import SimpleTestCase, TestCase, TransactionTestCase, override_settings
+from django.test.utils import CaptureQueriesContext
+from django.urls import reverse
+from django.utils import timezone
+from rest_framework.test import APIClient
+
+from edulearn.celery import app as celery_app
+
+from . import sms
+from .broadcasts import STALL_TIMEOUT, create_notifications, stalled_broadcasts, undelivered_batches
+from .catalog import facet_counts, filter_courses
+from .catalog_index import CatalogIndex, catalog_index
+from .fees import get_fee_schedule, get_fee_schedules
+from .gradebook import build_report, build_state, gradebook_report
+from .ids import IdAllocator, allocator, assign_ids
+from .inbox import mark_conversation_read, unread_count
+from .ledger import reconcile_balances, record_payment
+from .models import (
+    Assessment, Assignment, Broadcast, Classroom, ClassStudent, Course, DiscussionForumPost, Enrollment, ForumThreadSummary,
+    IdSequence, Message, ModuleCompletion, Notification, NotificationArchive, Payment, PaymentNotification, Progress,
+    Qualification, Reply, SearchDocument, Student, StudentAssessment, Subject, Teacher,
+)
+from .payroll import run_payroll
+from .progress import record_module_completion
+from .retention import archive_notifications
+from .routing import websocket_urlpatterns
+from .sandbox import WorkerPool, runner_limits
+from .sandbox_worker import CLONE_NEWUSER, NAMESPACE_ID
+from .scheduling import IntervalIndex, apply_timetable, propose_timetable
+from .search import search
+from .student_dashboard import cache_stats as dashboard_cache_stats, student_snapshot
+from .tasks import (
+    CLAIM_TIMEOUT, deliver_broadcast_batch, flush_sms_queue, refresh_teacher_dashboards, resume_stalled_broadcasts,
+    run_broadcast, send_notification_email,
+)
+from .teacher_assignment import MAX_ENROLLMENTS_PER_TEACHER
+from .teacher_dashboard import refresh_rollups
+
+User = get_user_model()
+
+
+class CoreDataMixin:
+    """Minimal valid teachers, courses and students for tests that need more than one."""
+
+    def make_user(self, name, **extra):
+        return User.objects.create_user(username=name, password='secret', **extra)
+
+    def make_teacher(self, name, level='Primary', **extra):
+        return Teacher.objects.create(
+            user=self.make_user(name), full_name=name.title(), profile_picture='profile_pictures/teacher.jpg',
+            social_link='https://example.com', teaching_level=level, experience_years=3,
+            certifications='Certifications/teacher.pdf', payment_rate=Decimal('50000.00'),
+            payment_method='mpesa', loan_deductions=Decimal('0.00'), **extra,
+        )
+
+    def make_course(self, title, teacher=None, level='Primary', **extra):
+        return Course.objects.create(
+            title=title, description='Description', teacher=teacher or self.make_user(f'owner of {title}'),
+            level=level, start_date=date(2025, 1, 6), end_date=date(2025, 4, 4), price=Decimal('10000.00'),
+            requirements='None', **extra,
+        )
+
+    def make_student(self, name, level='Primary', **extra):
+        extra.setdefault('total_fees', Decimal('1000.00'))
+        return Student.objects.create(
+            user=self.make_user(name), full_name=name.title(), profile_picture='profile_pictures/student.jpg',
+            education_level=level, **extra,
+        )
+
+
+class ListQueryCountTests(TestCase):
+    """List endpoints must issue the same number of queries for 1 row or many."""
+
+    def setUp(self):
+        self.client = APIClient()
+        # Staff see every row; scoping is covered by APIScopeTests.
+        self.client.force_authenticate(User.objects.create_user(username='viewer', password='secret', is_staff=True))
+        self.subject = Subject.objects.create(name='Mathematics', category='sciences', description='Numbers')
+        self.qualification = Qualification.objects.create(
+            name='Diploma', institution='Nairobi Polytechnic', date_awarded=date(2020, 1, 1)
+        )
+        self.counter = 0
+
+    def create_classroom(self):
+        self.counter += 1
+        user = User.objects.create_user(username=f'teacher{self.counter}', password='secret')
+        teacher = Teacher.objects.create(
+            user=user,
+            full_name=f'Teacher {self.counter}',
+            profile_picture='profile_pictures/teacher.jpg',
+            social_link='https://example.com',
+            teaching_level='Primary',
+            experience_years=3,
+            certifications='Certifications/teacher.pdf',
+            payment_rate=Decimal('50000.00'),
+            payment_method='mpesa',
+            loan_deductions=Decimal('0.00'),
+        )
+        teacher.expertise_area.add(self.subject)
+        teacher.qualifications.add(self.qualification)
+        course = Course.objects.create(
+            title=f'Course {self.counter}',
+            description='Description',
+            teacher=user,
+            level='Primary',
+            start_date=date(2025, 1, 6),
+            end_date=date(2025, 4, 4),
+            price=Decimal('10000.00'),
+            requirements='None',
+        )
+        course.subjects.add(self.subject)
+        post = DiscussionForumPost.objects.create(course=course, creator=user, post_content='Welcome')
+        Reply.objects.create(post=post, author=user, content='Thanks')
+        return Classroom.objects.create(
+            name=f'Class {self.counter}',
+            course=course,
+            teacher=teacher,
+            start_date=date(2025, 1, 6),
+            end_date=date(2025, 4, 4),
+        )
+
+    def count_queries(self, url_name):
+        with CaptureQueriesContext(connection) as context:
+            response = self.client.get(reverse(url_name))
+        self.assertEqual(response.status_code, 200)
+        return len(context.captured_queries)
+
+    def assertConstantQueries(self, url_name):
+        self.create_classroom()
+        few = self.count_queries(url_name)
+        for _ in range(5):
+            self.create_classroom()
+        self.assertEqual(self.count_queries(url_name), few)
+
+    def test_classroom_list(self):
+        self.assertConstantQueries('classroom-list')
+
+    def test_teacher_list(self):
+        self.assertConstantQueries('teacher-list')
+
+    def test_course_list(self):
+        self.assertConstantQueries('course-list')
+
+    def test_forum_post_list(self):
+        self.assertConstantQueries('discussionforumpost-list')
+
+    def test_reply_list(self):
+        self.assertConstantQueries('reply-list')
+
+
+class TeacherAssignmentTests(CoreDataMixin, TestCase):
+    """New enrollments go to the least loaded teacher at the student's level with room."""
+
+    def setUp(self):
+        self.course = self.make_course('Algebra')
+
+    def enroll(self, name, level='Primary'):
+        return Enrollment.objects.create(student=self.make_student(name, level=level), course=self.course)
+
+    def test_least_loaded_teacher_is_chosen(self):
+        busy = self.make_teacher('busy')
+        idle = self.make_teacher('idle')
+        self.make_teacher('secondary', level='Secondary')
+        Enrollment.objects.create(student=self.make_student('first'), course=self.course, teacher=busy)
+        self.assertEqual(self.enroll('second').teacher, idle)
+        self.assertEqual(self.enroll('third').teacher, busy)
+
+    def test_full_teacher_is_skipped_when_the_lock_recount_disagrees(self):
+        # Another request filled the first candidate between the annotated query and the row lock.
+        full = self.make_teacher('full')
+        free = self.make_teacher('free')
+        Enrollment.objects.bulk_create([
+            Enrollment(student=self.make_student(f'student {number}'), course=self.course, teacher=full)
+            for number in range(MAX_ENROLLMENTS_PER_TEACHER)
+        ])
+        stale = Teacher.objects.filter(pk__in=[full.pk, free.pk]).order_by(Case(When(pk=full.pk, then=0), default=1))
+        with mock.patch('core.teacher_assignment.eligible_teachers', return_value=stale):
+            self.assertEqual(self.enroll('late').teacher, free)
+
+    def test_pending_enrollments_are_assigned_by_the_command(self):
+        waiting = [self.enroll(f'student {number}') for number in range(3)]
+        self.assertEqual([enrollment.teacher for enrollment in waiting], [None] * 3)
+        first, second = self.make_teacher('first'), self.make_teacher('second')
+        out = io.StringIO()
+        call_command('assign_pending_enrollments', chunk_size=2, stdout=out)
+        self.assertIn('Assigned teachers to 3 enrollments', out.getvalue())
+        loads = Counter(Enrollment.objects.values_list('teacher_id', flat=True))
+        self.assertEqual(sorted(loads.values()), [1, 2])
+        self.assertEqual(set(loads), {first.pk, second.pk})
+
+
+@override_settings(CACHES={'default': {'BACKEND': 'django.core.cache.backends.locmem.LocMemCache', 'LOCATION': 'fees'}})
+class FeeScheduleTests(CoreDataMixin, TestCase):
+    """Fee schedules are computed in SQL, rounded to the cent and cached until the student's data changes."""
+
+    def setUp(self):
+        cache.clear()
+        self.student = self.make_student('student', total_fees=Decimal('999.99'))
+        self.courses = [self.make_course('Algebra'), self.make_course('Biology')]
+
+    def enroll(self, course):
+        with self.captureOnCommitCallbacks(execute=True):
+            Enrollment.objects.create(student=self.student, course=course)
+
+    def test_schedule_without_and_with_the_multi_course_discount(self):
+        self.enroll(self.courses[0])
+        schedule = get_fee_schedule(self.student)
+        self.assertEqual(
+            (schedule['discounted_fee'], schedule['initial_payment'], schedule['final_payment']),
+            (Decimal('999.99'), Decimal('599.99'), Decimal('400.00')),
+        )
+        self.enroll(self.courses[1])
+        schedule = get_fee_schedule(self.student)
+        self.assertEqual(schedule['enrolled_courses'], 2)
+        self.assertEqual(
+            (schedule['discounted_fee'], schedule['initial_payment'], schedule['final_payment']),
+            (Decimal('849.99'), Decimal('509.99'), Decimal('340.00')),
+        )
+        self.assertEqual(self.student.apply_discount(), Decimal('999.99') * Student.MULTI_COURSE_DISCOUNT_RATE)
+
+    def test_schedule_is_cached_until_the_student_changes(self):
+        get_fee_schedule(self.student)
+        with self.assertNumQueries(0):
+            get_fee_schedule(self.student.pk)
+        with self.captureOnCommitCallbacks(execute=True):
+            Student.objects.get(pk=self.student.pk).save()
+        with self.assertNumQueries(1):
+            get_fee_schedule(self.student)
+
+    def test_many_schedules_come_from_one_query(self):
+        self.make_student('other')
+        with self.assertNumQueries(1):
+            schedules = get_fee_schedules(Student.objects.order_by('pk'))
+        self.assertEqual([schedule['total_fees'] for schedule in schedules], [Decimal('999.99'), Decimal('1000.00')])
+        with self.assertNumQueries(0):
+            get_fee_schedule(self.student)
+
+
+@override_settings(CACHES={'default': {'BACKEND': 'django.core.cache.backends.locmem.LocMemCache', 'LOCATION': 'bulk-enroll'}})
+class BulkEnrollmentTests(CoreDataMixin, TestCase):
+    """Bulk enrollment reports bad rows, spreads teachers and drops the caches it makes stale."""
+
+    def setUp(self):
+        cache.clear()
+        self.client = APIClient()
+        self.client.force_authenticate(self.make_user('admin', is_staff=True))
+        self.course = self.make_course('Algebra')
+        self.teachers = [self.make_teacher('first'), self.make_teacher('second')]
+        self.students = [self.make_student('ann'), self.make_student('ben')]
+
+    def post(self, rows):
+        with self.captureOnCommitCallbacks(execute=True):
+            return self.client.post(reverse('bulk-enrollment'), rows, format='json')
+
+    def test_valid_rows_are_created_and_bad_rows_reported(self):
+        Enrollment.objects.create(student=self.students[1], course=self.course)
+        newcomer = self.make_student('cat')
+        response = self.post([
+            {'student': self.students[0].pk, 'course': 'Algebra'},
+            {'student': self.students[1].pk, 'course': 'Algebra'},
+            {'student': 'STU-missing', 'course': 'Algebra'},
+            {'student': newcomer.pk, 'course': ''},
+            {'student': newcomer.pk, 'course': 'Algebra'},
+        ])
+        self.assertEqual(response.status_code, 201)
+        self.assertEqual(response.data['created'], 2)
+        self.assertEqual([error['row'] for error in response.data['errors']], [2, 3, 4])
+        loads = Counter(Enrollment.objects.values_list('teacher_id', flat=True))
+        self.assertEqual(sorted(loads.values()), [1, 2])
+
+    def test_fee_schedules_and_dashboards_are_invalidated(self):
+        student = self.students[0]
+        self.assertEqual(get_fee_schedule(student)['enrolled_courses'], 0)
+        self.assertEqual(student_snapshot(student.user)['enrolled_courses'], [])
+        self.post([{'student': student.pk, 'course': 'Algebra'}])
+        self.assertEqual(get_fee_schedule(student)['enrolled_courses'], 1)
+        self.assertEqual([course['course'] for course in student_snapshot(student.user)['enrolled_courses']], ['Algebra'])
+
+    def test_only_staff_may_enroll_in_bulk(self):
+        self.client.force_authenticate(self.students[0].user)
+        self.assertEqual(self.post([{'student': self.students[0].pk, 'course': 'Algebra'}]).status_code, 403)
+
+
+class APIScopeTests(CoreDataMixin, TestCase):
+    """Non-staff users only read their own rows, or their students'."""
+
+    def setUp(self):
+        self.teacher = self.make_teacher('teacher')
+        self.course = self.make_course('Algebra', teacher=self.teacher.user)
+        self.student = self.make_student('student')
+        self.other = self.make_student('other student')
+        Enrollment.objects.create(student=self.student, course=self.course, teacher=self.teacher)
+        for student in (self.student, self.other):
+            Payment.objects.create(student=student, amount_paid=Decimal('100.00'), total_fee=Decimal('1000.00'))
+        self.client = APIClient()
+
+    def ids(self, user, url_name, key='id'):
+        self.client.force_authenticate(user)
+        response = self.client.get(reverse(url_name))
+        self.assertEqual(response.status_code, 200)
+        return {row[key] for row in response.data['results']}
+
+    def test_students_see_only_their_own_rows(self):
+        user = self.student.user
+        self.assertEqual(self.ids(user, 'payment-list'), set(self.student.payments.values_list('pk', flat=True)))
+        self.assertEqual(self.ids(user, 'student-list'), {self.student.pk})
+        self.assertEqual(self.ids(user, 'teacher-list'), set())
+        self.client.force_authenticate(user)
+        self.assertEqual(self.client.get(reverse('student-detail', args=[self.other.pk])).status_code, 404)
+
+    def test_teachers_see_their_students(self):
+        user = self.teacher.user
+        self.assertEqual(self.ids(user, 'student-list'), {self.student.pk})
+        self.assertEqual(self.ids(user, 'teacher-list'), {self.teacher.pk})
+        self.assertEqual(self.ids(user, 'payment-list'), set())
+
+    def test_signed_up_users_see_only_public_data(self):
+        user = self.make_user('newcomer')
+        self.assertEqual(self.ids(user, 'course-list', key='title'), {self.course.pk})
+        for url_name in ('student-list', 'payment-list', 'enrollment-list', 'teacher-list', 'progress-list'):
+            self.assertEqual(self.ids(user, url_name), set(), url_name)
+
+
+class LedgerTests(CoreDataMixin, TestCase):
+    """Payments are appended to the ledger and balances are rebuilt from it."""
+
+    def setUp(self):
+        self.student = self.make_student('student', total_fees=Decimal('1000.00'))
+
+    def test_float_amounts_are_recorded_to_the_cent(self):
+        payment, created = record_payment(self.student, 0.1, reference='MPESA1')
+        self.assertTrue(created)
+        self.assertEqual(payment.amount_paid, Decimal('0.10'))
+        self.assertEqual(self.student.fees_paid, Decimal('0.10'))
+
+    def test_replayed_reference_is_recorded_once(self):
+        first, _ = record_payment(self.student, '250.00', reference='MPESA1')
+        again, created = record_payment(self.student, '250.00', reference='MPESA1')
+        self.assertEqual((again.pk, created), (first.pk, False))
+        self.assertEqual(self.student.fees_paid, Decimal('250.00'))
+
+    def test_reconcile_keeps_balances_paid_before_the_ledger(self):
+        Student.objects.filter(pk=self.student.pk).update(fees_paid=Decimal('400.00'))
+        record_payment(self.student, '100.00')
+        migration = import_module('core.migrations.0015_opening_balances')
+        migration.record_opening_balances(apps, None)
+        migration.record_opening_balances(apps, None)
+
+        reconcile_balances()
+        self.student.refresh_from_db()
+        self.assertEqual(self.student.fees_paid, Decimal('500.00'))
+        self.assertEqual(self.student.remaining_fee, Decimal('500.00'))
+        self.assertEqual(self.student.payments.filter(reference__startswith='opening-balance:').count(), 1)
+
+    def test_saving_a_stale_instance_keeps_the_ledger_balance(self):
+        stale = Student.objects.get(pk=self.student.pk)
+        record_payment(self.student, '250.00')
+        stale.full_name = 'Renamed'
+        stale.total_fees = Decimal('2000.00')
+        stale.save()
+        self.assertEqual((stale.fees_paid, stale.remaining_fee), (Decimal('250.00'), Decimal('1750.00')))
+        stored = Student.objects.get(pk=self.student.pk)
+        self.assertEqual(
+            (stored.full_name, stored.fees_paid, stored.remaining_fee, stored.fee_status),
+            ('Renamed', Decimal('250.00'), Decimal('1750.00'), False),
+        )
+
+
+class IdAllocatorTests(CoreDataMixin, TestCase):
+    """Ids come from the IdSequence row in blocks, without gaps or repeats across block boundaries."""
+
+    def test_blocks_are_reserved_as_they_run_out(self):
+        allocator = IdAllocator(block_size=3)
+        reserve = lambda prefix, size: allocator._advance(connection, prefix, size)
+        # Take the block path other databases use; the reservation runs on the test's connection.
+        with mock.patch.object(connections['default'], 'vendor', 'postgresql'), \
+                mock.patch.object(allocator, '_reserve', side_effect=reserve) as reserved:
+            ids = [allocator.next_id('TST') for _ in range(4)] + allocator.allocate('TST', 5)
+        self.assertEqual(ids, [f'TST{number:07d}' for number in range(1, 10)])
+        self.assertEqual([call.args for call in reserved.call_args_list], [('TST', 3)] * 3)
+        self.assertEqual(IdSequence.objects.get(prefix='TST').next_value, 10)
+
+    def test_exhausted_sequence_raises(self):
+        IdSequence.objects.create(prefix='TST', next_value=10 ** 7 - 1)
+        self.assertEqual(allocator.next_id('TST'), 'TST9999999')
+        with self.assertRaisesMessage(ValueError, 'exhausted'):
+            allocator.next_id('TST')
+
+    def test_teachers_and_students_get_sequential_ids(self):
+        teacher = self.make_teacher('teacher')
+        students = [self.make_student('ann'), self.make_student('ben')]
+        self.assertEqual(teacher.pk, 'TEA0000001')
+        self.assertEqual([student.pk for student in students], ['STU0000001', 'STU0000002'])
+        unsaved = assign_ids([Student(full_name='Cat'), Student(id='STU123456', full_name='Legacy')])
+        self.assertEqual([student.id for student in unsaved], ['STU0000003', 'STU123456'])
+
+
+class PayrollTests(CoreDataMixin, TestCase):
+    """Payslips round each statutory deduction to the cent, and the teachers' stored figures agree with them."""
+
+    def setUp(self):
+        self.teacher = self.make_teacher('teacher')
+        Teacher.objects.filter(pk=self.teacher.pk).update(payment_rate=Decimal('10.25'), loan_deductions=Decimal('1.00'))
+        self.make_teacher('retired', status=False)
+
+    def test_deductions_are_rounded_half_up_per_line(self):
+        run = run_payroll(date(2025, 3, 1))
+        payslip = run.payslips.get()
+        self.assertEqual(
+            (payslip.paye, payslip.nhif, payslip.nssf, payslip.total_deductions, payslip.net_salary),
+            (Decimal('3.08'), Decimal('0.21'), Decimal('0.62'), Decimal('4.91'), Decimal('5.34')),
+        )
+        self.assertEqual((run.teacher_count, run.total_net), (1, Decimal('5.34')))
+        self.teacher.refresh_from_db()
+        self.assertEqual((self.teacher.tax_deductions, self.teacher.net_salary), (Decimal('4.91'), Decimal('5.34')))
+
+    def test_a_period_runs_once(self):
+        out = io.StringIO()
+        call_command('run_payroll', '2025-03', stdout=out)
+        self.assertIn('1 payslips, net KES 5.34', out.getvalue())
+        with self.assertRaisesMessage(CommandError, 'already been run'):
+            call_command('run_payroll', '2025-03', stdout=out)
+
+
+@override_settings(CACHES={'default': {'BACKEND': 'django.core.cache.backends.locmem.LocMemCache', 'LOCATION': 'statements'}})
+class FeeStatementTests(CoreDataMixin, TestCase):
+    """Fee statements stream as CSV rows or a well-formed multi-page PDF."""
+
+    def setUp(self):
+        cache.clear()
+        self.client = APIClient()
+        self.client.force_authenticate(self.make_user('admin', is_staff=True))
+        self.paying = self.make_student('ann', payment_method='mpesa')
+        self.owing = self.make_student('ben', level='High School')
+        record_payment(self.paying, '250.00', reference='MPESA1')
+        record_payment(self.paying, '750.00', reference='MPESA2')
+
+    def export(self, **params):
+        response = self.client.get(reverse('fee-statements'), params)
+        self.assertEqual(response.status_code, 200)
+        return b''.join(response.streaming_content)
+
+    def test_csv_has_one_row_per_student(self):
+        rows = list(csv.DictReader(io.StringIO(self.export().decode())))
+        self.assertEqual([row['student'] for row in rows], [self.paying.pk, self.owing.pk])
+        self.assertEqual(
+            (rows[0]['fees_paid'], rows[0]['remaining_fee'], rows[0]['fee_status'], rows[0]['payments']),
+            ('1000.00', '0.00', 'Paid', '2'),
+        )
+        self.assertEqual((rows[1]['initial_payment'], rows[1]['fee_status']), ('600.00', 'Outstanding'))
+
+    def test_filters_select_students(self):
+        rows = list(csv.DictReader(io.StringIO(self.export(unpaid='true').decode())))
+        self.assertEqual([row['student'] for row in rows], [self.owing.pk])
+        rows = list(csv.DictReader(io.StringIO(self.export(student=self.paying.pk).decode())))
+        self.assertEqual([row['student'] for row in rows], [self.paying.pk])
+
+    def test_pdf_pages_and_cross_references(self):
+        pdf = self.export(output='pdf')
+        self.assertTrue(pdf.startswith(b'%PDF-1.4') and pdf.endswith(b'%%EOF\n'))
+        self.assertIn(b'/Count 2', pdf)
+        self.assertIn(b'(Student: Ann \\(%s\\)) Tj' % self.paying.pk.encode(), pdf)
+        xref = int(pdf.rsplit(b'startxref\n', 1)[1].split()[0])
+        self.assertTrue(pdf[xref:].startswith(b'xref'))
+        entries = pdf[xref:].split(b'\n')[3:]
+        for number, entry in enumerate(entries[:7], start=1):
+            offset = int(entry.split()[0])
+            self.assertTrue(pdf[offset:].startswith(b'%d 0 obj' % number), number)
+
+    def test_command_needs_a_file_for_pdf(self):
+        with self.assertRaisesMessage(CommandError, "PDF statements need --output."):
+            call_command('export_fee_statements', format='pdf')
+
+
+class NotificationRetentionTests(CoreDataMixin, TestCase):
+    """Old read notifications move to the archive in batches; everything else stays."""
+
+    def setUp(self):
+        self.user = self.make_user('student')
+        self.old = timezone.now() - timedelta(days=120)
+
+    def notify(self, is_read, timestamp):
+        notification = Notification.objects.create(recipient=self.user, content='Hello', is_read=is_read)
+        Notification.objects.filter(pk=notification.pk).update(timestamp=timestamp)
+        return notification.pk
+
+    def test_old_read_notifications_are_archived(self):
+        archived = [self.notify(True, self.old) for _ in range(3)]
+        kept = [self.notify(False, self.old), self.notify(True, timezone.now())]
+        out = io.StringIO()
+        call_command('archive_notifications', days=90, batch_size=2, stdout=out)
+        self.assertIn('Archived 3 notifications', out.getvalue())
+        self.assertEqual(sorted(Notification.objects.values_list('pk', flat=True)), sorted(kept))
+        self.assertEqual(sorted(NotificationArchive.objects.values_list('pk', flat=True)), sorted(archived))
+        self.assertEqual(
+            set(NotificationArchive.objects.values_list('month', flat=True)), {timezone.localdate(self.old).replace(day=1)},
+        )
+        self.assertEqual(archive_notifications(days=90), 0)
+
+    def test_rows_already_in_the_archive_are_not_duplicated(self):
+        pk = self.notify(True, self.old)
+        NotificationArchive.objects.create(
+            id=pk, recipient=self.user, content='Hello', timestamp=self.old, month=self.old.date().replace(day=1),
+        )
+        self.assertEqual(archive_notifications(days=90), 1)
+        self.assertEqual(NotificationArchive.objects.count(), 1)
+        self.assertFalse(Notification.objects.exists())
+
+
+@override_settings(CACHES={'default': {'BACKEND': 'django.core.cache.backends.locmem.LocMemCache', 'LOCATION': 'rollups'}})
+class TeacherDashboardTests(CoreDataMixin, TestCase):
+    """The teacher dashboard is read from a rollup that roster and score changes refresh in the background."""
+
+    def setUp(self):
+        cache.clear()
+        celery_app.conf.update(broker_url='memory://', task_always_eager=True)
+        self.addCleanup(celery_app.conf.update, task_always_eager=False)
+        self.teacher = self.make_teacher('teacher')
+        self.course = self.make_course('Algebra', teacher=self.teacher.user)
+        classroom = Classroom.objects.create(
+            name='Morning', course=self.course, teacher=self.teacher, start_date=date(2025, 1, 6), end_date=date(2025, 4, 4),
+        )
+        self.ann, self.ben = self.make_student('ann'), self.make_student('ben')
+        for student in (self.ann, self.ben):
+            ClassStudent.objects.create(class_obj=classroom, student=student, teacher=self.teacher)
+        Enrollment.objects.create(student=self.ann, course=self.course, teacher=self.teacher)
+        self.quiz = Assessment.objects.create(
+            title='Quiz', course=self.course, description='d', type='quiz', max_score=10, due_date=date(2025, 2, 1),
+        )
+        StudentAssessment.objects.create(student=self.ann, assessment=self.quiz, score=5)
+        Assignment.objects.create(
+            title='Essay', description='d', course=self.course, student=self.ann, teacher=self.teacher.user,
+            submission_text='Done', submission_date=timezone.now(),
+        )
+        refresh_rollups([self.teacher.pk])
+        self.client = APIClient()
+        self.client.force_authenticate(self.teacher.user)
+
+    def get_dashboard(self):
+        response = self.client.get(reverse('teacher-dashboard'))
+        self.assertEqual(response.status_code, 200)
+        return response.data
+
+    def test_dashboard_reads_the_rollup(self):
+        # The teacher, the rollup and the inbox counter (not cached yet).
+        with self.assertNumQueries(3):
+            data = self.get_dashboard()
+        self.assertEqual(
+            (data['classroom_count'], data['student_count'], data['enrollment_count'], data['pending_submissions']),
+            (1, 2, 1, 1),
+        )
+        self.assertEqual(data['classrooms'][0]['students'], 2)
+        self.assertEqual(data['average_score'], 50.0)
+        self.assertEqual(data['course_scores'], [{'course': 'Algebra', 'graded': 1, 'average': 50.0}])
+
+    def test_messages_show_up_without_refreshing_the_rollup(self):
+        with mock.patch.object(refresh_teacher_dashboards, 'delay') as delay, self.captureOnCommitCallbacks(execute=True):
+            Message.objects.create(sender=self.ann.user, receiver=self.teacher.user, content='Hello', course=self.course)
+        delay.assert_not_called()
+        self.assertEqual(self.get_dashboard()['unread_messages'], 1)
+
+    def test_score_changes_refresh_the_rollup(self):
+        with self.captureOnCommitCallbacks(execute=True):
+            StudentAssessment.objects.create(student=self.ben, assessment=self.quiz, score=10)
+        self.assertEqual(self.get_dashboard()['average_score'], 75.0)
+
+    def test_broker_outage_does_not_fail_the_write(self):
+        with mock.patch.object(refresh_teacher_dashboards, 'delay', side_effect=ConnectionError('broker down')), \
+                self.assertLogs('django.test', 'ERROR'), self.captureOnCommitCallbacks(execute=True):
+            StudentAssessment.objects.create(student=self.ben, assessment=self.quiz, score=10)
+        self.assertEqual(self.get_dashboard()['average_score'], 50.0)
+
+
+@override_settings(CACHES={'default': {'BACKEND': 'django.core.cache.backends.locmem.LocMemCache', 'LOCATION': 'dashboards'}})
+class StudentDashboardCacheTests(CoreDataMixin, TestCase):
+    """Snapshots are cached per user and dropped only for the students whose data changed."""
+
+    def setUp(self):
+        cache.clear()
+        self.student = self.make_student('student')
+        self.other = self.make_student('other student')
+
+    def test_lookups_are_counted_as_hits_and_misses(self):
+        student_snapshot(self.student.user)
+        with self.assertNumQueries(0):
+            student_snapshot(self.student.user)
+        self.assertEqual(dashboard_cache_stats(), {'hits': 1, 'misses': 1, 'hit_ratio': 0.5})
+
+    def test_a_payment_invalidates_only_its_students_snapshot(self):
+        student_snapshot(self.student.user)
+        student_snapshot(self.other.user)
+        with self.captureOnCommitCallbacks(execute=True):
+            record_payment(self.student, '100.00')
+
+        self.assertEqual(student_snapshot(self.student.user)['fees']['fees_paid'], Decimal('100.00'))
+        student_snapshot(self.other.user)
+        self.assertEqual(dashboard_cache_stats()['hits'], 1)
+
+    def test_reconciliation_invalidates_the_students_it_updates(self):
+        student_snapshot(self.student.user)
+        # Written around the signals, as a bulk import would.
+        Payment.objects.bulk_create([Payment(
+            student=self.student, amount_paid=Decimal('250.00'), total_fee=self.student.total_fees,
+            payment_method='mpesa',
+        )])
+        with self.captureOnCommitCallbacks(execute=True):
+            reconcile_balances(Student.objects.filter(pk=self.student.pk))
+        self.assertEqual(student_snapshot(self.student.user)['fees']['fees_paid'], Decimal('250.00'))
+
+    def test_archived_notifications_are_fast_deleted(self):
+        self.assertTrue(Collector(using='default').can_fast_delete(Notification.objects.all()))
+
+
+class SchedulingTests(CoreDataMixin, TestCase):
+    """Classrooms are closed date ranges: a teacher or student cannot be in two that share a day."""
+
+    def setUp(self):
+        self.teacher = self.make_teacher('teacher')
+        self.colleague = self.make_teacher('colleague')
+        self.specialist = self.make_teacher('specialist', level='High School')
+        self.course = self.make_course('Algebra')
+
+    def classroom(self, start, end, teacher=None, save=True):
+        classroom = Classroom(
+            name=f'{start}-{end}', course=self.course, teacher=teacher or self.teacher, start_date=start, end_date=end,
+        )
+        if save:
+            classroom.save()
+        return classroom
+
+    def legacy_classrooms(self, *ranges):
+        """Rows written before validation existed, which may overlap each other."""
+        return Classroom.objects.bulk_create([self.classroom(start, end, save=False) for start, end in ranges])
+
+    def test_interval_index_checks_closed_and_nested_intervals(self):
+        index = IntervalIndex([(1, 10, 'long'), (2, 3, 'nested'), (12, 14, 'later')])
+        self.assertEqual(index.conflict(10, 11), 'long')
+        self.assertEqual(index.conflict(5, 6), 'long')
+        self.assertFalse(index.overlaps(11, 11))
+        self.assertEqual(index.conflict(14, 20), 'later')
+        self.assertFalse(IntervalIndex().overlaps(1, 2))
+
+    def test_classrooms_sharing_an_end_date_conflict(self):
+        first = self.classroom(date(2025, 1, 6), date(2025, 1, 31))
+        with self.assertRaises(ValidationError) as raised:
+            self.classroom(date(2025, 1, 31), date(2025, 2, 28))
+        self.assertIn(str(first.pk), str(raised.exception))
+        self.classroom(date(2025, 2, 1), date(2025, 2, 28))
+        self.classroom(date(2025, 1, 31), date(2025, 2, 28), teacher=self.colleague)
+
+    def test_students_cannot_attend_overlapping_classrooms(self):
+        student = self.make_student('student')
+        first = self.classroom(date(2025, 1, 6), date(2025, 3, 31))
+        second = self.classroom(date(2025, 3, 1), date(2025, 4, 30), teacher=self.colleague)
+        ClassStudent.objects.create(class_obj=first, student=student, teacher=self.teacher)
+        with self.assertRaises(ValidationError):
+            ClassStudent.objects.create(class_obj=second, student=student, teacher=self.colleague)
+        self.assertFalse(ClassStudent.objects.filter(class_obj=second).exists())
+
+    def test_timetable_moves_clashing_classrooms_to_free_qualified_teachers(self):
+        first, second, third = self.legacy_classrooms(*[(date(2025, 1, 6), date(2025, 3, 31))] * 3)
+        assignments, unassigned = propose_timetable(date(2025, 1, 1), date(2025, 6, 30))
+        self.assertEqual(
+            [(assignment['classroom'], assignment['proposed_teacher']) for assignment in assignments],
+            [(first.pk, self.teacher.pk), (second.pk, self.colleague.pk)],
+        )
+        self.assertEqual(unassigned, [third.pk])
+
+        self.assertEqual(apply_timetable(assignments), 1)
+        self.assertEqual(Classroom.objects.get(pk=second.pk).teacher_id, self.colleague.pk)
+
+    def test_timetable_plans_around_legacy_overlaps_outside_the_term(self):
+        # The nested row ends first, so only the running maximum of end dates sees the long one.
+        self.legacy_classrooms((date(2024, 9, 1), date(2025, 2, 10)), (date(2024, 10, 1), date(2024, 11, 30)))
+        self.legacy_classrooms((date(2025, 2, 1), date(2025, 3, 31)))
+        assignments, _ = propose_timetable(date(2025, 2, 15), date(2025, 6, 30))
+        self.assertEqual([assignment['proposed_teacher'] for assignment in assignments], [self.colleague.pk])
+
+    def test_stale_timetables_are_not_applied(self):
+        _, second = self.legacy_classrooms(*[(date(2025, 1, 6), date(2025, 3, 31))] * 2)
+        assignments, _ = propose_timetable(date(2025, 1, 1), date(2025, 6, 30))
+        self.classroom(date(2025, 3, 1), date(2025, 3, 15), teacher=self.colleague)
+        with self.assertRaises(ValidationError):
+            apply_timetable(assignments)
+        self.assertEqual(Classroom.objects.get(pk=second.pk).teacher_id, self.teacher.pk)
+
+
+@override_settings(CACHES={'default': {'BACKEND': 'django.core.cache.backends.locmem.LocMemCache', 'LOCATION': 'catalog'}})
+class CatalogFacetTests(CoreDataMixin, TestCase):
+    """Facet counts apply every filter but their own and come from a cached set of combination counts."""
+
+    def setUp(self):
+        cache.clear()
+        sciences = Subject.objects.create(name='Physics', category='sciences', description='Matter')
+        arts = Subject.objects.create(name='Painting', category='arts', description='Colour')
+        rows = [
+            ('Primary', 'active', [sciences]),
+            ('Primary', 'draft', [arts]),
+            ('University', 'active', [sciences, arts]),
+            ('High School', 'inactive', []),
+        ]
+        for number, (level, status, subjects) in enumerate(rows):
+            self.make_course(f'Course {number}', level=level, syllabus_status=status).subjects.set(subjects)
+
+    def counts(self, facets, field):
+        return {option['value']: option['count'] for option in facets[field] if option['count']}
+
+    def test_counts_leave_out_their_own_facet(self):
+        total, facets = facet_counts({'level': {'Primary'}})
+        self.assertEqual(total, 2)
+        self.assertEqual(self.counts(facets, 'level'), {'Primary': 2, 'University': 1, 'High School': 1})
+        self.assertEqual(self.counts(facets, 'syllabus_status'), {'active': 1, 'draft': 1})
+        self.assertEqual(self.counts(facets, 'subject_category'), {'sciences': 1, 'arts': 1})
+        self.assertTrue(next(option for option in facets['level'] if option['value'] == 'Primary')['selected'])
+
+    def test_subject_category_counts_distinct_courses(self):
+        total, facets = facet_counts({'subject_category': {'sciences'}})
+        self.assertEqual(total, 2)
+        self.assertEqual(self.counts(facets, 'level'), {'Primary': 1, 'University': 1})
+        self.assertEqual(self.counts(facets, 'subject_category'), {'sciences': 2, 'arts': 2})
+
+    def test_counts_are_cached_until_a_course_changes(self):
+        facet_counts({})
+        with self.assertNumQueries(0):
+            self.assertEqual(facet_counts({})[0], 4)
+        with self.captureOnCommitCallbacks(execute=True):
+            self.make_course('Course 4', level='University')
+        self.assertEqual(facet_counts({'level': {'University'}})[0], 2)
+
+    def test_catalog_endpoint_ignores_unknown_values(self):
+        client = APIClient()
+        client.force_authenticate(self.make_user('visitor'))
+        response = client.get(reverse('course-catalog'), {'level': ['Primary', 'bogus'], 'syllabus_status': 'active'})
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response.data['count'], 1)
+        self.assertEqual([course['title'] for course in response.data['results']], ['Course 0'])
+
+
+class CatalogIndexTests(CoreDataMixin, TestCase):
+    """Catalog filters resolved by the in-memory index match the SQL ones."""
+
+    FILTERS = [
+        {'level': {'Primary'}},
+        {'level': {'Primary', 'University'}, 'syllabus_status': {'active'}},
+        {'subject_category': {'arts'}},
+        {'subject_category': {'sciences'}, 'syllabus_availability': {'public'}, 'syllabus_format': {'pdf'}},
+        {'syllabus_format': {'html'}},
+        {'level': {'Kindergarten'}},
+    ]
+
+    def setUp(self):
+        sciences = Subject.objects.create(name='Physics', category='sciences', description='Matter')
+        arts = Subject.objects.create(name='Painting', category='arts', description='Colour')
+        rows = [
+            ('Primary', 'active', 'public', 'pdf', [sciences]),
+            ('Primary', 'draft', 'private', 'html', [arts]),
+            ('University', 'active', 'public', 'pdf', [sciences, arts]),
+            ('High School', 'inactive', 'restricted', 'word', []),
+        ]
+        for number, (level, status, availability, syllabus_format, subjects) in enumerate(rows):
+            course = self.make_course(
+                f'Course {number}', level=level, syllabus_status=status,
+                syllabus_availability=availability, syllabus_format=syllabus_format,
+            )
+            course.subjects.set(subjects)
+        catalog_index.invalidate()
+
+    def matches(self, filters, enabled):
+        with self.settings(CATALOG_INDEX_ENABLED=enabled):
+            return set(filter_courses(Course.objects.all(), filters).values_list('pk', flat=True))
+
+    def test_index_and_sql_agree(self):
+        for filters in self.FILTERS:
+            self.assertEqual(self.matches(filters, True), self.matches(filters, False), filters)
+
+    def test_index_replaces_the_subject_join(self):
+        filters = {'subject_category': {'arts'}, 'level': {'Primary'}}
+        with self.settings(CATALOG_INDEX_ENABLED=False):
+            self.assertIn('DISTINCT', str(filter_courses(Course.objects.all(), filters).query))
+        with self.settings(CATALOG_INDEX_ENABLED=True):
+            sql = str(filter_courses(Course.objects.all(), filters).query)
+        self.assertNotIn('DISTINCT', sql)
+        self.assertNotIn('core_course_subjects', sql)
+        self.assertEqual(self.matches(filters, True), {'Course 1'})
+
+    @override_settings(
+        CATALOG_INDEX_ENABLED=True,
+        CACHES={'default': {'BACKEND': 'django.core.cache.backends.locmem.LocMemCache', 'LOCATION': 'catalog-index'}},
+    )
+    def test_saves_in_processes_without_a_loaded_index_reach_loaded_ones(self):
+        serving = CatalogIndex()
+        serving.load()
+        self.assertEqual(serving.course_ids(level=['Kindergarten']), [])
+        # Another process (admin, a worker) saves a course without ever loading its own index.
+        with mock.patch('core.catalog_index.catalog_index', CatalogIndex()), self.captureOnCommitCallbacks(execute=True):
+            self.make_course('Nursery', level='Kindergarten')
+        with mock.patch('core.catalog_index.VERSION_CHECK_INTERVAL', 0):
+            self.assertEqual(serving.course_ids(level=['Kindergarten']), ['Nursery'])
+
+
+@override_settings(CACHES={'default': {'BACKEND': 'django.core.cache.backends.locmem.LocMemCache', 'LOCATION': 'gradebook'}})
+class GradebookTests(CoreDataMixin, TestCase):
+    """The gradebook weighs assessment types and follows single score changes without a rebuild."""
+
+    def setUp(self):
+        cache.clear()
+        self.course = self.make_course('Algebra')
+        self.quiz = Assessment.objects.create(
+            title='Quiz', course=self.course, description='d', type='quiz', max_score=10, due_date=date(2025, 2, 1),
+        )
+        self.exam = Assessment.objects.create(
+            title='Exam', course=self.course, description='d', type='exam', max_score=100, due_date=date(2025, 4, 1),
+        )
+        self.ann, self.ben = self.make_student('ann'), self.make_student('ben')
+        for student, quiz, exam in ((self.ann, 8, 90), (self.ben, 4, 50)):
+            StudentAssessment.objects.create(student=student, assessment=self.quiz, score=quiz)
+            StudentAssessment.objects.create(student=student, assessment=self.exam, score=exam)
+
+    def fresh_report(self):
+        return build_report(self.course.pk, build_state(self.course.pk))
+
+    def test_report_weighs_the_types_present(self):
+        report = gradebook_report(self.course.pk)
+        self.assertEqual(report['weights'], {'quiz': 0.2 / 0.7, 'exam': 0.5 / 0.7})
+        quiz = report['assessments'][0]
+        self.assertEqual((quiz['average'], quiz['stddev'], quiz['min'], quiz['max']), (6.0, 2.0, 4, 8))
+        self.assertEqual(report['final_grades']['average'], 67.14)
+        self.assertEqual(report['final_grades']['distribution'], {'A': 1, 'B': 0, 'C': 0, 'D': 0, 'E': 1})
+
+    def test_endpoint_is_for_the_courses_teachers(self):
+        client = APIClient()
+        url = reverse('course-gradebook', args=[self.course.pk])
+        client.force_authenticate(self.ann.user)
+        self.assertEqual(client.get(url).status_code, 403)
+        client.force_authenticate(self.course.teacher)
+        response = client.get(url)
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response.data['students'], 2)
+
+    def test_score_changes_update_the_cached_state(self):
+        gradebook_report(self.course.pk)
+        with self.captureOnCommitCallbacks(execute=True):
+            score = StudentAssessment.objects.get(student=self.ben, assessment=self.exam)
+            score.score = 70
+            score.save()
+        with self.captureOnCommitCallbacks(execute=True):
+            StudentAssessment.objects.get(student=self.ann, assessment=self.quiz).delete()
+        with self.assertNumQueries(0):
+            report = gradebook_report(self.course.pk)
+        self.assertEqual(report['assessments'][1]['average'], 80.0)
+        self.assertEqual((report['assessments'][0]['submissions'], report['assessments'][0]['max']), (1, 4))
+        self.assertEqual(report, self.fresh_report())
+
+
+@override_settings(CACHES={'default': {'BACKEND': 'django.core.cache.backends.locmem.LocMemCache', 'LOCATION': 'scores'}})
+class ScoreImportTests(CoreDataMixin, TestCase):
+    """Score uploads are validated in one pass, upserted, and refresh the gradebook."""
+
+    def setUp(self):
+        cache.clear()
+        self.teacher = self.make_teacher('teacher')
+        self.course = self.make_course('Algebra', teacher=self.teacher.user)
+        self.quiz = Assessment.objects.create(
+            title='Quiz', course=self.course, description='d', type='quiz', max_score=10, due_date=date(2025, 2, 1),
+        )
+        self.other = Assessment.objects.create(
+            title='Essay', course=self.make_course('History'), description='d', type='assignment', max_score=10,
+            due_date=date(2025, 2, 1),
+        )
+        self.ann, self.ben = self.make_student('ann'), self.make_student('ben')
+        StudentAssessment.objects.create(student=self.ben, assessment=self.quiz, score=2)
+        self.client = APIClient()
+        self.client.force_authenticate(self.teacher.user)
+
+    def upload(self, lines):
+        upload = SimpleUploadedFile('scores.csv', ('student,assessment,score\n' + '\n'.join(lines)).encode())
+        with self.captureOnCommitCallbacks(execute=True):
+            return self.client.post(reverse('score-import'), {'file': upload})
+
+    def test_valid_rows_are_upserted_and_the_rest_reported(self):
+        response = self.upload([
+            f'{self.ann.pk},{self.quiz.pk},7',
+            f'{self.ben.pk},{self.quiz.pk},9',
+            f'{self.ann.pk},{self.quiz.pk},8',
+            f'{self.ann.pk},{self.quiz.pk},11',
+            f'STU-missing,{self.quiz.pk},5',
+            f'{self.ann.pk},{self.other.pk},5',
+            f'{self.ann.pk},{self.quiz.pk},seven',
+        ])
+        self.assertEqual(response.status_code, 201)
+        self.assertEqual((response.data['created'], response.data['updated']), (1, 1))
+        self.assertEqual([error['row'] for error in response.data['errors']], [3, 4, 5, 6, 7])
+        self.assertIn('cannot record scores', response.data['errors'][3]['error'])
+        self.assertEqual(
+            dict(StudentAssessment.objects.values_list('student_id', 'score')), {self.ann.pk: 7, self.ben.pk: 9},
+        )
+
+    def test_import_refreshes_the_gradebook(self):
+        self.assertEqual(gradebook_report(self.course.pk)['assessments'][0]['average'], 2.0)
+        self.upload([f'{self.ann.pk},{self.quiz.pk},6', f'{self.ben.pk},{self.quiz.pk},4'])
+        self.assertEqual(gradebook_report(self.course.pk)['assessments'][0]['average'], 5.0)
+
+
+@override_settings(CACHES={'default': {'BACKEND': 'django.core.cache.backends.locmem.LocMemCache', 'LOCATION': 'inbox'}})
+class InboxCounterTests(CoreDataMixin, TestCase):
+    """Unread counters move with every message write, in the same transaction."""
+
+    def setUp(self):
+        cache.clear()
+        self.sender = self.make_user('sender')
+        self.receiver = self.make_user('receiver')
+        self.course = self.make_course('Algebra', teacher=self.sender)
+
+    def send(self, content='Hello'):
+        with self.captureOnCommitCallbacks(execute=True):
+            return Message.objects.create(sender=self.sender, receiver=self.receiver, content=content, course=self.course)
+
+    def test_counter_follows_sends_reads_and_deletes(self):
+        first, second, third = self.send(), self.send(), self.send()
+        self.assertEqual(unread_count(self.receiver), 3)
+        with self.captureOnCommitCallbacks(execute=True):
+            first.is_read = True
+            first.save()
+            second.delete()
+        self.assertEqual(unread_count(self.receiver), 1)
+        with self.captureOnCommitCallbacks(execute=True):
+            self.assertEqual(mark_conversation_read(self.receiver, self.sender), 1)
+        self.assertEqual(unread_count(self.receiver), 0)
+
+    def test_message_is_not_saved_without_its_counter_update(self):
+        with mock.patch('core.inbox.adjust_unread_count', side_effect=DatabaseError('lock wait timeout')):
+            with self.assertRaises(DatabaseError):
+                self.send()
+        self.assertFalse(Message.objects.exists())
+
+    def test_command_rebuilds_drifted_counters(self):
+        self.send()
+        self.send()
+        Message.objects.update(is_read=True)
+        call_command('rebuild_unread_counters', stdout=io.StringIO())
+        self.assertEqual(unread_count(self.receiver), 0)
+
+
+class ForumSummaryTests(CoreDataMixin, TestCase):
+    """Thread summaries follow replies as they are written and deleted."""
+
+    def setUp(self):
+        self.course = self.make_course('Algebra')
+        self.post = DiscussionForumPost.objects.create(course=self.course, creator=self.course.teacher, post_content='Week 1')
+        self.started = timezone.now()
+
+    def reply(self, author, minutes):
+        with mock.patch('django.utils.timezone.now', return_value=self.started + timedelta(minutes=minutes)):
+            return Reply.objects.create(post=self.post, author=author, content='Reply')
+
+    def summary(self):
+        summary = ForumThreadSummary.objects.get(post=self.post)
+        return summary.reply_count, summary.last_reply_at, summary.last_author
+
+    def test_new_reply_is_counted_and_becomes_the_last(self):
+        first, second = self.make_user('first'), self.make_user('second')
+        self.reply(first, 1)
+        self.reply(second, 2)
+        self.assertEqual(self.summary(), (2, self.started + timedelta(minutes=2), second))
+
+    def test_deleting_an_older_reply_keeps_the_last(self):
+        first, second = self.make_user('first'), self.make_user('second')
+        older = self.reply(first, 1)
+        self.reply(second, 2)
+        older.delete()
+        self.assertEqual(self.summary(), (1, self.started + timedelta(minutes=2), second))
+
+    def test_deleting_the_last_reply_falls_back_to_the_previous_one(self):
+        first, second = self.make_user('first'), self.make_user('second')
+        self.reply(first, 1)
+        latest = self.reply(second, 2)
+        latest.delete()
+        self.assertEqual(self.summary(), (1, self.started + timedelta(minutes=1), first))
+
+    def test_deleting_the_only_reply_clears_the_last(self):
+        self.reply(self.make_user('first'), 1).delete()
+        self.assertEqual(self.summary(), (0, None, None))
+
+
+class SearchTests(CoreDataMixin, TestCase):
+    """Courses, forum posts and replies are indexed as they are saved and can be rebuilt in batches."""
+
+    def setUp(self):
+        self.course = self.make_course('Algebra')
+        self.post = DiscussionForumPost.objects.create(
+            course=self.course, creator=self.course.teacher, post_content='How do I solve quadratic equations?',
+        )
+        Reply.objects.create(post=self.post, author=self.course.teacher, content='Use the quadratic formula.')
+
+    def test_saved_rows_are_searchable(self):
+        results = search('quadratic')
+        self.assertEqual(sorted(result['kind'] for result in results), ['post', 'reply'])
+        self.assertIn('<mark>quadratic</mark>', results[0]['snippet'])
+        self.assertEqual(search('quadratic', kinds=['reply'])[0]['course'], self.course.pk)
+
+    def test_rebuild_command_recreates_the_index(self):
+        SearchDocument.objects.all().delete()
+        out = io.StringIO()
+        call_command('rebuild_search_index', batch_size=2, stdout=out)
+        self.assertIn('Indexed 3 documents', out.getvalue())
+        self.assertEqual(
+            sorted(SearchDocument.objects.values_list('kind', 'object_id')),
+            [('course', 'Algebra'), ('post', str(self.post.pk)), ('reply', str(Reply.objects.get().pk))],
+        )
+
+
+class SearchBackfillMigrationTests(TransactionTestCase):
+    """Migration 0011 indexes the rows that existed before it."""
+
+    before = [('core', '0010_forum_thread_summary')]
+    after = [('core', '0011_search_document')]
+
+    def tearDown(self):
+        executor = MigrationExecutor(connection)
+        executor.loader.build_graph()
+        executor.migrate(executor.loader.graph.leaf_nodes())
+
+    def test_existing_rows_are_indexed(self):
+        executor = MigrationExecutor(connection)
+        executor.migrate(self.before)
+        old_apps = executor.loader.project_state(self.before).apps
+        user = old_apps.get_model('auth', 'User').objects.create(username='teacher')
+        course = old_apps.get_model('core', 'Course').objects.create(
+            title='Algebra', description='d', teacher=user, level='Primary', start_date=date(2025, 1, 6),
+            end_date=date(2025, 4, 4), price=Decimal('1.00'), requirements='r',
+        )
+        post = old_apps.get_model('core', 'DiscussionForumPost').objects.create(course=course, creator=user, post_content='p')
+        old_apps.get_model('core', 'Reply').objects.create(post=post, author=user, content='r')
+
+        executor = MigrationExecutor(connection)
+        executor.migrate(self.after)
+        documents = executor.loader.project_state(self.after).apps.get_model('core', 'SearchDocument').objects
+        self.assertEqual(sorted(documents.values_list('kind', flat=True)), ['course', 'post', 'reply'])
+
+
+@override_settings(CACHES={'default': {'BACKEND': 'django.core.cache.backends.locmem.LocMemCache', 'LOCATION': 'progress'}})
+class ModuleProgressTests(CoreDataMixin, TestCase):
+    """Module completions move Progress on in SQL, once per module."""
+
+    def setUp(self):
+        cache.clear()
+        self.teacher = self.make_teacher('teacher')
+        self.course = self.make_course('Algebra', teacher=self.teacher.user, total_modules=3)
+        self.student = self.make_student('student')
+        Enrollment.objects.create(student=self.student, course=self.course, teacher=self.teacher)
+
+    def complete(self, module):
+        return record_module_completion(self.student.pk, self.course.pk, module)
+
+    def test_percentage_is_computed_in_the_update(self):
+        progress = self.complete('intro')
+        self.assertEqual((progress.modules_completed, progress.progress_percentage), (1, Decimal('33.33')))
+        self.complete('fractions')
+        progress = self.complete('equations')
+        self.assertEqual((progress.modules_completed, progress.progress_percentage), (3, Decimal('100.00')))
+
+    def test_completing_a_module_twice_counts_once(self):
+        self.complete('intro')
+        progress = self.complete('intro')
+        self.assertEqual(progress.modules_completed, 1)
+        self.assertEqual(ModuleCompletion.objects.count(), 1)
+
+    def test_deleting_a_completion_recounts(self):
+        self.complete('intro')
+        self.complete('fractions')
+        ModuleCompletion.objects.filter(module='intro').delete()
+        self.assertEqual(Progress.objects.get(student=self.student).modules_completed, 1)
+
+    def test_cascades_do_not_recount(self):
+        self.complete('intro')
+        with mock.patch('core.progress.recompute_progress') as recompute:
+            self.student.user.delete()
+        recompute.assert_not_called()
+        self.assertFalse(Progress.objects.exists())
+
+    def test_overview_is_for_the_courses_teachers(self):
+        client = APIClient()
+        url = reverse('course-progress', args=[self.course.pk])
+        client.force_authenticate(self.student.user)
+        self.assertEqual(client.get(url).status_code, 403)
+        client.force_authenticate(self.make_teacher('colleague').user)
+        self.assertEqual(client.get(url).status_code, 403)
+        self.complete('intro')
+        client.force_authenticate(self.teacher.user)
+        response = client.get(url)
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response.data['summary']['students'], 1)
+
+
+class MergeDuplicateProgressMigrationTests(TransactionTestCase):
+    """Migration 0012 folds duplicate Progress rows into one before adding the unique constraint."""
+
+    before = [('core', '0011_search_document')]
+    after = [('core', '0012_module_progress')]
+
+    def tearDown(self):
+        executor = MigrationExecutor(connection)
+        executor.loader.build_graph()
+        executor.migrate(executor.loader.graph.leaf_nodes())
+
+    def test_duplicates_are_merged_into_the_most_advanced_row(self):
+        executor = MigrationExecutor(connection)
+        executor.migrate(self.before)
+        old_apps = executor.loader.project_state(self.before).apps
+        Progress = old_apps.get_model('core', 'Progress')
+        Student = old_apps.get_model('core', 'Student')
+        Course = old_apps.get_model('core', 'Course')
+        user = old_apps.get_model('auth', 'User').objects.create(username='student')
+        course = Course.objects.create(
+            title='Algebra', description='d', teacher=user, level='Primary', start_date=date(2025, 1, 6),
+            end_date=date(2025, 4, 4), price=Decimal('1.00'), requirements='r',
+        )
+        with transaction.atomic():
+            behind = Progress.objects.create(student_id='STU0000001', course=course, modules_completed=1)
+            Student.objects.create(
+                id='STU0000001', user=user, full_name='Student', profile_picture='p.jpg', education_level='Primary',
+                total_fees=Decimal('1.00'), remaining_fee=Decimal('1.00'), progress=behind,
+            )
+        ahead = Progress.objects.create(student_id='STU0000001', course=course, modules_completed=4)
+        Progress.objects.create(student_id='STU0000001', course=course, modules_completed=4)
+
+        executor = MigrationExecutor(connection)
+        executor.migrate(self.after)
+        new_apps = executor.loader.project_state(self.after).apps
+        self.assertEqual(list(new_apps.get_model('core', 'Progress').objects.values_list('pk', flat=True)), [ahead.pk])
+        self.assertEqual(new_apps.get_model('core', 'Student').objects.get().progress_id, ahead.pk)
+
+
+@override_settings(
+    EMAIL_BACKEND='django.core.mail.backends.locmem.EmailBackend',
+    SMS_BACKEND='core.sms.LocMemSMSBackend',
+    SMS_BATCH_SIZE=2,
+)
+class PaymentNotificationTaskTests(TestCase):
+    """Notification tasks run eagerly against an in-memory broker and fake backends."""
+
+    def setUp(self):
+        celery_app.conf.update(broker_url='memory://', task_always_eager=True)
+        self.addCleanup(celery_app.conf.update, task_always_eager=False)
+        sms.outbox.clear()
+
+    def queue(self, channel, recipient, key='payment-1'):
+        return PaymentNotification.objects.create(
+            idempotency_key=key, channel=channel, recipient=recipient,
+            subject='Payment received', body='We have received your payment.',
+        )
+
+    def test_email_is_sent_once(self):
+        notification = self.queue('email', 'student@example.com')
+        send_notification_email.delay(notification.pk)
+        send_notification_email.delay(notification.pk)
+
+        self.assertEqual(len(mail.outbox), 1)
+        notification.refresh_from_db()
+        self.assertEqual(notification.status, 'sent')
+        self.assertEqual(notification.attempts, 1)
+
+    def test_email_is_retried_after_failure(self):
+        notification = self.queue('email', 'student@example.com')
+        with mock.patch('core.tasks.send_mail', side_effect=[OSError('SMTP down'), 1]):
+            send_notification_email.delay(notification.pk)
+
+        notification.refresh_from_db()
+        self.assertEqual(notification.status, 'sent')
+        self.assertEqual(notification.attempts, 2)
+        self.assertEqual(notification.last_error, 'SMTP down')
+
+    def test_sms_queue_is_sent_in_batches(self):
+        for number in ('0700000001', '0700000002', '0700000003'):
+            self.queue('sms', number)
+
+        with mock.patch.object(sms.LocMemSMSBackend, 'send_messages', autospec=True,
+                               side_effect=sms.LocMemSMSBackend.send_messages) as send:
+            self.assertEqual(flush_sms_queue.delay().get(), 3)
+
+        self.assertEqual([len(call.args[1]) for call in send.call_args_list], [2, 1])
+        self.assertEqual(len(sms.outbox), 3)
+        self.assertFalse(PaymentNotification.objects.exclude(status='sent').exists())
+
+    def test_email_is_claimed_before_it_is_sent(self):
+        notification = self.queue('email', 'student@example.com')
+
+        def send_mail(*args):
+            # Committed as claimed before the mail server is contacted, so no row lock is held while sending.
+            self.assertEqual(PaymentNotification.objects.get(pk=notification.pk).status, 'sending')
+            return 1
+
+        with mock.patch('core.tasks.send_mail', side_effect=send_mail):
+            send_notification_email.delay(notification.pk)
+        notification.refresh_from_db()
+        self.assertEqual(notification.status, 'sent')
+
+    def test_sms_transport_errors_fail_only_their_message(self):
+        for number in ('0700000001', '0700000002'):
+            self.queue('sms', number)
+
+        def create(to, **kwargs):
+            if to == '0700000001':
+                raise ConnectionError('Connection reset by peer')
+
+        twilio = override_settings(
+            SMS_BACKEND='core.sms.TwilioSMSBackend', TWILIO_ACCOUNT_SID='AC00', TWILIO_AUTH_TOKEN='token',
+            TWILIO_FROM_NUMBER='+254700000000',
+        )
+        with twilio, \
+                mock.patch('twilio.rest.Client') as client, mock.patch.object(flush_sms_queue, 'apply_async') as retry:
+            client.return_value.messages.create.side_effect = create
+            self.assertEqual(flush_sms_queue(), 1)
+
+        statuses = dict(PaymentNotification.objects.values_list('recipient', 'status'))
+        self.assertEqual(statuses, {'0700000001': 'pending', '0700000002': 'sent'})
+        self.assertEqual(PaymentNotification.objects.get(recipient='0700000001').last_error, 'Connection reset by peer')
+        retry.assert_called_once()
+
+    def test_abandoned_claims_are_sent_again(self):
+        notification = self.queue('sms', '0700000001')
+        PaymentNotification.objects.filter(pk=notification.pk).update(
+            status='sending', attempts=1, claimed_at=timezone.now() - timedelta(seconds=CLAIM_TIMEOUT + 1),
+        )
+        self.assertEqual(flush_sms_queue(), 1)
+        notification.refresh_from_db()
+        self.assertEqual((notification.status, notification.attempts), ('sent', 2))
+
+
+@override_settings(CHANNEL_LAYERS={'default': {'BACKEND': 'channels.layers.InMemoryChannelLayer'}})
+class RealtimeDeliveryTests(TestCase):
+    """New messages are pushed over the inbox WebSocket once their transaction commits."""
+
+    def setUp(self):
+        self.sender = User.objects.create_user(username='sender', password='secret')
+        self.receiver = User.objects.create_user(username='receiver', password='secret')
+        self.course = Course.objects.create(
+            title='Algebra', description='Equations', teacher=self.sender, level='Primary',
+            start_date=date(2024, 1, 1), end_date=date(2024, 6, 1), price=Decimal('100.00'),
+            requirements='None',
+        )
+
+    def connect(self, user):
+        communicator = WebsocketCommunicator(URLRouter(websocket_urlpatterns), '/ws/inbox/')
+        communicator.scope['user'] = user
+        return communicator
+
+    def send_message(self):
+        with self.captureOnCommitCallbacks(execute=True):
+            return Message.objects.create(
+                sender=self.sender, receiver=self.receiver, content='Hello', course=self.course
+            )
+
+    async def test_new_message_is_pushed_to_receiver(self):
+        communicator = self.connect(self.receiver)
+        connected, _ = await communicator.connect()
+        self.assertTrue(connected)
+
+        message = await database_sync_to_async(self.send_message)()
+        event = await communicator.receive_json_from(timeout=1)
+        self.assertEqual(event['type'], 'message')
+        self.assertEqual(event['data']['id'], message.pk)
+        await communicator.disconnect()
+
+    def test_channel_layer_outage_does_not_fail_the_save(self):
+        with mock.patch('core.realtime.get_channel_layer', side_effect=InvalidChannelLayerError('redis down')), \
+                self.assertLogs('django.test', 'ERROR'):
+            message = self.send_message()
+        self.assertTrue(Message.objects.filter(pk=message.pk).exists())
+
+    async def test_anonymous_connection_is_rejected(self):
+        from django.contrib.auth.models import AnonymousUser
+
+        connected, _ = await self.connect(AnonymousUser()).connect()
+        self.assertFalse(connected)
+
+
+@override_settings(CHANNEL_LAYERS={'default': {'BACKEND': 'channels.layers.InMemoryChannelLayer'}})
+class BroadcastTests(CoreDataMixin, TestCase):
+    """Broadcasts reach every recipient once, even when a run is cut short."""
+
+    def setUp(self):
+        celery_app.conf.update(broker_url='memory://', task_always_eager=True)
+        self.addCleanup(celery_app.conf.update, task_always_eager=False)
+        self.teacher = self.make_teacher('teacher')
+        self.course = self.make_course('Algebra', teacher=self.teacher.user)
+        self.students = [self.make_student(f'student {number}') for number in range(5)]
+        for student in self.students:
+            Enrollment.objects.create(student=student, course=self.course, teacher=self.teacher)
+        self.broadcast = Broadcast.objects.create(course=self.course, sender=self.teacher.user, content='No class on Friday')
+
+    def assertDelivered(self):
+        self.broadcast.refresh_from_db()
+        self.assertEqual(self.broadcast.status, 'done')
+        self.assertEqual((self.broadcast.recipient_count, self.broadcast.delivered_count), (5, 5))
+        self.assertEqual(
+            sorted(Notification.objects.filter(broadcast=self.broadcast).values_list('recipient_id', flat=True)),
+            sorted(student.user_id for student in self.students),
+        )
+        self.assertFalse(undelivered_batches(self.broadcast.pk).exists())
+
+    def test_run_delivers_every_batch(self):
+        run_broadcast.delay(self.broadcast.pk)
+        self.assertDelivered()
+
+    def test_interrupted_run_is_resumed(self):
+        # The worker commits the first chunk and dies before queueing its delivery.
+        next(create_notifications(self.broadcast, batch_size=2))
+        self.assertEqual(list(stalled_broadcasts(timezone.now())), [])
+        later = timezone.now() + timedelta(seconds=STALL_TIMEOUT + 1)
+        self.assertEqual(list(stalled_broadcasts(later)), [self.broadcast])
+
+        with mock.patch('core.tasks.timezone.now', return_value=later):
+            self.assertEqual(resume_stalled_broadcasts.delay().get(), 1)
+        self.assertDelivered()
+
+    def test_batch_delivered_twice_counts_once(self):
+        batches = list(create_notifications(self.broadcast, batch_size=3))
+        for batch in batches + batches[:1]:
+            deliver_broadcast_batch.delay(batch.pk)
+        self.assertDelivered()
+
+
+# Tests started as root hand the runner to nobody, as CODE_RUNNER_UID would.
+SANDBOX_UID = 65534 if os.geteuid() == 0 else None
+
+
+def user_namespaces_allowed():
+    """Whether the runner's user may create user namespaces (some distributions restrict them)."""
+    probe = f'import ctypes, sys; sys.exit(ctypes.CDLL(None).unshare({CLONE_NEWUSER}) != 0)'
+    try:
+        return subprocess.run([sys.executable, '-c', probe], user=SANDBOX_UID, capture_output=True).returncode == 0
+    except OSError:
+        # The interpreter itself is out of that user's reach.
+        return False
+
+
+@skipUnless(user_namespaces_allowed(), "The code runner needs unprivileged user namespaces.")
+class SandboxTests(SimpleTestCase):
+    """Submissions run in forked children of a warm worker, within their limits and namespaces."""
+
+    @classmethod
+    def setUpClass(cls):
+        super().setUpClass()
+        cls.pool = WorkerPool(1, SANDBOX_UID, SANDBOX_UID)
+        cls.limits = dict(runner_limits(), cpu_seconds=1, wall_seconds=2, memory_mb=128)
+
+    @classmethod
+    def tearDownClass(cls):
+        cls.pool.shutdown()
+        super().tearDownClass()
+
+    def run_python(self, code):
+        return self.pool.run('python', code, self.limits)
+
+    def test_output_is_captured(self):
+        result = self.run_python('print(6 * 7)')
+        self.assertEqual((result['status'], result['stdout']), ('ok', '42\n'))
+
+    def test_state_does_not_leak_between_submissions(self):
+        self.run_python('import json; json.marker = 1')
+        result = self.run_python('import json; print(hasattr(json, "marker"))')
+        self.assertEqual(result['stdout'], 'False\n')
+
+    def test_limits_stop_runaway_submissions(self):
+        self.assertEqual(self.run_python('while True: pass')['status'], 'cpu_limit')
+        self.assertEqual(self.run_python('import time; time.sleep(5)')['status'], 'timeout')
+        self.assertEqual(self.run_python('x = bytearray(512 * 1024 * 1024)')['status'], 'memory_limit')
+
+    def test_memory_failures_are_told_by_exit_status_not_output(self):
+        self.assertEqual(self.run_python('import sys; sys.exit("MemoryError")')['status'], 'error')
+
+    @skipUnless(shutil.which('g++'), "No C++ toolchain.")
+    def test_native_allocation_failure_is_a_memory_limit(self):
+        code = '#include <vector>\nint main() { std::vector<char *> v; for (;;) v.push_back(new char[1 << 20]); }\n'
+        result = self.pool.run('c++', code, dict(self.limits, cpu_seconds=5, wall_seconds=10))
+        self.assertEqual(result['status'], 'memory_limit')
+        self.assertIn('std::bad_alloc', result['stderr'])
+
+    def test_submissions_cannot_see_the_server(self):
+        result = self.run_python('import os; print(os.getuid(), sorted(os.environ))')
+        self.assertEqual(result['stdout'], f"{NAMESPACE_ID} ['HOME', 'LANG', 'PATH']\n")
+        result = self.run_python(f'open({os.path.abspath(__file__)!r})')
+        self.assertIn('FileNotFoundError', result['stderr'])
+        result = self.run_python('import socket; socket.create_connection(("1.1.1.1", 80), timeout=1)')
+        self.assertIn('Network is unreachable', result['stderr'])
+
+    def test_submissions_hold_no_capabilities(self):
+        result = self.run_python('import os; os.chroot("/tmp")')
+        self.assertIn('PermissionError', result['stderr'])
+
+    def test_background_processes_die_with_the_job(self):
+        self.run_python(
+            'import os\n'
+            'if os.fork() == 0:\n'
+            '    os.setsid()\n'
+            '    os.execvp("sleep", ["sleep", "61.5"])\n'
+        )
+        survivors = subprocess.run(['pgrep', '-f', 'sleep 61.5'], capture_output=True, text=True)
+        self.assertEqual(survivors.stdout, '')
+
+    def test_process_limit_is_counted_per_submission(self):
+        code = (
+            'import os, time\n'
+            'for _ in range(10):\n'
+            '    if os.fork() == 0:\n'
+            '        time.sleep(1)\n'
+            '        os._exit(0)\n'
+            'print("forked")\n'
+            'time.sleep(1)\n'
+        )
+        pool = WorkerPool(2, SANDBOX_UID, SANDBOX_UID)
+        self.addCleanup(pool.shutdown)
+        pool.start()
+        results = []
+        first = threading.Thread(target=lambda: results.append(pool.run('python', code, self.limits)))
+        first.start()
+        results.append(pool.run('python', code, self.limits))
+        first.join()
+        self.assertEqual([result['stdout'] for result in results], ['forked\n'] * 2)
+
+    def test_runner_refuses_to_run_as_root(self):
+        with mock.patch('core.sandbox.os.geteuid', return_value=0):
+            result = WorkerPool(1).run('python', 'print(1)', self.limits)
+        self.assertEqual(result['status'], 'unavailable')
 
-# Create your tests here.
@@ -0,0 +1,29 @@
+from rest_framework.routers import DefaultRouter
+
+from . import views
+
+router = DefaultRouter()
+router.register('admins', views.AdminViewSet)
+router.register('classrooms', views.ClassroomViewSet)
+router.register('class-students', views.ClassStudentViewSet)
+router.register('student-assessments', views.StudentAssessmentViewSet)
+router.register('teachers', views.TeacherViewSet)
+router.register('students', views.StudentViewSet)
+router.register('courses', views.CourseViewSet)
+router.register('payments', views.PaymentViewSet)
+router.register('subjects', views.SubjectViewSet)
+router.register('qualifications', views.QualificationViewSet)
+router.register('assessments', views.AssessmentViewSet)
+router.register('progress', views.ProgressViewSet)
+router.register('enrollments', views.EnrollmentViewSet)
+router.register('messages', views.MessageViewSet)
+router.register('forum-posts', views.DiscussionForumPostViewSet)
+router.register('replies', views.ReplyViewSet)
+router.register('notifications', views.NotificationViewSet)
+router.register('assignments', views.AssignmentViewSet)
+router.register('teacher-boards', views.TeacherBoardViewSet)
+router.register('code-submissions', views.CodeEditorViewSet)
+router.register('camera-sessions', views.CameraInteractionViewSet)
+router.register('broadcasts', views.BroadcastViewSet)
+
+urlpatterns = router.urls
@@ -1,4 +1,12 @@
+import csv
+import io
+
+from django.http import StreamingHttpResponse
 from django.shortcuts import render
+from django.db.models import Q, TextField
+from rest_framework import viewsets
+from rest_framework.decorators import action
+from rest_framework.exceptions import PermissionDenied
 from rest_framework.views import APIView
 from rest_framework.response import Response
 from rest_framework.permissions import IsAuthenticated, IsAdminUser, AllowAny
@@ -7,15 +15,33 @@ from .serializers import (
     Admin, Classroom, ClassStudent, StudentAssessment, Teacher, Student, Course, 
     Payment, Subject, Qualification, Assessment, Progress, Enrollment, Message, 
     DiscussionForumPost, Reply, Notification, Assignment, TeacherBoard, CodeEditor, 
-    CameraInteraction, UserSerializer
+    CameraInteraction, UserSerializer, AdminSerializer, ClassroomSerializer,
+    ClassStudentSerializer, StudentAssessmentSerializer, TeacherSerializer,
+    StudentSerializer, CourseSerializer, PaymentSerializer, SubjectSerializer,
+    QualificationSerializer, AssessmentSerializer, ProgressSerializer,
+    EnrollmentSerializer, MessageSerializer, DiscussionForumPostSerializer,
+    ReplySerializer, NotificationSerializer, AssignmentSerializer,
+    TeacherBoardSerializer, CodeEditorSerializer, CameraInteractionSerializer,
+    BroadcastSerializer
 )
 from .models import (
     Admin, Classroom, ClassStudent, StudentAssessment, Teacher, Student, Course, 
     Payment, Subject, Qualification, Assessment, Progress, Enrollment, Message, 
     DiscussionForumPost, Reply, Notification, Assignment, TeacherBoard, CodeEditor, 
-    CameraInteraction
+    CameraInteraction, Broadcast
 )
-from rest_framework import status
+from rest_framework import mixins, status
+from .pagination import KeysetPagination
+from .catalog import facet_counts, filter_courses, parse_filters
+from .fees import get_fee_schedule
+from .gradebook import gradebook_report
+from .inbox import mark_conversation_read, unread_count
+from .progress import course_progress_overview, record_module_completion
+from .search import SEARCH_LIMIT, search
+from .services import bulk_enroll, import_scores, start_broadcast
+from .statements import statement_queryset, statement_rows, stream_csv, stream_pdf
+from .student_dashboard import cache_stats as dashboard_cache_stats, student_snapshot
+from .teacher_dashboard import dashboard as teacher_dashboard
 
 class SignupView(APIView):
     permission_classes = [AllowAny]
@@ -32,4 +58,512 @@ class SignupView(APIView):
             )
             return Response({'message': 'User created successfully'}, status=status.HTTP_201_CREATED)
         
-        return Response(serializer.errors, status=status.HTTP_400_BAD_REQUEST)
\ No newline at end of file
+        return Response(serializer.errors, status=status.HTTP_400_BAD_REQUEST)
+
+
+def read_batch_rows(request):
+    """Rows of a batch upload, from a CSV ``file`` or a JSON list (or ``{"rows": [...]}``)."""
+    upload = request.FILES.get('file')
+    if upload is not None:
+        return list(csv.DictReader(io.TextIOWrapper(upload, encoding='utf-8-sig')))
+    data = request.data
+    if isinstance(data, dict):
+        data = data.get('rows')
+    if isinstance(data, list) and all(isinstance(row, dict) for row in data):
+        return data
+    return None
+
+
+class BulkEnrollmentView(APIView):
+    permission_classes = [IsAdminUser]
+
+    def post(self, request):
+        rows = read_batch_rows(request)
+        if rows is None:
+            return Response(
+                {'error': 'Upload a CSV file or send a JSON list of {"student", "course"} rows.'},
+                status=status.HTTP_400_BAD_REQUEST,
+            )
+
+        result = bulk_enroll(rows)
+        return Response(result, status=status.HTTP_201_CREATED if result['created'] else status.HTTP_200_OK)
+
+
+
+class ScoreImportView(APIView):
+    """
+    Bulk create or update assessment scores from a CSV ``file`` or JSON rows of
+    ``{"student", "assessment", "score"}``. Teachers may only score assessments
+    of courses they own or teach.
+    """
+    permission_classes = [IsAuthenticated]
+
+    def post(self, request):
+        rows = read_batch_rows(request)
+        if rows is None:
+            return Response(
+                {'error': 'Upload a CSV file or send a JSON list of {"student", "assessment", "score"} rows.'},
+                status=status.HTTP_400_BAD_REQUEST,
+            )
+
+        user = request.user
+        allowed_courses = None
+        if not user.is_staff:
+            allowed_courses = set(
+                Course.objects.filter(teacher=user).values_list('pk', flat=True).union(
+                    Classroom.objects.filter(teacher__user=user).values_list('course_id', flat=True),
+                    Enrollment.objects.filter(teacher__user=user).values_list('course_id', flat=True),
+                )
+            )
+        result = import_scores(rows, allowed_courses=allowed_courses)
+        return Response(result, status=status.HTTP_201_CREATED if result['created'] else status.HTTP_200_OK)
+
+
+class FeeStatementExportView(APIView):
+    """
+    Streams fee statements as CSV (default) or a single PDF.
+
+    Query parameters: ``output`` (``csv`` or ``pdf``), ``education_level``,
+    ``unpaid`` and repeated ``student`` ids.
+    """
+    permission_classes = [IsAdminUser]
+
+    def get(self, request):
+        students = statement_queryset(
+            education_level=request.query_params.get('education_level'),
+            unpaid_only=request.query_params.get('unpaid') in ('1', 'true'),
+            student_ids=request.query_params.getlist('student'),
+        )
+        rows = statement_rows(students)
+        if request.query_params.get('output') == 'pdf':
+            response = StreamingHttpResponse(stream_pdf(rows), content_type='application/pdf')
+            response['Content-Disposition'] = 'attachment; filename="fee_statements.pdf"'
+        else:
+            response = StreamingHttpResponse(stream_csv(rows), content_type='text/csv')
+            response['Content-Disposition'] = 'attachment; filename="fee_statements.csv"'
+        return response
+
+
+class SearchView(APIView):
+    """
+    Ranked full-text search over courses, forum posts and replies.
+
+    Query parameters: ``q``, repeated ``kind`` (``course``, ``post``,
+    ``reply``), ``course`` and ``limit`` (at most 50).
+    """
+    permission_classes = [IsAuthenticated]
+
+    def get(self, request):
+        query = request.query_params.get('q', '').strip()
+        if not query:
+            return Response({'error': 'q is required.'}, status=status.HTTP_400_BAD_REQUEST)
+        try:
+            limit = min(int(request.query_params.get('limit', SEARCH_LIMIT)), 50)
+        except ValueError:
+            limit = SEARCH_LIMIT
+        results = search(
+            query,
+            kinds=request.query_params.getlist('kind'),
+            course=request.query_params.get('course'),
+            limit=limit,
+        )
+        return Response({'query': query, 'results': results})
+
+
+class EagerLoadingQuerysetMixin:
+    """Applies the serializer's declared select/prefetch_related to the view's queryset."""
+
+    def get_queryset(self):
+        queryset = super().get_queryset()
+        serializer_class = self.get_serializer_class()
+        if hasattr(serializer_class, 'setup_eager_loading'):
+            queryset = serializer_class.setup_eager_loading(queryset)
+        return queryset
+
+
+class SparseFieldsetsMixin:
+    """
+    ``?fields=a,b`` limits the serialized fields to the ones listed and defers
+    unrequested text columns so they are not even read from the database.
+    """
+
+    def get_requested_fields(self):
+        fields = self.request.query_params.get('fields') if self.request else None
+        if not fields:
+            return None
+        return {name.strip() for name in fields.split(',') if name.strip()}
+
+    def get_queryset(self):
+        queryset = super().get_queryset()
+        requested = self.get_requested_fields()
+        if requested:
+            deferred = [
+                field.name for field in queryset.model._meta.concrete_fields
+                if isinstance(field, TextField) and field.name not in requested
+            ]
+            if deferred:
+                queryset = queryset.defer(*deferred)
+        return queryset
+
+    def get_serializer(self, *args, **kwargs):
+        serializer = super().get_serializer(*args, **kwargs)
+        requested = self.get_requested_fields()
+        if requested:
+            target = getattr(serializer, 'child', serializer)
+            for name in set(target.fields) - requested:
+                target.fields.pop(name)
+        return serializer
+
+
+def taught_courses(user):
+    """Courses ``user`` owns or has a classroom in, as a subquery of primary keys."""
+    return Course.objects.filter(Q(teacher=user) | Q(classroom__teacher__user=user)).values('pk')
+
+
+def taught_students(user):
+    """Students in ``user``'s classrooms or enrolled with them, as a subquery of primary keys."""
+    return Student.objects.filter(Q(classstudent__teacher__user=user) | Q(enrollment__teacher__user=user)).values('pk')
+
+
+def enrolled_courses(user):
+    return Enrollment.objects.filter(student__user=user).values('course_id')
+
+
+class ScopedQuerysetMixin:
+    """
+    Staff see every row; everyone else sees what ``scope_queryset`` lets
+    through. Nothing is visible unless a view says otherwise, so reference
+    data (subjects, the course catalogue) has to opt in with ``public = True``.
+    """
+    public = False
+
+    def scope_queryset(self, queryset, user):
+        return queryset.none()
+
+    def get_queryset(self):
+        queryset = super().get_queryset()
+        user = self.request.user
+        if self.public or user.is_staff:
+            return queryset
+        return self.scope_queryset(queryset, user)
+
+
+class ReadOnlyAPIViewSet(ScopedQuerysetMixin, SparseFieldsetsMixin, EagerLoadingQuerysetMixin, viewsets.ReadOnlyModelViewSet):
+    permission_classes = [IsAuthenticated]
+    pagination_class = KeysetPagination
+
+
+class AdminViewSet(ReadOnlyAPIViewSet):
+    permission_classes = [IsAdminUser]
+    queryset = Admin.objects.all()
+    serializer_class = AdminSerializer
+
+
+class ClassroomViewSet(ReadOnlyAPIViewSet):
+    queryset = Classroom.objects.all()
+    serializer_class = ClassroomSerializer
+
+    def scope_queryset(self, queryset, user):
+        attending = ClassStudent.objects.filter(student__user=user).values('class_obj_id')
+        return queryset.filter(Q(teacher__user=user) | Q(pk__in=attending))
+
+
+class ClassStudentViewSet(ReadOnlyAPIViewSet):
+    queryset = ClassStudent.objects.all()
+    serializer_class = ClassStudentSerializer
+
+    def scope_queryset(self, queryset, user):
+        return queryset.filter(Q(teacher__user=user) | Q(student__user=user))
+
+
+class StudentAssessmentViewSet(ReadOnlyAPIViewSet):
+    queryset = StudentAssessment.objects.all()
+    serializer_class = StudentAssessmentSerializer
+
+    def scope_queryset(self, queryset, user):
+        return queryset.filter(Q(student__user=user) | Q(assessment__course__in=taught_courses(user)))
+
+
+class TeacherViewSet(ReadOnlyAPIViewSet):
+    queryset = Teacher.objects.all()
+    serializer_class = TeacherSerializer
+
+    def scope_queryset(self, queryset, user):
+        # Teacher rows carry pay rates and deductions.
+        return queryset.filter(user=user)
+
+    @action(detail=False)
+    def dashboard(self, request):
+        """
+        The requesting teacher's classrooms, rosters, enrollments, pending
+        submissions and average scores, read from the precomputed rollup,
+        and unread messages. Staff may pass ``?teacher=<id>``.
+        """
+        teachers = Teacher.objects.all()
+        if request.user.is_staff and request.query_params.get('teacher'):
+            teachers = teachers.filter(pk=request.query_params['teacher'])
+        else:
+            teachers = teachers.filter(user=request.user)
+        teacher = teachers.values_list('pk', flat=True).first()
+        if teacher is None:
+            raise PermissionDenied('Only teachers have a dashboard.')
+        return Response(teacher_dashboard(teacher))
+
+
+class StudentViewSet(ReadOnlyAPIViewSet):
+    queryset = Student.objects.all()
+    serializer_class = StudentSerializer
+
+    def scope_queryset(self, queryset, user):
+        return queryset.filter(Q(user=user) | Q(pk__in=taught_students(user)))
+
+    @action(detail=True, url_path='fee-schedule')
+    def fee_schedule(self, request, pk=None):
+        return Response(get_fee_schedule(self.get_object()))
+
+    @action(detail=False)
+    def dashboard(self, request):
+        """
+        The requesting student's courses and progress, fees, upcoming
+        assessments, unread notifications and recent forum activity.
+        """
+        snapshot = student_snapshot(request.user)
+        if snapshot is None:
+            raise PermissionDenied('Only students have a dashboard.')
+        return Response(snapshot)
+
+    @action(detail=False, url_path='dashboard-stats', permission_classes=[IsAdminUser])
+    def dashboard_stats(self, request):
+        """Hit and miss counts of the student dashboard cache."""
+        return Response(dashboard_cache_stats())
+
+
+class CourseViewSet(ReadOnlyAPIViewSet):
+    queryset = Course.objects.all()
+    serializer_class = CourseSerializer
+    public = True
+    # Course titles are the primary key and may contain dots.
+    lookup_value_regex = '[^/]+'
+
+    def get_taught_course(self, message):
+        """The requested course, if the user teaches it or is staff; PermissionDenied otherwise."""
+        course = self.get_object()
+        if not (self.request.user.is_staff or taught_courses(self.request.user).filter(pk=course.pk).exists()):
+            raise PermissionDenied(message)
+        return course
+
+    @action(detail=True)
+    def gradebook(self, request, pk=None):
+        """
+        Score averages, final-grade percentiles and grade distribution for the
+        course; for its teachers and staff only, as small courses' statistics
+        give away individual scores.
+        """
+        course = self.get_taught_course("Only the course's teachers can see its gradebook.")
+        return Response(gradebook_report(course.pk))
+
+    @action(detail=True)
+    def progress(self, request, pk=None):
+        """
+        Every student's progress in the course with the average, completions
+        and percentage buckets; for the course's teachers and staff only.
+        """
+        course = self.get_taught_course("Only the course's teachers can see its progress overview.")
+        return Response(course_progress_overview(course.pk))
+
+    @action(detail=False)
+    def catalog(self, request):
+        """
+        A page of courses filtered by facet (e.g. ``?level=Primary&syllabus_status=active``),
+        with the matching ``count`` and per-value counts for every facet.
+        """
+        filters = parse_filters(request.query_params)
+        count, facets = facet_counts(filters)
+        page = self.paginate_queryset(filter_courses(self.get_queryset(), filters))
+        response = self.get_paginated_response(self.get_serializer(page, many=True).data)
+        response.data['count'] = count
+        response.data['facets'] = facets
+        return response
+
+
+class PaymentViewSet(ReadOnlyAPIViewSet):
+    queryset = Payment.objects.all()
+    serializer_class = PaymentSerializer
+    cursor_ordering = '-pk'
+
+    def scope_queryset(self, queryset, user):
+        return queryset.filter(student__user=user)
+
+
+class SubjectViewSet(ReadOnlyAPIViewSet):
+    queryset = Subject.objects.all()
+    serializer_class = SubjectSerializer
+    public = True
+
+
+class QualificationViewSet(ReadOnlyAPIViewSet):
+    queryset = Qualification.objects.all()
+    serializer_class = QualificationSerializer
+    public = True
+
+
+class AssessmentViewSet(ReadOnlyAPIViewSet):
+    queryset = Assessment.objects.all()
+    serializer_class = AssessmentSerializer
+
+    def scope_queryset(self, queryset, user):
+        return queryset.filter(Q(course__in=enrolled_courses(user)) | Q(course__in=taught_courses(user)))
+
+
+class ProgressViewSet(ReadOnlyAPIViewSet):
+    queryset = Progress.objects.all()
+    serializer_class = ProgressSerializer
+
+    def scope_queryset(self, queryset, user):
+        return queryset.filter(Q(student__user=user) | Q(course__in=taught_courses(user)))
+
+    @action(detail=False, methods=['post'], url_path='complete-module')
+    def complete_module(self, request):
+        """
+        Record that the requesting student finished ``module`` of ``course``.
+        Staff may record it for any ``student``.
+        """
+        course, module = request.data.get('course'), request.data.get('module')
+        if not course or not module:
+            return Response({'error': 'course and module are required.'}, status=status.HTTP_400_BAD_REQUEST)
+        if request.user.is_staff and request.data.get('student'):
+            student = request.data['student']
+        else:
+            student = Student.objects.filter(user=request.user).values_list('pk', flat=True).first()
+            if student is None:
+                raise PermissionDenied('Only students can complete modules.')
+        if not Enrollment.objects.filter(student_id=student, course_id=course).exists():
+            return Response({'error': 'The student is not enrolled in this course.'}, status=status.HTTP_400_BAD_REQUEST)
+        progress = record_module_completion(student, course, str(module)[:100])
+        return Response(self.get_serializer(progress).data)
+
+
+class EnrollmentViewSet(ReadOnlyAPIViewSet):
+    queryset = Enrollment.objects.all()
+    serializer_class = EnrollmentSerializer
+
+    def scope_queryset(self, queryset, user):
+        return queryset.filter(Q(student__user=user) | Q(teacher__user=user) | Q(course__teacher=user))
+
+
+class MessageViewSet(ReadOnlyAPIViewSet):
+    queryset = Message.objects.all()
+    serializer_class = MessageSerializer
+    cursor_ordering = '-pk'
+
+    def scope_queryset(self, queryset, user):
+        return queryset.filter(Q(receiver=user) | Q(sender=user))
+
+    @action(detail=False, url_path='unread-count')
+    def unread(self, request):
+        return Response({'unread': unread_count(request.user)})
+
+    @action(detail=False, methods=['post'], url_path='mark-read')
+    def mark_read(self, request):
+        """Mark the conversation with ``sender`` (optionally within ``course``) as read."""
+        sender = request.data.get('sender')
+        if not sender:
+            return Response({'error': 'sender is required.'}, status=status.HTTP_400_BAD_REQUEST)
+        marked = mark_conversation_read(request.user, sender, course=request.data.get('course') or None)
+        return Response({'marked_read': marked, 'unread': unread_count(request.user)})
+
+
+class DiscussionForumPostViewSet(ReadOnlyAPIViewSet):
+    """Forum threads with their reply count and latest reply; filter with ``?course=``."""
+    queryset = DiscussionForumPost.objects.all()
+    serializer_class = DiscussionForumPostSerializer
+    cursor_ordering = '-pk'
+    public = True
+
+    def get_queryset(self):
+        queryset = super().get_queryset()
+        course = self.request.query_params.get('course')
+        if course:
+            queryset = queryset.filter(course=course)
+        return queryset
+
+
+class ReplyViewSet(ReadOnlyAPIViewSet):
+    """Replies in posting order; filter to one thread with ``?post=``."""
+    queryset = Reply.objects.all()
+    serializer_class = ReplySerializer
+    public = True
+
+    def get_queryset(self):
+        queryset = super().get_queryset()
+        post = self.request.query_params.get('post')
+        if post:
+            queryset = queryset.filter(post=post)
+        return queryset
+
+
+class NotificationViewSet(ReadOnlyAPIViewSet):
+    queryset = Notification.objects.all()
+    serializer_class = NotificationSerializer
+    cursor_ordering = '-pk'
+
+    def scope_queryset(self, queryset, user):
+        return queryset.filter(recipient=user)
+
+
+class AssignmentViewSet(ReadOnlyAPIViewSet):
+    queryset = Assignment.objects.all()
+    serializer_class = AssignmentSerializer
+
+    def scope_queryset(self, queryset, user):
+        # Assignments without a student are set for everyone on the course.
+        return queryset.filter(
+            Q(teacher=user) | Q(student__user=user) | Q(student__isnull=True, course__in=enrolled_courses(user))
+        )
+
+
+class TeacherBoardViewSet(ReadOnlyAPIViewSet):
+    queryset = TeacherBoard.objects.all()
+    serializer_class = TeacherBoardSerializer
+
+    def scope_queryset(self, queryset, user):
+        return queryset.filter(Q(teacher__user=user) | Q(course__in=enrolled_courses(user)))
+
+
+class CodeEditorViewSet(ReadOnlyAPIViewSet):
+    queryset = CodeEditor.objects.all()
+    serializer_class = CodeEditorSerializer
+
+    def scope_queryset(self, queryset, user):
+        return queryset.filter(Q(student__user=user) | Q(course__in=taught_courses(user)))
+
+
+class CameraInteractionViewSet(ReadOnlyAPIViewSet):
+    queryset = CameraInteraction.objects.all()
+    serializer_class = CameraInteractionSerializer
+
+    def scope_queryset(self, queryset, user):
+        attended = CameraInteraction.objects.filter(students__user=user).values('pk')
+        return queryset.filter(Q(teacher__user=user) | Q(pk__in=attended))
+
+
+class BroadcastViewSet(mixins.CreateModelMixin, ReadOnlyAPIViewSet):
+    """
+    Course-wide announcements. POST queues one; GET reports its progress,
+    e.g. ``status``, ``delivered_count``/``recipient_count`` and ``throughput``.
+    """
+    queryset = Broadcast.objects.all()
+    serializer_class = BroadcastSerializer
+    cursor_ordering = '-pk'
+
+    def scope_queryset(self, queryset, user):
+        return queryset.filter(sender=user)
+
+    def perform_create(self, serializer):
+        user = self.request.user
+        course = serializer.validated_data['course']
+        if not (user.is_staff or course.teacher_id == user.pk or Teacher.objects.filter(user=user, enrollment__course=course).exists()):
+            raise PermissionDenied('Only the course teachers can broadcast to it.')
+        serializer.instance = start_broadcast(
+            course, user, serializer.validated_data['content'], serializer.validated_data.get('link'),
+        )
@@ -13,7 +13,7 @@ https://docs.djangoproject.com/en/5.1/ref/settings/
 import os
 from pathlib import Path
 from dotenv import load_dotenv
-from decouple import config
+from decouple import Csv, config
 load_dotenv()
 
 # Build paths inside the project like this: BASE_DIR / 'subdir'.
@@ -88,6 +88,7 @@ TEMPLATES = [
 ]
 
 WSGI_APPLICATION = 'edulearn.wsgi.application'
+ASGI_APPLICATION = 'edulearn.asgi.application'
 
 DATABASES = {
     'default': {
@@ -100,6 +101,29 @@ DATABASES = {
     }
 }
 
+CACHES = {
+    'default': {
+        'BACKEND': 'django_redis.cache.RedisCache',
+        'LOCATION': config('REDIS_URL', default='redis://127.0.0.1:6379/1'),
+        'OPTIONS': {
+            'CLIENT_CLASS': 'django_redis.client.DefaultClient',
+        },
+    }
+}
+
+#channels configuration.
+# Tests swap in channels.layers.InMemoryChannelLayer with override_settings.
+CHANNEL_LAYERS = {
+    'default': {
+        'BACKEND': 'channels_redis.core.RedisChannelLayer',
+        'CONFIG': {
+            'hosts': [config('CHANNEL_REDIS_URL', default='redis://127.0.0.1:6379/2')],
+            'capacity': config('CHANNEL_LAYER_CAPACITY', default=1000, cast=int),
+            'expiry': 30,
+        },
+    },
+}
+
 # Allauth configuration
 AUTHENTICATION_BACKENDS = (
     'django.contrib.auth.backends.ModelBackend',
@@ -121,6 +145,69 @@ EMAIL_PORT = 587
 EMAIL_USE_TLS = True
 EMAIL_HOST_USER = config('EMAIL_HOST_USER')
 EMAIL_HOST_PASSWORD = config('EMAIL_HOST_PASSWORD')
+DEFAULT_FROM_EMAIL = config('DEFAULT_FROM_EMAIL', default=EMAIL_HOST_USER)
+
+#sms configuration.
+SMS_BACKEND = config('SMS_BACKEND', default='core.sms.TwilioSMSBackend')
+SMS_BATCH_SIZE = config('SMS_BATCH_SIZE', default=50, cast=int)
+TWILIO_ACCOUNT_SID = config('TWILIO_ACCOUNT_SID', default='')
+TWILIO_AUTH_TOKEN = config('TWILIO_AUTH_TOKEN', default='')
+TWILIO_FROM_NUMBER = config('TWILIO_FROM_NUMBER', default='')
+
+#celery configuration.
+CELERY_BROKER_URL = config('CELERY_BROKER_URL', default='redis://localhost:6379/0')
+CELERY_RESULT_BACKEND = 'django-db'
+CELERY_TASK_ACKS_LATE = True
+CELERY_TASK_REJECT_ON_WORKER_LOST = True
+CELERY_WORKER_PREFETCH_MULTIPLIER = 1
+CELERY_BEAT_SCHEDULER = 'django_celery_beat.schedulers:DatabaseScheduler'
+CELERY_BEAT_SCHEDULE = {
+    'flush-sms-queue': {
+        'task': 'core.tasks.flush_sms_queue',
+        'schedule': 60.0,
+    },
+    'resume-stalled-broadcasts': {
+        'task': 'core.tasks.resume_stalled_broadcasts',
+        'schedule': 5 * 60.0,
+    },
+    'archive-old-notifications': {
+        'task': 'core.tasks.archive_old_notifications',
+        'schedule': 24 * 60 * 60.0,
+    },
+    'assign-pending-teachers': {
+        'task': 'core.tasks.assign_pending_teachers',
+        'schedule': 60 * 60.0,
+    },
+    # Catches changes that bypass signals, such as bulk imports and queryset updates.
+    'refresh-teacher-dashboards': {
+        'task': 'core.tasks.refresh_teacher_dashboards',
+        'schedule': 15 * 60.0,
+    },
+}
+
+#notification configuration.
+# Read notifications older than this are moved to the archive table.
+NOTIFICATION_RETENTION_DAYS = config('NOTIFICATION_RETENTION_DAYS', default=90, cast=int)
+
+#catalog configuration.
+# Resolve catalog filters from an in-process bitset index of courses (core.catalog_index).
+CATALOG_INDEX_ENABLED = config('CATALOG_INDEX_ENABLED', default=False, cast=bool)
+
+#code runner configuration.
+# Warm runner interpreters per process (core.sandbox); one per Celery worker process is enough.
+CODE_RUNNER_WORKERS = config('CODE_RUNNER_WORKERS', default=1, cast=int)
+CODE_RUNNER_CPU_SECONDS = config('CODE_RUNNER_CPU_SECONDS', default=2, cast=int)
+CODE_RUNNER_WALL_SECONDS = config('CODE_RUNNER_WALL_SECONDS', default=5, cast=int)
+CODE_RUNNER_MEMORY_MB = config('CODE_RUNNER_MEMORY_MB', default=256, cast=int)
+# The runner needs no privileges: each submission gets its own user namespace. If Celery
+# runs as root, the runner switches to this unprivileged uid/gid; it never runs as root.
+CODE_RUNNER_UID = config('CODE_RUNNER_UID', default=None, cast=lambda value: int(value) if value else None)
+CODE_RUNNER_GID = config('CODE_RUNNER_GID', default=None, cast=lambda value: int(value) if value else None)
+# Host paths mounted read-only into each submission's otherwise empty root filesystem.
+CODE_RUNNER_MOUNTS = config('CODE_RUNNER_MOUNTS', default='/usr,/bin,/lib,/lib64,/etc/alternatives', cast=Csv())
+# A cgroup directory the runner's user may create children in (a delegated cgroup v2 subtree
+# with the pids controller enabled). Each submission gets a child with its own pids.max.
+CODE_RUNNER_CGROUP = config('CODE_RUNNER_CGROUP', default=None)
 
 
 # Password validation
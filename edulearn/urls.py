@@ -16,11 +16,16 @@ Including another URLconf
 """
 from django.contrib import admin
 from django.urls import path, include
-from core.views import SignupView
+from core.views import SignupView, BulkEnrollmentView, FeeStatementExportView, SearchView, ScoreImportView
 
 urlpatterns = [
     path('admin/', admin.site.urls), 
     path('accounts/', include('allauth.urls')),
     path('signup/', SignupView.as_view(), name='signup'), 
+    path('enrollments/bulk/', BulkEnrollmentView.as_view(), name='bulk-enrollment'),
+    path('scores/import/', ScoreImportView.as_view(), name='score-import'),
+    path('fee-statements/', FeeStatementExportView.as_view(), name='fee-statements'),
+    path('search/', SearchView.as_view(), name='search'),
+    path('api/', include('core.urls')),
 ]
 